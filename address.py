@@ -0,0 +1,368 @@
+"""
+Find the addresses of the applicants and inventors of every application.
+
+Both roles go through the same steps, in one run over shared inputs: the
+person data, TLS201 filing dates, PCT families, equivalents, DOCDB families
+and the Orbis IP parties are loaded and indexed once for all roles. The
+Orbis IP party file is mirrored into a role-partitioned Parquet dataset in the
+lake, of which only the partitions of the roles and the needed columns are read.
+
+1. The PATSTAT address of every party; an application without any address
+   takes the parties of its earliest Orbis IP publication instead.
+2. The addresses of the earliest priority filings.
+3. A priority filing without any address is replenished by the earliest filed
+   member with an address of its PCT family and, failing that, of its
+   equivalence group.
+4. Per DOCDB family, the addresses of its earliest filed member with an
+   address (applicants only).
+
+    python address.py                # applicants and inventors
+    python applicant_address.py      # one role
+"""
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+from cleaning import clean_batches, empty_to_null, strip
+from config import DATA_FOLDER, SPILL_FOLDER
+from lake import dataset_path, write_dataset
+from selection import best_per_group
+from spill import as_arrow, join_to_file
+from tls201 import read_tls201
+from tls_schema import compact
+
+
+ORBIS_IP_PATSTAT_MATCH = Path(r"E:\PERSONS\Mainak Ghosh\Orbis_PATSTAT_match\Data")
+ORBIS_ADDRESS_PARTS = ['party_address_part1', 'party_city', 'party_state', 'party_postcode']
+# lake dataset of the Orbis IP parties and its dictionary-encoded columns
+ORBIS_PARTIES = "orbis_parties"
+ORBIS_CATEGORICALS = ['party_city', 'party_state', 'party_postcode', 'party_country', 'RolePos']
+PRIORITY_COLS = ['earliest_prior_appln_id', 'earliest_priority_date', 'earliest_prior_appln_auth']
+# the joined person data, shared by the roles
+PERSON_DATA_FILE = SPILL_FOLDER / "person_data.feather"
+
+
+class Role(NamedTuple):
+    """
+    A party role: the file of its parties, its sequence column, its Orbis IP
+    role number and the files its addresses are written to.
+    """
+    persons_file: str
+    seq_col: str
+    orbis_role_nbr: str
+    addresses_file: str
+    priority_file: str
+    docdb_file: Optional[str] = None
+
+
+ROLES = {
+    'applicant': Role("applicants_TLS207.dta", 'applt_seq_nr', '0',
+                      "applicants_addresses.feather",
+                      "priority_applicants_addresses.feather",
+                      "DOCDB_earliest_file_applicants_addresses.feather"),
+    'inventor': Role("inventors_TLS207.dta", 'invt_seq_nr', '-1',
+                     "inventors_addresses.feather",
+                     "priority_inventors_addresses.feather"),
+}
+
+
+class Inputs(NamedTuple):
+    """
+    The inputs shared by all roles.
+    """
+    person_data: Path
+    tls201: pd.DataFrame
+    appln_index: pd.Index
+    earliest_priority: pd.DataFrame
+    pct_families: pd.DataFrame
+    equivalents: pd.DataFrame
+    appln_docdb: Optional[pd.DataFrame]
+    orbis_parties: Dict[str, pd.DataFrame]
+
+
+def load_and_clean_person_data():
+    """
+    Clean the person address and country code data and join them out of
+    core into a Feather file under data/spill (see spill.py).
+
+    Returns:
+        Path: Feather file of person_id, person_address and person_ctry_code.
+    """
+    # Convert empty strings to None, one record batch at a time
+    address = clean_batches(as_arrow(DATA_FOLDER / "person_address.feather").scanner(
+        columns=['person_id', 'person_address']).to_reader(), empty_to_null=['person_address'])
+    ctry_code = clean_batches(as_arrow(DATA_FOLDER / "person_ctry_code.dta").scanner(
+        columns=['person_id', 'person_ctry_code']).to_reader(), empty_to_null=['person_ctry_code'])
+
+    # Merge address and country code, drop rows with both missing
+    join_to_file(address, ctry_code, PERSON_DATA_FILE, on='person_id', how='outer',
+                 where="person_address IS NOT NULL OR person_ctry_code IS NOT NULL")
+    person_ids = feather.read_table(PERSON_DATA_FILE, columns=['person_id'])['person_id']
+    assert pc.count_distinct(person_ids, mode='all').as_py() == len(person_ids)  # Ensure no duplicate person IDs
+
+    return PERSON_DATA_FILE
+
+
+def orbis_parties_dataset():
+    """
+    The Orbis IP party file as a Parquet dataset in the lake, partitioned by
+    role and with its short string columns dictionary-encoded. Converted once,
+    and again when the Feather file is newer.
+
+    Returns:
+        Path: Dataset directory.
+    """
+    source = ORBIS_IP_PATSTAT_MATCH / "OrbisIP_Patent_Paties.feather"
+    path = dataset_path(ORBIS_PARTIES)
+    if not path.exists() or path.stat().st_mtime < source.stat().st_mtime:
+        parties = ds.dataset(source, format="feather")
+        # through string: an integer column, e.g. RolePos, has no direct
+        # cast to a dictionary
+        projection = {field.name: ds.field(field.name).cast(pa.string())
+                      .cast(pa.dictionary(pa.int32(), pa.string()))
+                      if field.name in ORBIS_CATEGORICALS else ds.field(field.name)
+                      for field in parties.schema}
+        write_dataset(parties.scanner(columns=projection).to_reader(), ORBIS_PARTIES)
+    return path
+
+
+def load_orbis_ip_parties(role_nbrs):
+    """
+    Load and transform the Orbis IP parties of several roles in one read.
+    Only the partitions of the roles and the needed columns are read.
+
+    Args:
+        role_nbrs (list of str): Orbis IP role numbers ('0' applicants, '-1' inventors).
+
+    Returns:
+        dict: Role number to the parties of the earliest publication per appln,
+        with their RolePos.
+    """
+    dataset = ds.dataset(orbis_parties_dataset(), format="parquet",
+                         partitioning=ds.partitioning(pa.schema([('RoleNbr', pa.string())]), flavor="hive"))
+    table = dataset.to_table(columns=['PatPublNr'] + ORBIS_ADDRESS_PARTS + ['party_country', 'RoleNbr', 'RolePos'],
+                             filter=ds.field('RoleNbr').isin(role_nbrs))
+    # address parts joined by spaces; a missing part makes the address missing
+    person_address = pc.binary_join_element_wise(*[strip(table[col]) for col in ORBIS_ADDRESS_PARTS], ' ')
+    person_address = empty_to_null(strip(person_address))
+    person_ctry_code = empty_to_null(strip(table['party_country']))
+    parties = pa.table({
+        'patpublnr': table['PatPublNr'],
+        'person_ctry_code': person_ctry_code,
+        'RoleNbr': table['RoleNbr'],
+        'RolePos': table['RolePos'].cast(pa.string()),
+        'person_address': person_address,
+    }).filter(pc.and_(pc.is_valid(person_address), pc.is_valid(person_ctry_code))).to_pandas()
+
+    orbis_patstat_match = pd.read_feather(ORBIS_IP_PATSTAT_MATCH / "OrbisIP_patstat_matched_0.feather",
+                                          columns=['patpublnr', 'appln_id', 'publn_date'])
+    orbis_patstat_match = orbis_patstat_match.dropna(subset=['patpublnr', 'appln_id']).drop_duplicates()
+
+    # keep the parties of the earliest publication per appln and role, a
+    # publication without date last
+    parties = parties.merge(orbis_patstat_match, on='patpublnr')
+    parties = best_per_group(parties, ['RoleNbr', 'appln_id'], ['publn_date', 'patpublnr'], keep_ties=True,
+                             keep_missing=['publn_date'])
+    parties = parties.drop(['patpublnr', 'publn_date'], axis=1)
+
+    return {role_nbr: parties[parties['RoleNbr'] == role_nbr].drop('RoleNbr', axis=1)
+            for role_nbr in role_nbrs}
+
+
+def load_inputs(roles: Sequence[Role]) -> Inputs:
+    """
+    Load the inputs shared by the roles, once.
+
+    Args:
+        roles (sequence of Role): Roles to resolve.
+
+    Returns:
+        Inputs: The shared inputs.
+    """
+    # Load TLS201 (appln_id and appln_filing_date)
+    tls201 = read_tls201(['appln_id', 'appln_filing_date'])
+    need_docdb = any(role.docdb_file for role in roles)
+    return Inputs(
+        person_data=load_and_clean_person_data(),
+        tls201=tls201,
+        appln_index=pd.Index(tls201['appln_id']),
+        earliest_priority=compact(pd.read_stata(DATA_FOLDER / "earliest_priority.dta")),
+        pct_families=compact(pd.read_stata(DATA_FOLDER / "PCT_families.dta")),
+        equivalents=compact(pd.read_feather(DATA_FOLDER / "patent_equivalents.feather")),
+        appln_docdb=compact(pd.read_stata(DATA_FOLDER / "appln_docdb_number.dta")) if need_docdb else None,
+        orbis_parties=load_orbis_ip_parties([role.orbis_role_nbr for role in roles]),
+    )
+
+
+def with_address(addresses, key='appln_id'):
+    """
+    Mask of the rows whose `key` has at least one non-missing address.
+    """
+    return addresses[key].isin(addresses.loc[addresses['person_address'].notna(), key])
+
+
+def get_party_addresses(role, inputs):
+    """
+    Addresses of the parties of a role, from PATSTAT and, for applications
+    without any PATSTAT address, from Orbis IP.
+
+    Args:
+        role (Role): The role.
+        inputs (Inputs): The shared inputs.
+
+    Returns:
+        pd.DataFrame: Party addresses with their source.
+    """
+    # Merge parties with person addresses out of core (see spill.py)
+    joined = SPILL_FOLDER / role.addresses_file
+    join_to_file(DATA_FOLDER / role.persons_file, inputs.person_data, joined, on='person_id', how='left',
+                 order_by=['appln_id', role.seq_col])
+    addresses = compact(feather.read_table(joined).to_pandas())
+    joined.unlink()
+    addresses['source'] = 'patstat'
+
+    orbis = inputs.orbis_parties[role.orbis_role_nbr].rename(columns={'RolePos': role.seq_col})
+    orbis['source'] = 'orbis_ip'
+    orbis[role.seq_col] = orbis[role.seq_col].astype(int)
+
+    # applications without any PATSTAT address take their Orbis IP parties
+    from_orbis = orbis[orbis['appln_id'].isin(addresses.loc[~with_address(addresses), 'appln_id'])]
+    addresses = addresses[~addresses['appln_id'].isin(from_orbis['appln_id'])]
+    return pd.concat([addresses, from_orbis], ignore_index=True)
+
+
+def get_priority_addresses(priority_data, addresses):
+    """
+    Retrieve the party addresses for the earliest priority applications.
+
+    Args:
+        priority_data (pd.DataFrame): DataFrame containing earliest priority
+        application data.
+        addresses (pd.DataFrame): DataFrame with party addresses.
+
+    Returns:
+        pd.DataFrame: DataFrame of party addresses for earliest priority
+        applications.
+    """
+    # Merge priority applications with party addresses
+    addresses_tmp = addresses.rename(
+        columns={'appln_id': 'earliest_prior_appln_id'})
+    result = priority_data.merge(addresses_tmp, on='earliest_prior_appln_id',
+                                 how='left')
+    result.drop(['appln_id'], axis=1, inplace=True)
+    result.drop_duplicates(inplace=True)
+    return result
+
+
+def earliest_members_with_address(members, group, addresses, inputs):
+    """
+    The earliest filed member with an address of every group, members without
+    filing date last; if there still exist several, the one with the smallest
+    application ID.
+
+    Args:
+        members (pd.DataFrame): appln_id and `group` of every member.
+        group (str): Group column.
+        addresses (pd.DataFrame): Party addresses.
+        inputs (Inputs): The shared inputs.
+
+    Returns:
+        pd.DataFrame: One member per group, with its filing date.
+    """
+    members = members[members['appln_id'].isin(addresses.loc[addresses['person_address'].notna(), 'appln_id'])]
+    # filing dates by a positional lookup in TLS201
+    rows = inputs.appln_index.get_indexer(members['appln_id'])
+    members = members[rows >= 0].copy()
+    members['appln_filing_date'] = inputs.tls201['appln_filing_date'].array.take(rows[rows >= 0])
+    return best_per_group(members, group, ['appln_filing_date', 'appln_id'], keep_missing=['appln_filing_date'])
+
+
+def replenish_addresses(priority_no_address, links, group, addresses, inputs):
+    """
+    Replenish missing addresses of priority filings from the earliest filed
+    member with an address of each of their groups.
+
+    Args:
+        priority_no_address (pd.DataFrame): Priority applications without addresses.
+        links (pd.DataFrame): appln_id and `group`, e.g. the PCT families.
+        group (str): Group column.
+        addresses (pd.DataFrame): Party addresses.
+        inputs (Inputs): The shared inputs.
+
+    Returns:
+        pd.DataFrame: Replenished addresses, with the application they come from.
+    """
+    winners = earliest_members_with_address(links, group, addresses, inputs)
+    # group of every priority filing, and the winner of the group
+    candidates = priority_no_address.merge(links.rename(columns={'appln_id': 'earliest_prior_appln_id'}),
+                                           on='earliest_prior_appln_id')
+    # a priority filing in several groups takes the addresses of every winner
+    candidates = candidates.merge(winners, on=group)
+    replenished = candidates.drop([group, 'appln_filing_date'], axis=1).merge(addresses, on='appln_id')
+    return replenished.rename(columns={'appln_id': 'replenished_by_appln_id'})
+
+
+def get_docdb_level_addresses(addresses, inputs):
+    """
+    Find party addresses for earliest filed application within a DOCDB family
+    """
+    winners = earliest_members_with_address(inputs.appln_docdb, 'docdb_family_id', addresses, inputs)
+    return winners.drop('appln_filing_date', axis=1).merge(addresses, on='appln_id')
+
+
+def resolve_addresses(role, inputs):
+    """
+    Write the addresses of a role: per application, per earliest priority
+    filing, and per DOCDB family if the role has a DOCDB file.
+
+    Args:
+        role (Role): The role.
+        inputs (Inputs): The shared inputs.
+    """
+    addresses = get_party_addresses(role, inputs)
+    addresses.to_feather(DATA_FOLDER / role.addresses_file)
+
+    # Get party addresses for earliest priority applications
+    earliest_priority = inputs.earliest_priority
+    priority_addresses = get_priority_addresses(earliest_priority, addresses)
+    assert priority_addresses['earliest_prior_appln_id'].nunique() == \
+        earliest_priority['earliest_prior_appln_id'].nunique(), "Mismatch in count of priority filing after merge!"
+
+    # Replenish priority filings without any address from other PCT linked
+    # applications, then from equivalents
+    priority_no_address = priority_addresses.loc[~with_address(priority_addresses, 'earliest_prior_appln_id'),
+                                                 PRIORITY_COLS].drop_duplicates()
+    replenished = []
+    for links, group in [(inputs.pct_families, 'WO_appln_id'), (inputs.equivalents, 'eqv_grp_num')]:
+        replenished.append(replenish_addresses(priority_no_address, links, group, addresses, inputs))
+        deleted = priority_no_address['earliest_prior_appln_id'].isin(replenished[-1]['earliest_prior_appln_id'])
+        priority_no_address = priority_no_address[~deleted]
+    replenished = pd.concat(replenished, ignore_index=True)
+
+    # Combine the original and replenished addresses
+    deleted = priority_addresses['earliest_prior_appln_id'].isin(replenished['earliest_prior_appln_id'])
+    full_priority_addresses = pd.concat([priority_addresses[~deleted], replenished], ignore_index=True)
+    assert full_priority_addresses['earliest_prior_appln_id'].nunique() == \
+        earliest_priority['earliest_prior_appln_id'].nunique(), "Mismatch in count of priority filing after address replenishment!"
+    full_priority_addresses.to_feather(DATA_FOLDER / role.priority_file)
+
+    if role.docdb_file:
+        get_docdb_level_addresses(addresses, inputs).reset_index(drop=True).to_feather(
+            DATA_FOLDER / role.docdb_file)
+
+
+def main(roles: List[Role]):
+    """
+    Resolve the addresses of several roles over inputs loaded once.
+    """
+    inputs = load_inputs(roles)
+    for role in roles:
+        resolve_addresses(role, inputs)
+    inputs.person_data.unlink()
+
+
+if __name__ == '__main__':
+    main(list(ROLES.values()))
@@ -3,15 +3,15 @@ Generate names for application-applicant pairs
 """
 import pandas as pd
 from config import DATA_FOLDER
+from tls201 import read_tls201
 
 
 APPLICANT_FILE = DATA_FOLDER / "applicants_TLS207.dta"
 NAME_FILE = DATA_FOLDER / "person_names.feather"
-TLS201_FILE = DATA_FOLDER / "TLS201.feather"
 
 
 ### load
-TLS201 = pd.read_feather(TLS201_FILE, columns=['appln_id'])
+TLS201 = read_tls201(['appln_id'])
 applicants = pd.read_stata(APPLICANT_FILE)
 names = pd.read_feather(NAME_FILE)
 
@@ -1,13 +1,14 @@
 from pathlib import Path
 import pandas as pd
 from config import DATA_FOLDER
+from tls201 import read_tls201
+from tls_schema import to_stata
 
 
-TLS201_PATH = DATA_FOLDER / "TLS201.feather"
 EPWO_LINK_PATH = Path(r"E:\PERSONS\Mainak Ghosh\epwo_linkage\data\EP_WO_link_till_2023.dta")
 
 
-TLS_201 = pd.read_feather(TLS201_PATH)
+TLS_201 = read_tls201(['appln_id', 'internat_appln_id'])
 EPWO = pd.read_stata(EPWO_LINK_PATH)
 appln = TLS_201[['appln_id', 'internat_appln_id']].copy()
 appln = pd.merge(appln, EPWO, left_on='appln_id',
@@ -22,4 +23,4 @@ appln['PCT_appln'] = appln.WO_appln_id.notna()  # has prior PCT appln
 assert appln.shape[0] == TLS_201.shape[0]
 assert appln.PCT_appln.sum() == (~appln.WO_appln_id.isna()).sum()
 appln = appln[['appln_id', 'WO_appln_id', 'PCT_appln']]
-appln.to_stata(DATA_FOLDER / "appln_PCT_link.dta", write_index=False)
+to_stata(appln, DATA_FOLDER / "appln_PCT_link.dta", write_index=False)
@@ -1,17 +1,17 @@
 
 import pandas as pd
 from config import DATA_FOLDER
+from tls201 import read_tls201
+from tls_schema import to_stata
 
 
-TLS201_FILE = DATA_FOLDER / "TLS201.feather"
+appln = read_tls201(['appln_id', 'appln_auth',
+                     'appln_filing_date', 'appln_kind',
+                     'appln_nr_epodoc', 'ipr_type',
+                     'docdb_family_id'])
 
-
-appln = pd.read_feather(TLS201_FILE, columns=['appln_id', 'appln_auth',
-                                              'appln_filing_date', 'appln_kind',
-                                              'appln_nr_epodoc', 'ipr_type',
-                                              'docdb_family_id'])
-
-appln[['appln_id', 'docdb_family_id']].to_stata(
+to_stata(
+    appln[['appln_id', 'docdb_family_id']],
     DATA_FOLDER / "appln_docdb_number.dta",
     write_index=False,
     variable_labels={
@@ -20,7 +20,8 @@ appln[['appln_id', 'docdb_family_id']].to_stata(
     }
 )
 
-appln.drop('docdb_family_id', axis=1).to_stata(
+to_stata(
+    appln.drop('docdb_family_id', axis=1),
     DATA_FOLDER / "appln_meta_info_short.dta",
     write_index=False,
     variable_labels={
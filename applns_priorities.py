@@ -4,27 +4,28 @@ find oldest priority too
 """
 import pandas as pd
 from config import DATA_FOLDER
+from selection import best_per_group
+from tls201 import read_tls201
+from tls_schema import read_feather, to_stata
 
 
-TLS201_PATH = DATA_FOLDER / "TLS201.feather"
 TLS204_PATH = DATA_FOLDER / "TLS204.feather"
-DATE_NAN = "9999-12-31"
 
 
-TLS_201 = pd.read_feather(TLS201_PATH)
-TLS_204 = pd.read_feather(TLS204_PATH)
+TLS_201 = read_tls201(['appln_id', 'appln_filing_date', 'appln_auth'])
+TLS_204 = read_feather(TLS204_PATH)
 
 ############ First Filing ########################
 appln = pd.merge(TLS_201[['appln_id']], TLS_204[['appln_id', 'prior_appln_id']],
                  on='appln_id', how='left')
 appln['first_filing'] = appln.prior_appln_id.isna().astype(int)
 appln = appln.drop('prior_appln_id', axis=1).drop_duplicates()
-appln.to_stata(DATA_FOLDER / "first_filings.dta",
-               write_index=False,
-               variable_labels={
-                        'appln_id': 'PATSTAT Appln ID',
-                        'first_filing': 'First Filing'
-                    })
+to_stata(appln, DATA_FOLDER / "first_filings.dta",
+         write_index=False,
+         variable_labels={
+             'appln_id': 'PATSTAT Appln ID',
+             'first_filing': 'First Filing'
+         })
 ################################################################
 
 ###################### all priorities from TLS 204 #########################
@@ -43,13 +44,10 @@ all_priorities = all_priorities.rename(columns={
 })
 all_priorities = all_priorities.drop(['appln_id_y','prior_appln_seq_nr'], axis=1)
 all_priorities = all_priorities.sort_values('appln_id')
-all_priorities.priority_date = all_priorities.priority_date.fillna(DATE_NAN)
 
-# earliest priority from TLS 204
-all_priorities = all_priorities.sort_values(['appln_id', 'priority_date', 'prior_appln_id'])
-all_priorities['earliest_priority'] = all_priorities.groupby('appln_id').\
-    priority_date.rank(method='first')
-earliest_priority = all_priorities.loc[all_priorities.earliest_priority==1].copy()
+# earliest priority from TLS 204; a missing priority date sorts last
+earliest_priority = best_per_group(all_priorities, 'appln_id', ['priority_date', 'prior_appln_id'],
+                                   keep_missing=['priority_date'])
 
 
 #############################################################
@@ -60,7 +58,6 @@ appln = pd.merge(appln,
                  TLS_201[['appln_id', 'appln_filing_date', 'appln_auth']],
                  on='appln_id')
 assert obscheck == appln.shape[0]
-appln.appln_filing_date = appln.appln_filing_date.fillna(DATE_NAN)
 first_filing = appln[appln.first_filing == 1].copy()
 first_filing['prior_appln_id'] = first_filing.appln_id
 first_filing['priority_date'] = first_filing.appln_filing_date
@@ -75,10 +72,9 @@ earliest_priority = earliest_priority.drop(['appln_filing_date', 'appln_auth'],
 earliest_priority = earliest_priority.rename(columns={'prior_appln_id': 'earliest_prior_appln_id',
                                                      'prior_appln_auth': 'earliest_prior_appln_auth',
                                                      'priority_date': 'earliest_priority_date'})
-earliest_priority = earliest_priority.drop(['first_filing', 'earliest_priority'],
-                                           axis=1)
+earliest_priority = earliest_priority.drop('first_filing', axis=1)
 earliest_priority = earliest_priority.sort_values('appln_id')
-earliest_priority.to_stata(DATA_FOLDER / "earliest_priority.dta",
+to_stata(earliest_priority, DATA_FOLDER / "earliest_priority.dta",
                            write_index=False,
                            variable_labels={
                                'appln_id': 'Appln ID (PATSTAT)',
@@ -15,150 +15,98 @@ that will consist of:
 # priorities > PCT > Technically similar > Continuation
 ##########################################################################
 
+import numpy as np
 import pandas as pd
 from config import DATA_FOLDER
+from lake import write_dataset
+from tls201 import read_tls201
+from tls_schema import read_feather, to_stata
 
 
 APPLN_PCT_LINK_PATH = DATA_FOLDER / "appln_PCT_link.dta"
-DATE_NAN = "9999-12-31"
+
+# ############### quasi priority order:
+# # priorities > PCT > Technically similar > Continuation
+SOURCE_PRIORITY = 1
+SOURCE_PCT = 2
+SOURCE_TECH_REL = 3
+SOURCE_CONTINUATION = 4
+source_value_label = {
+    'source': {
+        SOURCE_PRIORITY: 'priority',
+        SOURCE_PCT: 'prior-PCT',
+        SOURCE_TECH_REL: 'tech-rel',
+        SOURCE_CONTINUATION: 'continuation'
+    }
+}
+
+
+def lookup(appln_index, appln_id):
+    """
+    Row of every appln_id in TLS201; all of them must be there.
+    """
+    rows = appln_index.get_indexer(appln_id)
+    assert (rows >= 0).all()
+    return rows
 
 
 # TLS201
-TLS201 = pd.read_feather(DATA_FOLDER / "TLS201.feather")
+TLS201 = read_tls201(['appln_id', 'appln_auth', 'appln_filing_date'])
+appln_index = pd.Index(TLS201.appln_id)
+
+# every link is an (appln_id, prior_appln_id, source) edge
+edges = []
 
 # priority
-priority = pd.read_feather(DATA_FOLDER / "TLS204.feather")
-priority = priority.drop('prior_appln_seq_nr', axis=1)
-obscheck = priority.shape[0]
-priority = pd.merge(priority,
-                    TLS201[['appln_id', 'appln_auth', 'appln_filing_date']].\
-                        rename(
-                          columns={"appln_id": "prior_appln_id",
-                                   "appln_auth": "prior_appln_auth",
-                                   "appln_filing_date": "prior_appln_filing_date"
-                                   }
-                                ),
-                    on='prior_appln_id')
-assert obscheck == priority.shape[0]
-priority['source_priority'] = 1
+priority = read_feather(DATA_FOLDER / "TLS204.feather", columns=['appln_id', 'prior_appln_id'])
+edges.append((priority.appln_id.to_numpy(), priority.prior_appln_id.to_numpy(), SOURCE_PRIORITY))
 
 # PCT
-PCT = pd.read_stata(APPLN_PCT_LINK_PATH).query("PCT_appln==1")
-obscheck = PCT.shape[0]
-PCT = pd.merge(PCT,
-                    TLS201[['appln_id', 'appln_auth', 'appln_filing_date']].\
-                        rename(
-                          columns={"appln_id": "WO_appln_id",
-                                   "appln_auth": "prior_appln_auth",
-                                   "appln_filing_date": "prior_appln_filing_date"
-                                   }
-                                ),
-                    on='WO_appln_id')
-assert obscheck == PCT.shape[0]
-PCT = PCT.rename(columns={'WO_appln_id': 'prior_appln_id'})
-PCT['source_PCT'] = 1
+PCT = pd.read_stata(APPLN_PCT_LINK_PATH, columns=['appln_id', 'WO_appln_id', 'PCT_appln']).query("PCT_appln==1")
+edges.append((PCT.appln_id.to_numpy(), PCT.WO_appln_id.to_numpy(), SOURCE_PCT))
 
 # TLS205
-TLS205 = pd.read_feather(DATA_FOLDER / "TLS205.feather")
-obscheck = TLS205.shape[0]
-TLS205 = pd.merge(TLS205,
-                  TLS201[['appln_id', 'appln_auth', 'appln_filing_date']],
-                  on='appln_id')
-assert obscheck == TLS205.shape[0]
-obscheck = TLS205.shape[0]
-TLS205 = pd.merge(TLS205,
-                  TLS201[['appln_id', 'appln_auth', 'appln_filing_date']].\
-                    rename(columns={
-                        "appln_id": "tech_rel_appln_id",
-                        "appln_auth": "tech_rel_appln_auth",
-                        "appln_filing_date": "tech_rel_appln_filing_date"
-                        }
-                        ),
-                on='tech_rel_appln_id')
-assert obscheck == TLS205.shape[0]
-TLS205['priority_like'] = TLS205.appln_filing_date >= TLS205.tech_rel_appln_filing_date
-TLS205_priority_like = TLS205.query("priority_like==True").\
-    drop(["priority_like", 'appln_auth', 'appln_filing_date'], axis=1)
-TLS205_priority_like.columns = TLS205_priority_like.columns.map(
-    lambda x: x.replace('tech_rel', 'prior'))
-TLS205_priority_like['source_tech_rel'] = 1
+# technically related applns filed on or before the appln are priority like
+TLS205 = read_feather(DATA_FOLDER / "TLS205.feather", columns=['appln_id', 'tech_rel_appln_id'])
+appln_filing_date = TLS201.appln_filing_date.take(lookup(appln_index, TLS205.appln_id))
+tech_rel_appln_filing_date = TLS201.appln_filing_date.take(lookup(appln_index, TLS205.tech_rel_appln_id))
+priority_like = (appln_filing_date.reset_index(drop=True)
+                 >= tech_rel_appln_filing_date.reset_index(drop=True))
+TLS205 = TLS205[priority_like.to_numpy()]
+edges.append((TLS205.appln_id.to_numpy(), TLS205.tech_rel_appln_id.to_numpy(), SOURCE_TECH_REL))
 
 # TLS216
-TLS216 = pd.read_feather(DATA_FOLDER / "TLS216.feather")
-obscheck = TLS216.shape[0]
-TLS216 = pd.merge(TLS216,
-                    TLS201[['appln_id', 'appln_auth', 'appln_filing_date']].\
-                        rename(
-                          columns={"appln_id": "parent_appln_id",
-                                   "appln_auth": "prior_appln_auth",
-                                   "appln_filing_date": "prior_appln_filing_date"
-                                   }
-                                ),
-                    on='parent_appln_id')
-assert obscheck == TLS216.shape[0]
-TLS216 = TLS216.rename(columns={'parent_appln_id': 'prior_appln_id'})
-TLS216['source_continuation'] = 1
-
-# quasi priorities
-quasi_priorities = pd.merge(priority,
-                            PCT,
-                            how='outer',
-                            on=['appln_id', 'prior_appln_id', 'prior_appln_auth', 'prior_appln_filing_date']).drop_duplicates()
-
-quasi_priorities = pd.merge(quasi_priorities,
-                            TLS205_priority_like,
-                            how='outer',
-                            on=['appln_id', 'prior_appln_id', 'prior_appln_auth', 'prior_appln_filing_date']).drop_duplicates()
-
-quasi_priorities = pd.merge(quasi_priorities,
-                            TLS216,
-                            how='outer',
-                            on=['appln_id', 'prior_appln_id', 'prior_appln_auth', 'prior_appln_filing_date']).drop_duplicates()
-
-quasi_priorities.source_priority = quasi_priorities.source_priority.fillna(
-    0).astype(int)
-quasi_priorities.source_PCT = quasi_priorities.source_PCT.fillna(
-    0).astype(int)
-quasi_priorities.source_tech_rel = quasi_priorities.source_tech_rel.fillna(
-    0).astype(int)
-quasi_priorities.source_continuation = quasi_priorities.source_continuation.fillna(
-    0).astype(int)
-
-# ############### quasi priority order:
-# # priorities > PCT > Technically similar > Continuation
-source_value_label = {
-    'source': {
-        1: 'priority',
-        2: 'prior-PCT',
-        3: 'tech-rel',
-        4: 'continuation'
-    }
-}
-quasi_priorities_order = quasi_priorities.query("source_priority==1").copy()
-quasi_priorities_order['source'] = 1
-quasi_priorities_order = pd.concat([quasi_priorities_order,
-                                    quasi_priorities.query("source_priority==0 and source_PCT==1")],
-                                    ignore_index=True)
-quasi_priorities_order['source'] = quasi_priorities_order['source'].fillna(2)
-quasi_priorities_order = pd.concat([quasi_priorities_order,
-                                    quasi_priorities.query("source_priority==0 and source_PCT==0 and source_tech_rel==1")],
-                                    ignore_index=True)
-quasi_priorities_order['source'] = quasi_priorities_order['source'].fillna(3)
-quasi_priorities_order = pd.concat([quasi_priorities_order,
-                                    quasi_priorities.query("source_priority==0 and source_PCT==0 and source_tech_rel==0 and source_continuation==1")],
-                                    ignore_index=True)
-quasi_priorities_order['source'] = quasi_priorities_order['source'].fillna(4)
-quasi_priorities_order = quasi_priorities_order.drop(
-    ['source_priority', 'source_PCT', 'source_tech_rel',
-     'source_continuation', 'PCT_appln', 'contn_type'], axis=1)
+TLS216 = read_feather(DATA_FOLDER / "TLS216.feather", columns=['appln_id', 'parent_appln_id'])
+edges.append((TLS216.appln_id.to_numpy(), TLS216.parent_appln_id.to_numpy(), SOURCE_CONTINUATION))
+
+# quasi priorities: one row per (appln_id, prior_appln_id) pair, from the
+# highest ranked source linking them
+appln_id = np.concatenate([edge[0] for edge in edges]).astype(np.int32)
+prior_appln_id = np.concatenate([edge[1] for edge in edges]).astype(np.int32)
+source = np.concatenate([np.full(len(edge[0]), edge[2], dtype=np.int8) for edge in edges])
+del edges, priority, PCT, TLS205, TLS216
+order = np.lexsort((source, prior_appln_id, appln_id))
+first = np.ones(len(order), dtype=bool)
+first[1:] = ((appln_id[order][1:] != appln_id[order][:-1])
+             | (prior_appln_id[order][1:] != prior_appln_id[order][:-1]))
+order = order[first]
+
+prior_rows = lookup(appln_index, prior_appln_id[order])
+quasi_priorities_order = pd.DataFrame({
+    'appln_id': appln_id[order],
+    'prior_appln_id': prior_appln_id[order],
+    'prior_appln_auth': TLS201.appln_auth.array.take(prior_rows),
+    'prior_appln_filing_date': TLS201.appln_filing_date.array.take(prior_rows),
+    'source': source[order],
+})
 quasi_priorities_order = quasi_priorities_order.sort_values(['appln_id',
                                                              'source',
                                                              'prior_appln_filing_date',
-                                                             'prior_appln_id']).reset_index(drop=True).drop_duplicates()
+                                                             'prior_appln_id']).reset_index(drop=True)
 
 quasi_priorities_order.prior_appln_id = quasi_priorities_order.prior_appln_id.astype(int)
 quasi_priorities_order.source = quasi_priorities_order.source.astype(int)
-quasi_priorities_order.to_stata(DATA_FOLDER / "applns_quasi_priorities.dta",
+to_stata(quasi_priorities_order, DATA_FOLDER / "applns_quasi_priorities.dta",
                                 write_index=False,
                                 variable_labels={
                                     'appln_id': 'Appln ID (PATSTAT)',
@@ -169,7 +117,6 @@ quasi_priorities_order.to_stata(DATA_FOLDER / "applns_quasi_priorities.dta",
                                 },
                                 value_labels=source_value_label
                                 )
-
-
-
-
+quasi_priorities_order['prior_appln_filing_year'] = \
+    quasi_priorities_order.prior_appln_filing_date.dt.year.astype('Int16')
+write_dataset(quasi_priorities_order, "applns_quasi_priorities")
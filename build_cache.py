@@ -0,0 +1,218 @@
+"""
+Content-addressed cache of derived files
+
+The outputs of a step are stored under a key made of the content hashes of
+its input files, of its script and the local modules the script imports,
+and of its parameters. When a step comes up again with the same key, its
+outputs are copied back from the cache instead of being recomputed. The
+cache is bounded in size: the least recently used entries are evicted.
+
+File hashes are remembered by path, size and modification time, so large
+inputs such as TLS201.feather are only read again after they change.
+"""
+import ast
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+from config import CACHE_FOLDER
+
+
+CACHE_SIZE = 50 * 2**30
+BLOCK_SIZE = 2**20
+DIGEST_SIZE = 20
+MODULE_FOLDER = Path(__file__).resolve().parent
+_DIGESTS_FILE = "digests.json"
+
+
+def _load_digests() -> Dict[str, str]:
+    path = CACHE_FOLDER / _DIGESTS_FILE
+    if path.exists():
+        with open(path) as file:
+            return json.load(file)
+    return {}
+
+
+_DIGESTS = _load_digests()
+
+
+def _save_digests() -> None:
+    CACHE_FOLDER.mkdir(parents=True, exist_ok=True)
+    tmp_path = CACHE_FOLDER / (_DIGESTS_FILE + ".part")
+    with open(tmp_path, "w") as file:
+        json.dump(_DIGESTS, file)
+    tmp_path.replace(CACHE_FOLDER / _DIGESTS_FILE)
+
+
+def file_digest(path: Path) -> str:
+    """
+    Content hash of a file, or of all files under a directory.
+
+    Args:
+        path (Path): File or directory.
+
+    Returns:
+        str: Hex digest.
+    """
+    path = Path(path)
+    if path.is_dir():
+        digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        for child in sorted(p for p in path.rglob("*") if p.is_file()):
+            digest.update(str(child.relative_to(path)).encode())
+            digest.update(file_digest(child).encode())
+        return digest.hexdigest()
+    stat = path.stat()
+    memo_key = f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    if memo_key not in _DIGESTS:
+        digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(BLOCK_SIZE), b""):
+                digest.update(block)
+        _DIGESTS[memo_key] = digest.hexdigest()
+        _save_digests()
+    return _DIGESTS[memo_key]
+
+
+def local_modules(script: Path) -> List[Path]:
+    """
+    A script and the modules of this folder it imports, directly or not.
+
+    Args:
+        script (Path): Python script.
+
+    Returns:
+        list of Path: Source files, sorted.
+    """
+    seen = set()
+    stack = [Path(script).resolve()]
+    while stack:
+        path = stack.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module = MODULE_FOLDER / f"{name.split('.')[0]}.py"
+                if module.exists():
+                    stack.append(module)
+    return sorted(seen)
+
+
+def step_key(script: Path, inputs: Iterable[Path], params: Sequence[str] = ()) -> str:
+    """
+    Cache key of a step.
+
+    Args:
+        script (Path): Script of the step.
+        inputs (iterable of Path): Files the step reads.
+        params (sequence of str): Parameters of the step, e.g. its arguments.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for module in local_modules(script):
+        digest.update(module.name.encode())
+        digest.update(file_digest(module).encode())
+    for path in inputs:
+        digest.update(str(path).encode())
+        digest.update(file_digest(path).encode())
+    for param in params:
+        digest.update(param.encode())
+    return digest.hexdigest()
+
+
+def _copy(source: Path, target: Path) -> None:
+    """
+    Copy a file or directory, replacing the target. Files get a fresh
+    modification time, so that restored outputs are newer than their inputs.
+    """
+    tmp_path = target.with_name(target.name + ".part")
+    if source.is_dir():
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        shutil.copytree(source, tmp_path, copy_function=shutil.copyfile)
+        os.utime(tmp_path)  # copytree copies the modification time of the directory
+        shutil.rmtree(target, ignore_errors=True)
+    else:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, tmp_path)
+    tmp_path.replace(target)
+
+
+def restore(key: str, outputs: Dict[str, Path]) -> bool:
+    """
+    Copy the cached outputs of a step back into place.
+
+    Args:
+        key (str): See `step_key`.
+        outputs (dict): Name of every output in the cache to its path.
+
+    Returns:
+        bool: True on a cache hit.
+    """
+    entry = CACHE_FOLDER / key
+    manifest = entry / "manifest.json"
+    if not manifest.exists():
+        return False
+    with open(manifest) as file:
+        if sorted(json.load(file)) != sorted(outputs):
+            return False
+    for name, path in outputs.items():
+        _copy(entry / name, path)
+    os.utime(manifest)  # most recently used
+    return True
+
+
+def store(key: str, outputs: Dict[str, Path], max_size: int = CACHE_SIZE) -> None:
+    """
+    Add the outputs of a step to the cache, then evict entries over the size limit.
+
+    Args:
+        key (str): See `step_key`.
+        outputs (dict): Name of every output in the cache to its path.
+        max_size (int): Cache size limit in bytes.
+    """
+    entry = CACHE_FOLDER / key
+    tmp_entry = CACHE_FOLDER / (key + ".part")
+    shutil.rmtree(tmp_entry, ignore_errors=True)
+    tmp_entry.mkdir(parents=True)
+    for name, path in outputs.items():
+        _copy(path, tmp_entry / name)
+    with open(tmp_entry / "manifest.json", "w") as file:
+        json.dump(sorted(outputs), file)
+    shutil.rmtree(entry, ignore_errors=True)
+    tmp_entry.replace(entry)
+    evict(max_size)
+
+
+def _size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def evict(max_size: int = CACHE_SIZE) -> None:
+    """
+    Delete the least recently used cache entries until the cache fits in `max_size`.
+
+    Args:
+        max_size (int): Cache size limit in bytes.
+    """
+    if not CACHE_FOLDER.exists():
+        return
+    entries = [entry for entry in CACHE_FOLDER.iterdir() if (entry / "manifest.json").exists()]
+    entries.sort(key=lambda entry: (entry / "manifest.json").stat().st_mtime)
+    sizes = {entry: _size(entry) for entry in entries}
+    total = sum(sizes.values())
+    for entry in entries:
+        if total <= max_size:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= sizes[entry]
+        print(f"Evicted from cache: {entry.name}")
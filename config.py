@@ -7,3 +7,8 @@ from pathlib import Path
 PATSTAT_VERSION = 'Spring-24'
 RAW_FOLDER = Path(rf"F:\PATSTAT\{PATSTAT_VERSION}")
 DATA_FOLDER = Path("data")
+LAKE_FOLDER = DATA_FOLDER / "lake"
+CACHE_FOLDER = DATA_FOLDER / "cache"
+SPILL_FOLDER = DATA_FOLDER / "spill"
+# memory of the out-of-core joins (see spill.py), beyond which they spill to SPILL_FOLDER
+JOIN_MEMORY_LIMIT = "4GB"
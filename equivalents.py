@@ -4,213 +4,363 @@ Martinez, C. (2010), "Insight into Different Types of Patent Families",
 OECD Science, Technology and Industry Working Papers, No. 2010/02, 
 OECD Publishing, Paris, https://doi.org/10.1787/5kml97dr6ptl-en.
 """
+import argparse
+from pathlib import Path
+import numpy as np
 import pandas as pd
 from config import DATA_FOLDER
+from graph import connected_components
+from tls_schema import read_feather
 
 
 # Define constants
 TLS204_PATH = DATA_FOLDER / "TLS204.feather"
 
 
-def conv_list_int_string(list_int):
+def _mix64(values):
     """
-    Convert a list of integers to a pipe-separated string.
+    splitmix64 finalizer: scramble uint64 values into well spread hashes.
 
     Args:
-        list_int (list of int): List of integers to convert.
+        values (np.ndarray): uint64 values.
 
     Returns:
-        str: Pipe-separated string of integers.
+        np.ndarray: uint64 hashes.
     """
-    return '|'.join(map(str, list_int))
+    with np.errstate(over='ignore'):
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
 
 
-def load_and_process_priorities():
+def hash_runs(values, starts, seed=0):
     """
-    Load priority data and combine priorities into lists per application.
+    64-bit hash of each run of a sorted array, taking the position of every
+    value in its run into account, so two runs have the same hash only if
+    they hold the same values (barring collisions).
+
+    Args:
+        values (np.ndarray): Integer values, sorted within each run.
+        starts (np.ndarray): Index of the first value of every run.
+        seed (int): Hash seed.
 
     Returns:
-        pd.DataFrame: DataFrame with priority applications combined and sorted.
+        np.ndarray: uint64 hash per run.
     """
-    # Load the priorities data
-    tls_204 = pd.read_feather(TLS204_PATH)
-
-    # Group by 'appln_id' and aggregate 'prior_appln_id' into a sorted list
-    priority_combined = tls_204.groupby('appln_id')['prior_appln_id'].agg(list).reset_index()
+    lengths = np.diff(np.append(starts, len(values)))
+    position = np.arange(len(values)) - np.repeat(starts, lengths)
+    with np.errstate(over='ignore'):
+        element = _mix64(values.astype(np.uint64)
+                         + position.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+                         + np.uint64(seed))
+        return np.add.reduceat(element, starts)
 
-    # Sort the priority application IDs in each list to maintain consistency
-    priority_combined['prior_appln_id'] = priority_combined['prior_appln_id'].map(sorted)
 
-    # Convert the list of priority IDs to a pipe-separated string
-    priority_combined['prior_appln_id_str'] = priority_combined['prior_appln_id'].map(conv_list_int_string)
-
-    return priority_combined
-
-
-def contains_pipe(input_string):
+def runs_differ(values, starts, keys):
     """
-    Check if the input string contains the pipe symbol '|'.
+    Check whether runs sharing a key differ, i.e. whether the hash collided.
 
     Args:
-        input_string (str): The string to check.
+        values (np.ndarray): Integer values, sorted within each run.
+        starts (np.ndarray): Index of the first value of every run.
+        keys (np.ndarray): Key of every run.
 
     Returns:
-        bool: True if the string contains '|', otherwise False.
+        bool: True if two runs with the same key hold different values.
     """
-    return '|' in input_string
+    lengths = np.diff(np.append(starts, len(values)))
+    _, first_run = np.unique(keys, return_index=True)
+    code = np.unique(keys, return_inverse=True)[1]
+    representative = first_run[code]
+    if (lengths != lengths[representative]).any():
+        return True
+    position = np.arange(len(values)) - np.repeat(starts, lengths)
+    return bool((values != values[np.repeat(starts[representative], lengths) + position]).any())
 
 
-def create_equivalents(df):
+def load_and_process_priorities():
     """
-    Create equivalent groups of applications
-    Args:
-        df (pd.DataFrame): DataFrame with 'appln_id' and 'prior_appln_id_str'.
+    Load priority data and key every application by its priority combination,
+    see `combine_priorities`.
 
     Returns:
-        list: List of sets, where each set contains equivalent application IDs.
+        pd.DataFrame: One row per application with 'appln_id', 'prior_key',
+            'nb_priorities' and 'first_prior_appln_id'.
     """
-    equivalent_groups = []
-    for _, row in df.iterrows():
-        equiv = set(row['appln_id'])
-        if not contains_pipe(row['prior_appln_id_str']):
-            equiv.add(int(row['prior_appln_id_str']))
-        equivalent_groups.append(equiv)
-    return equivalent_groups
+    return combine_priorities(read_feather(TLS204_PATH, columns=['appln_id', 'prior_appln_id']))
 
 
-def equiv_group_mapping(equivalent_groups):
+def combine_priorities(tls_204):
     """
-    Create a dictionary mapping each application to its equivalent group number.
+    Key every application by its priority combination.
+
+    TLS204 is sorted by (appln_id, prior_appln_id) once, and the sorted run of
+    priorities of each application is hashed to one 64-bit key. Applications
+    get the same key if and only if they claim the same set of priorities;
+    this is checked, and the hash reseeded in the unlikely event of a collision.
 
     Args:
-        equivalent_groups (list of sets): List where each set contains equivalent application IDs.
+        tls_204 (pd.DataFrame): 'appln_id' and 'prior_appln_id' rows of TLS204.
 
     Returns:
-        dict: Dictionary mapping 'appln_id' to equivalent group number.
+        pd.DataFrame: One row per application with 'appln_id', 'prior_key',
+            'nb_priorities' and 'first_prior_appln_id'.
     """
-    group_map = {}
-    for group_num, group in enumerate(equivalent_groups):
-        for appln_id in group:
-            if appln_id in group_map:
-                group_map[appln_id].append(group_num)  # Add group number if multiple
-            else:
-                group_map[appln_id] = [group_num]  # Assign group number to each application
-    return group_map
+    appln_id = tls_204['appln_id'].to_numpy(dtype=np.int64)
+    prior_appln_id = tls_204['prior_appln_id'].to_numpy(dtype=np.int64)
+
+    order = np.lexsort((prior_appln_id, appln_id))
+    appln_id = appln_id[order]
+    prior_appln_id = prior_appln_id[order]
+    starts = np.flatnonzero(np.r_[True, appln_id[1:] != appln_id[:-1]])
+
+    seed = 0
+    prior_key = hash_runs(prior_appln_id, starts, seed)
+    while runs_differ(prior_appln_id, starts, prior_key):
+        seed += 1
+        prior_key = hash_runs(prior_appln_id, starts, seed)
 
+    return pd.DataFrame({'appln_id': appln_id[starts],
+                         'prior_key': prior_key,
+                         'nb_priorities': np.diff(np.append(starts, len(appln_id))),
+                         'first_prior_appln_id': prior_appln_id[starts]})
 
-def get_groups_sharing_patents(group_list):
+
+def equivalence_edges(priority_combined):
     """
-    Return equivalent groups that share patent applications.
+    Edges of the equivalence graph. Every priority combination is a node,
+    linked to the applications claiming exactly that combination and, when
+    it holds a single priority, to that priority filing.
 
     Args:
-        group_list (list): A list of equivalent groups.
-    
+        priority_combined (pd.DataFrame): Output of `load_and_process_priorities`.
+
     Returns:
-        list of sets: Each set contains group IDs that share at least one common patent.
+        tuple: Application IDs and combination numbers of the edges; the
+            combinations are numbered in order of the first application
+            claiming them.
     """
-    shared_groups = []
+    combination, _ = pd.factorize(priority_combined['prior_key'])
+    appln_ids = priority_combined['appln_id'].to_numpy(dtype=np.int64)
 
-    patent_group_mapping = equiv_group_mapping(group_list)
+    single = priority_combined['nb_priorities'].to_numpy() == 1
+    single_combination, first = np.unique(combination[single], return_index=True)
+    single_prior = priority_combined['first_prior_appln_id'].to_numpy(dtype=np.int64)[single][first]
 
-    # Iterate over the patent-group mapping
-    for _, group_list in patent_group_mapping.items():
-        # If a patent is mapped to more than one group, it indicates shared groups
-        if len(group_list) > 1:
-            # Convert the list of groups into a set and append it to the shared_groups list
-            shared_groups.append(set(group_list))
-    
-    return shared_groups
+    return (np.concatenate([appln_ids, single_prior]),
+            np.concatenate([combination, single_combination]))
 
 
-def combine_equivalents(equiv_list):
+def create_equivalents(priority_combined):
     """
-    Filter out cases where a patent is mapped to multiple groups and
-    combine those groups and results in disjoint equivalent groups
+    Group applications into equivalents: applications sharing the same
+    priority combination are equivalent, and groups sharing an application
+    are merged, transitively. This is the connected components of the graph
+    of `equivalence_edges`.
 
     Args:
-        equiv_list (list): A list of equivalents.
+        priority_combined (pd.DataFrame): Output of `load_and_process_priorities`.
 
     Returns:
-        list of sets: A list where each set contains group IDs that share at least one patent.
+        pd.DataFrame: 'appln_id' and 'eqv_grp_num', one row per application.
+            Groups are numbered in the order of their first priority
+            combination, i.e. of the first application claiming one of them.
     """
-    group_count = len(equiv_list)
+    appln_ids, combination = equivalence_edges(priority_combined)
+    # combinations get negative node IDs so they never collide with appln_ids
+    nodes, labels = connected_components(appln_ids, -combination - 1)
 
-    # Step 1: Collect groups that share patents
-    shared_groups = get_groups_sharing_patents(equiv_list)
-    
-    # Step 2: Remove duplicate groups by using frozenset to make them hashable
-    shared_groups_final = set(frozenset(group_set) for group_set in shared_groups)
+    is_combination = nodes < 0
+    first_combination = np.full(labels.max() + 1, np.iinfo(np.int64).max)
+    np.minimum.at(first_combination, labels[is_combination], -nodes[is_combination] - 1)
+    group_num = np.empty_like(first_combination)
+    group_num[np.argsort(first_combination, kind='stable')] = np.arange(len(first_combination))
 
-    # Step 3: Convert frozensets back to normal sets
-    shared_groups_final = [set(group) for group in shared_groups_final]
+    return pd.DataFrame({'appln_id': nodes[~is_combination],
+                         'eqv_grp_num': group_num[labels[~is_combination]]})
 
-    # Step 4: Track all group numbers that are part of any merged sets
-    shared_group_list_num = set()
-    for shared_group_set in shared_groups_final:
-        for group_id in shared_group_set:
-            shared_group_list_num.add(group_id)
 
-    # Step 5: Identify singleton groups (those that don't share any patents)
-    singleton_groups = set(range(group_count)).difference(shared_group_list_num)
+def diff_priorities(previous_tls204, current_tls204):
+    """
+    Rows of TLS204 added and removed between two releases.
 
-    # Step 6: Add singleton groups as individual sets to the final list
-    singleton_sets = [equiv_list[group_id] for group_id in singleton_groups]
+    Args:
+        previous_tls204 (Path): TLS204.feather of the previous release.
+        current_tls204 (Path): TLS204.feather of the current release.
 
-    # Step 7: Merge groups that share patent
-    merged_groups = []
-    for shared_group_set in shared_groups_final:
-        tmp = set()
-        for group_id in shared_group_set:
-            tmp.update(equiv_list[group_id])
-        merged_groups.append(tmp)
+    Returns:
+        tuple of pd.DataFrame: Added and removed 'appln_id', 'prior_appln_id' rows.
+    """
+    columns = ['appln_id', 'prior_appln_id']
+    both = pd.merge(read_feather(previous_tls204, columns=columns),
+                    read_feather(current_tls204, columns=columns),
+                    how='outer', indicator=True)
+    added = both.loc[both['_merge'] == 'right_only', columns].reset_index(drop=True)
+    removed = both.loc[both['_merge'] == 'left_only', columns].reset_index(drop=True)
+    return added, removed
 
-    # Step 8: Combine both shared and singleton groups
-    final_groups = singleton_sets + merged_groups
 
-    return final_groups
+def update_equivalents(previous, priority_combined, added, removed):
+    """
+    Update the equivalent groups of a previous release with a diff of TLS204,
+    recomputing only the groups the diff touches.
+
+    Groups holding an application or priority of the diff are broken up into
+    their applications; every other group keeps its internal links and enters
+    the graph as a single node, so it can still be merged with the groups
+    being rebuilt. An old group number is kept by the new group holding most
+    of its members; groups made only of new applications get numbers above
+    the previous maximum.
 
+    Args:
+        previous (pd.DataFrame): Previous 'appln_id', 'eqv_grp_num'.
+        priority_combined (pd.DataFrame): `load_and_process_priorities` of
+            the current release.
+        added (pd.DataFrame): TLS204 rows added, see `diff_priorities`.
+        removed (pd.DataFrame): TLS204 rows removed.
 
-def save_equivalents(group_list):
+    Returns:
+        tuple of pd.DataFrame: The updated groups and the changelog, one row
+            per old and new group number of every group that changed, with
+            the 'change' ('new', 'merged', 'split', 'changed' or 'removed').
     """
-    Convert the list of equivalent groups into a DataFrame and save it to a file.
+    prev_appln_id = previous['appln_id'].to_numpy(dtype=np.int64)
+    prev_grp_num = previous['eqv_grp_num'].to_numpy(dtype=np.int64)
+    touched = np.unique(np.concatenate([diff[col].to_numpy(dtype=np.int64)
+                                        for diff in (added, removed)
+                                        for col in ('appln_id', 'prior_appln_id')]))
+    affected = np.isin(prev_grp_num, prev_grp_num[np.isin(prev_appln_id, touched)])
+    rebuilt = np.union1d(prev_appln_id[affected], touched)
+
+    # untouched groups are contracted to one node each, -(eqv_grp_num + 1)
+    group_of = pd.Series(prev_grp_num[~affected], index=prev_appln_id[~affected])
+    n_groups = int(prev_grp_num.max()) + 1 if len(prev_grp_num) else 0
+
+    def node_of(appln_ids):
+        grp_num = group_of.reindex(appln_ids).to_numpy()
+        return np.where(np.isnan(grp_num), appln_ids, -np.nan_to_num(grp_num) - 1).astype(np.int64)
+
+    keys = priority_combined.loc[priority_combined['appln_id'].isin(rebuilt), 'prior_key']
+    claims = priority_combined[priority_combined['prior_key'].isin(keys)]
+    combination, _ = pd.factorize(claims['prior_key'])
+    single = claims['nb_priorities'].to_numpy() == 1
+    # combinations come after the contracted groups in the negative node IDs
+    left = np.concatenate([node_of(claims['appln_id'].to_numpy(dtype=np.int64)),
+                           node_of(claims['first_prior_appln_id'].to_numpy(dtype=np.int64)[single])])
+    right = -n_groups - 1 - np.concatenate([combination, combination[single]])
+    nodes, labels = connected_components(left, right)
+
+    is_appln = nodes >= 0
+    is_group = (nodes < 0) & (nodes >= -n_groups)
+    members = pd.DataFrame({'appln_id': nodes[is_appln], 'component': labels[is_appln]})
+    contracted = pd.DataFrame({'old_eqv_grp_num': -nodes[is_group] - 1,
+                               'component': labels[is_group]})
+
+    # old groups of every new component, with the number of members they share
+    prev_rebuilt = previous.loc[affected, ['appln_id', 'eqv_grp_num']].rename(
+        columns={'eqv_grp_num': 'old_eqv_grp_num'})
+    shares = pd.merge(members, prev_rebuilt, on='appln_id')
+    shares = shares.groupby(['component', 'old_eqv_grp_num']).size().rename('n_members').reset_index()
+    group_size = previous.groupby('eqv_grp_num').size()
+    contracted['n_members'] = group_size.reindex(contracted['old_eqv_grp_num']).to_numpy()
+    shares = pd.concat([shares, contracted], ignore_index=True)
+
+    # each old number goes to the component holding most of its members,
+    # and a component takes the smallest of the numbers it gets
+    owner = shares.sort_values(['old_eqv_grp_num', 'n_members', 'component'],
+                               ascending=[True, False, True]).drop_duplicates('old_eqv_grp_num')
+    numbers = owner.groupby('component')['old_eqv_grp_num'].min()
+    components = np.unique(labels)
+    fresh = np.setdiff1d(components, numbers.index)
+    first_appln = members.groupby('component')['appln_id'].min().reindex(fresh).to_numpy()
+    fresh = fresh[np.argsort(first_appln, kind='stable')]
+    numbers = pd.concat([numbers, pd.Series(np.arange(n_groups, n_groups + len(fresh)), index=fresh)])
+
+    # every group that was not rebuilt or merged keeps its rows and number
+    kept = previous.loc[~affected & ~np.isin(prev_grp_num, contracted['old_eqv_grp_num'])]
+    regrouped = pd.merge(pd.concat([members, pd.merge(contracted, previous.rename(
+        columns={'eqv_grp_num': 'old_eqv_grp_num'}))[['appln_id', 'component']]]),
+        numbers.rename('eqv_grp_num'), left_on='component', right_index=True)
+    equivalents = pd.concat([kept[['appln_id', 'eqv_grp_num']],
+                             regrouped[['appln_id', 'eqv_grp_num']]], ignore_index=True)
+
+    # changelog
+    shares['eqv_grp_num'] = numbers.reindex(shares['component']).to_numpy()
+    n_old = shares.groupby('component')['old_eqv_grp_num'].transform('size')
+    n_new = shares.groupby('old_eqv_grp_num')['component'].transform('size')
+    size_new = regrouped.groupby('component').size()
+    unchanged = ((n_old == 1) & (n_new == 1)
+                 & (shares['n_members'] == group_size.reindex(shares['old_eqv_grp_num']).to_numpy())
+                 & (shares['n_members'] == size_new.reindex(shares['component']).to_numpy())
+                 & (shares['old_eqv_grp_num'] == shares['eqv_grp_num']))
+    shares['change'] = np.select([n_new > 1, n_old > 1], ['split', 'merged'], 'changed')
+    new_groups = pd.DataFrame({'old_eqv_grp_num': pd.NA,
+                               'eqv_grp_num': numbers.reindex(fresh).to_numpy(),
+                               'change': 'new'})
+    dropped = np.setdiff1d(prev_grp_num[affected], shares['old_eqv_grp_num'])
+    removed_groups = pd.DataFrame({'old_eqv_grp_num': dropped, 'eqv_grp_num': pd.NA,
+                                   'change': 'removed'})
+    changelog = pd.concat([shares.loc[~unchanged, ['old_eqv_grp_num', 'eqv_grp_num', 'change']],
+                           new_groups, removed_groups], ignore_index=True)
+    changelog = changelog.astype({'old_eqv_grp_num': 'Int64', 'eqv_grp_num': 'Int64'})
+    return equivalents, changelog
+
+
+def save_equivalents(df):
+    """
+    Save the equivalent groups, ordered by group number.
 
     Args:
-        group_list (list of sets): List where each set contains equivalent application IDs.
+        df (pd.DataFrame): 'appln_id' and 'eqv_grp_num', see `create_equivalents`.
 
     Returns:
         None
     """
-    # Create a list of rows, each containing the group number and the equivalent application IDs
-    data = []
-    for group_num, group in enumerate(group_list):
-        for appln_id in group:
-            data.append({"appln_id": appln_id, "eqv_grp_num": group_num})
+    df = df.sort_values(['eqv_grp_num', 'appln_id'], ignore_index=True)
+    df.to_feather(DATA_FOLDER / "patent_equivalents.feather")
 
-    # Convert the data into a pandas DataFrame
-    df = pd.DataFrame(data)
-    df.sort_values('eqv_grp_num', inplace=True)
 
-    # Save the DataFrame
-    df.to_feather(DATA_FOLDER / "patent_equivalents.feather")
+def parse_args():
+    """
+    Command line options.
+
+    Returns:
+        argparse.Namespace: `previous`, `previous_tls204`, `added` and `removed`.
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--previous", type=Path,
+                        help="patent_equivalents.feather of the previous release; "
+                             "only the groups touched by the TLS204 diff are rebuilt")
+    parser.add_argument("--previous-tls204", type=Path,
+                        help="TLS204.feather of the previous release, to compute the diff from")
+    parser.add_argument("--added", type=Path, help="feather of the TLS204 rows added")
+    parser.add_argument("--removed", type=Path, help="feather of the TLS204 rows removed")
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
+    args = parse_args()
+
     # Load and process priorities
     priority_combined = load_and_process_priorities()
 
-    equiv_0 = priority_combined.groupby('prior_appln_id_str')['appln_id'].agg(list).reset_index()
-    equiv_list = create_equivalents(equiv_0)
-
-    equiv_list_curr = equiv_list
-    changes = True
-    while changes:
-        equiv_list_new = combine_equivalents(equiv_list_curr)
-        print(len(equiv_list_new))
-        if len(equiv_list_curr) == len(equiv_list_new):
-            changes = False
-        equiv_list_curr = equiv_list_new
+    if args.previous is None:
+        equivalents = create_equivalents(priority_combined)
+    else:
+        if args.previous_tls204 is not None:
+            added, removed = diff_priorities(args.previous_tls204, TLS204_PATH)
+        else:
+            added = pd.read_feather(args.added)
+            removed = pd.read_feather(args.removed)
+        print(f"TLS204 diff: {len(added)} rows added, {len(removed)} removed")
+        equivalents, changelog = update_equivalents(pd.read_feather(args.previous),
+                                                    priority_combined, added, removed)
+        print(changelog['change'].value_counts())
+        changelog.to_feather(DATA_FOLDER / "patent_equivalents_changelog.feather")
+    print(equivalents['eqv_grp_num'].nunique())
 
     # checking all groups are mutually exclusive
-    assert len(get_groups_sharing_patents(equiv_list_curr)) == 0, \
+    assert equivalents['appln_id'].is_unique, \
         "Equivalent groups are not mutually exclusive"
-    save_equivalents(equiv_list_curr)
+    save_equivalents(equivalents)
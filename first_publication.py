@@ -3,28 +3,25 @@
 """
 import pandas as pd
 from config import DATA_FOLDER
+from publn_index import MISSING, open_index, resolve_row, take_publications
+from tls201 import read_tls201
+from tls_schema import to_stata
 
 
-TLS201_FILE = DATA_FOLDER / "TLS201.feather"
-TLS211_FILE = DATA_FOLDER / "TLS211.feather"
+applns = read_tls201(['appln_id', 'docdb_family_id','earliest_pat_publn_id'])
 
-
-applns = pd.read_feather(TLS201_FILE, columns=['appln_id', 'docdb_family_id','earliest_pat_publn_id'])
-all_publn = pd.read_feather(TLS211_FILE,
-                            columns=['pat_publn_id',
-                                     'publn_auth',
-                                     'publn_nr',
-                                     'publn_kind',
-                                     'publn_date'])
-
-earliest_publication = pd.merge(applns,
-                                all_publn,
-                                left_on='earliest_pat_publn_id',
-                                right_on='pat_publn_id')
-
-earliest_publication = earliest_publication.drop('earliest_pat_publn_id',
-                                                 axis=1)
-earliest_publication.to_stata(DATA_FOLDER / "first_publn_per_appln.dta",
+# TLS211 row of the earliest publication of every application
+row = resolve_row(open_index(), applns.earliest_pat_publn_id.to_numpy())
+found = row != MISSING
+earliest_publication = pd.concat([applns.loc[found, ['appln_id', 'docdb_family_id']].reset_index(drop=True),
+                                  take_publications(row[found],
+                                                    columns=['pat_publn_id',
+                                                             'publn_auth',
+                                                             'publn_nr',
+                                                             'publn_kind',
+                                                             'publn_date'])],
+                                 axis=1)
+to_stata(earliest_publication, DATA_FOLDER / "first_publn_per_appln.dta",
                               write_index=False,
                               variable_labels={
                                   'appln_id': 'PATSTAT Appln ID',
@@ -0,0 +1,138 @@
+"""
+Traversals of ID graphs
+
+Edges are given as two aligned integer arrays. The node IDs are mapped to
+dense indices, the graph is held as a sparse matrix and its components are
+labelled by scipy in one pass, instead of merging Python sets until they
+stop changing. Chains of parent links are followed to their roots by a
+breadth-first search over the dense indices, instead of repeated self-joins.
+"""
+from typing import Tuple
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components as _connected_components
+
+
+def connected_components(left: np.ndarray, right: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Label the connected components of an undirected graph.
+
+    Args:
+        left (np.ndarray): Source node of every edge.
+        right (np.ndarray): Target node of every edge.
+
+    Returns:
+        tuple: The sorted unique node IDs and the component label of each,
+            labels being numbered from 0 in order of their smallest node.
+    """
+    left = np.asarray(left)
+    right = np.asarray(right)
+    nodes, index = np.unique(np.concatenate([left, right]), return_inverse=True)
+    n_edges = len(left)
+    adjacency = coo_matrix((np.ones(n_edges, dtype=np.int8), (index[:n_edges], index[n_edges:])),
+                           shape=(len(nodes), len(nodes)))
+    _, labels = _connected_components(adjacency, directed=False)
+    return nodes, labels
+
+
+def reach_roots(child: np.ndarray, parent: np.ndarray,
+                bits: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Every root reachable from every linked node by following parent links.
+
+    A node can have several parents, so it can reach several roots, through
+    several paths. Roots are the nodes without parent; a cycle that no link
+    leaves is cut at its smallest node, which becomes its root. The links are
+    followed by a breadth-first search from all nodes at once: the frontier
+    holds (origin, node) pairs and every pass moves it one link up with
+    vectorized lookups in the links sorted by child. A pair is expanded again
+    only when new bits reach it, so cycles end the search.
+
+    Args:
+        child (np.ndarray): Node of every link.
+        parent (np.ndarray): Parent of every link.
+        bits (np.ndarray): Bit flags of every link, e.g. its type.
+
+    Returns:
+        tuple: One entry per (node, root) pair, for every node that is the
+            child of a link: the node ID, the root ID, the number of links of
+            the shortest path to the root, and the OR of the bits of the links
+            of all paths to it. A node that is a root (e.g. linked only to
+            itself) is its own root, with length 0 and no bits.
+    """
+    child = np.asarray(child)
+    parent = np.asarray(parent)
+    bits = np.asarray(bits)
+    nodes, index = np.unique(np.concatenate([child, parent]), return_inverse=True)
+    child_index, parent_index = index[:len(child)], index[len(child):]
+    origins = np.unique(child_index)
+    # a node linked to itself is not its own parent
+    keep = child_index != parent_index
+    child_index, parent_index, bits = child_index[keep], parent_index[keep], bits[keep]
+    n_nodes = len(nodes)
+
+    # roots: nodes without parent, and the smallest node of every cycle (a
+    # strong component with several nodes) that no link leaves
+    adjacency = coo_matrix((np.ones(len(child_index), dtype=np.int8), (child_index, parent_index)),
+                           shape=(n_nodes, n_nodes))
+    n_components, labels = _connected_components(adjacency, directed=True, connection='strong')
+    leaves = np.ones(n_components, dtype=bool)
+    leaves[labels[child_index[labels[child_index] != labels[parent_index]]]] = False
+    first = np.full(n_components, n_nodes)
+    np.minimum.at(first, labels, np.arange(n_nodes))
+    n_parents = np.bincount(child_index, minlength=n_nodes)
+    is_root = (n_parents == 0) | (leaves[labels] & (first[labels] == np.arange(n_nodes)))
+
+    # links sorted by child, as offsets into the parents of every node
+    order = np.argsort(child_index, kind='stable')
+    link_parent, link_bits = parent_index[order], bits[order]
+    link_start = np.concatenate([[0], np.cumsum(n_parents)[:-1]])
+
+    # visited pairs, keyed by origin * n_nodes + node and kept sorted
+    visited_key = origins.astype(np.int64) * n_nodes + origins
+    visited_length = np.zeros(len(origins), dtype=np.int32)
+    visited_bits = np.zeros(len(origins), dtype=bits.dtype)
+    frontier_origin, frontier_node, frontier_bits = origins, origins, visited_bits
+    frontier_length = visited_length
+    while len(frontier_node):
+        counts = n_parents[frontier_node]
+        pair = np.repeat(np.arange(len(frontier_node)), counts)
+        offset = np.arange(len(pair)) - np.repeat(np.cumsum(counts) - counts, counts)
+        link = link_start[frontier_node][pair] + offset
+        key = frontier_origin[pair].astype(np.int64) * n_nodes + link_parent[link]
+        length = frontier_length[pair] + 1
+        path_bits = frontier_bits[pair] | link_bits[link]
+        if not len(key):
+            break
+        # one candidate per pair: shortest length, OR of the bits
+        sorter = np.lexsort((length, key))
+        key, length, path_bits = key[sorter], length[sorter], path_bits[sorter]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        key, length = key[starts], length[starts]
+        path_bits = np.bitwise_or.reduceat(path_bits, starts)
+
+        position = np.searchsorted(visited_key, key)
+        found = position < len(visited_key)
+        found[found] = visited_key[position[found]] == key[found]
+        old_bits = visited_bits[position[found]]
+        grown = (old_bits | path_bits[found]) != old_bits
+        visited_bits[position[found][grown]] |= path_bits[found][grown]
+
+        new = ~found
+        visited_key = np.concatenate([visited_key, key[new]])
+        visited_length = np.concatenate([visited_length, length[new]])
+        visited_bits = np.concatenate([visited_bits, path_bits[new]])
+        sorter = np.argsort(visited_key, kind='stable')
+        visited_key, visited_length, visited_bits = \
+            visited_key[sorter], visited_length[sorter], visited_bits[sorter]
+
+        # new pairs and pairs reached with new bits are expanded next
+        expand = np.concatenate([key[new], key[found][grown]])
+        position = np.searchsorted(visited_key, expand)
+        frontier_origin, frontier_node = expand // n_nodes, expand % n_nodes
+        frontier_length, frontier_bits = visited_length[position], visited_bits[position]
+
+    origin, node = visited_key // n_nodes, visited_key % n_nodes
+    rooted = is_root[node]
+    return (nodes[origin[rooted]], nodes[node[rooted]], visited_length[rooted],
+            visited_bits[rooted])
@@ -0,0 +1,501 @@
+"""
+Streaming ingestion of the PATSTAT CSV shards
+
+Every tlsNNN*.csv shard under RAW_FOLDER is read in fixed-size chunks, each
+chunk is cleaned on its own and appended to an incremental Arrow (Feather) or
+Parquet writer. Peak memory is therefore set by the chunk size and not by the
+size of the table.
+
+With more than one worker, each shard is parsed by its own process into a
+temporary Arrow file, and the parts are then appended to the output in shard
+order, so the row order does not depend on the number of workers.
+
+Column types come from the registry in tls_schema.py. Code columns are
+dictionary encoded against a dictionary that only ever grows, so that every
+chunk can be appended to the same Arrow file as a dictionary delta. As a
+dictionary that was written empty cannot take deltas, leading chunks in which
+a code column is still empty are held back on disk until it has a value.
+"""
+import argparse
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from cleaning import clean_frame
+from config import RAW_FOLDER
+from lake import write_dataset
+import tls_schema
+
+
+CHUNK_SIZE = 1_000_000
+MEMORY_SAMPLE_ROWS = 100_000
+
+
+def list_shards(table_name: str) -> List[Path]:
+    """
+    List the CSV shards of a PATSTAT table in a stable order.
+
+    Args:
+        table_name (str): Table prefix, e.g. 'tls201'.
+
+    Returns:
+        list of Path: Sorted shard paths under RAW_FOLDER.
+    """
+    return sorted(RAW_FOLDER.glob(f"{table_name}*.csv"))
+
+
+def read_chunks(file: Path, chunksize: int = CHUNK_SIZE,
+                **read_csv_kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Read one CSV shard as a sequence of DataFrames of at most `chunksize` rows.
+
+    Args:
+        file (Path): CSV shard.
+        chunksize (int): Number of rows per chunk.
+        **read_csv_kwargs: Passed on to `pd.read_csv` (usecols, dtype, ...).
+
+    Yields:
+        pd.DataFrame: One chunk of the shard.
+    """
+    with pd.read_csv(file, chunksize=chunksize, **read_csv_kwargs) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def clean_chunk(df: pd.DataFrame,
+                strip: Sequence[str] = (),
+                flags: Sequence[str] = (),
+                nonzero: Optional[str] = None,
+                null_dates: bool = False,
+                null_years: bool = False) -> pd.DataFrame:
+    """
+    Apply the per-table cleaning rules of the loaders to one chunk. Stripping
+    and the sentinels run as Arrow kernels, on the columns they concern only
+    (see cleaning.py).
+
+    Args:
+        df (pd.DataFrame): Chunk to clean.
+        strip (sequence of str): String columns to strip.
+        flags (sequence of str): 'Y'/'N' columns to convert to 1/0.
+        nonzero (str, optional): Drop rows where this ID column is 0
+            (PATSTAT's dummy rows).
+        null_dates (bool): Turn the '9999-12-31' sentinel of '*date*' columns into null.
+        null_years (bool): Turn the 9999 sentinel of '*year*' columns into null.
+
+    Returns:
+        pd.DataFrame: Cleaned chunk.
+    """
+    df = clean_frame(df, strip=strip, null_dates=null_dates, null_years=null_years)
+    for col in flags:
+        df[col] = (df[col] == 'Y').astype(int)
+    if nonzero is not None:
+        # a missing ID is not a dummy row
+        df = df[df[nonzero].ne(0).fillna(True).astype(bool)]
+    return df
+
+
+def _fix_schema(schema: pa.Schema) -> pa.Schema:
+    """
+    Type columns that are entirely null (so far) as strings, so that later
+    chunks still fit the schema.
+    """
+    fields = [pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+              for field in schema]
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def _apply_types(table: pa.Table, types: Dict[str, pa.DataType],
+                 dictionaries: Dict[str, pa.Array]) -> pa.Table:
+    """
+    Cast the columns of a chunk to their registry types. Dictionary columns
+    are encoded against the running dictionary of the column, which is
+    extended with the values not seen so far.
+    """
+    for i, field in enumerate(table.schema):
+        target = types.get(field.name)
+        if target is None or field.type == target and not pa.types.is_dictionary(target):
+            continue
+        column = table.column(i)
+        if pa.types.is_dictionary(target):
+            if pa.types.is_dictionary(column.type):
+                column = column.cast(column.type.value_type)
+            values = column.cast(target.value_type)
+            known = dictionaries.get(field.name, pa.array([], target.value_type))
+            unique = pc.unique(values).drop_null()
+            new = unique.filter(pc.invert(pc.is_in(unique, value_set=known)))
+            if len(new) > 0:
+                known = pa.concat_arrays([known, new])
+                dictionaries[field.name] = known
+            indices = pc.index_in(values, value_set=known).cast(target.index_type)
+            column = pa.chunked_array([pa.DictionaryArray.from_arrays(chunk, known)
+                                       for chunk in indices.chunks], type=target)
+        else:
+            column = column.cast(target)
+        table = table.set_column(i, pa.field(field.name, target), column)
+    return table
+
+
+def _open_writer(output_path: Path, schema: pa.Schema, compression: Optional[str] = "lz4"):
+    """
+    Open an incremental writer; Parquet for '.parquet', Feather (Arrow IPC) otherwise.
+    """
+    if output_path.suffix == ".parquet":
+        return pq.ParquetWriter(output_path, schema, compression=compression or "none")
+    options = pa.ipc.IpcWriteOptions(compression=compression, emit_dictionary_deltas=True)
+    return pa.ipc.new_file(output_path, schema, options=options)
+
+
+def _with_dictionaries(table: pa.Table, dictionaries: Dict[str, pa.Array],
+                       names: Iterable[str]) -> pa.Table:
+    """
+    Point the dictionary columns `names` of a typed table at the current
+    running dictionaries. The dictionaries only grow, so the indices stay valid.
+    """
+    for i, field in enumerate(table.schema):
+        if field.name in names:
+            known = dictionaries.get(field.name, pa.array([], field.type.value_type))
+            column = pa.chunked_array([pa.DictionaryArray.from_arrays(chunk.indices, known)
+                                       for chunk in table.column(i).chunks], type=field.type)
+            table = table.set_column(i, field, column)
+    return table
+
+
+class _ChunkWriter:
+    """
+    Incremental writer of typed chunks (see `_apply_types`) to a Feather or
+    Parquet file.
+
+    An Arrow IPC file can extend a dictionary with deltas but cannot replace
+    it, and a dictionary that was written empty cannot be extended. Leading
+    chunks in which a registry code column has no value yet are therefore
+    held back, in an Arrow stream file next to the output, and only written
+    once every dictionary has a value, or at the end.
+    """
+
+    def __init__(self, output_path: Path, types: Dict[str, pa.DataType],
+                 dictionaries: Dict[str, pa.Array], compression: Optional[str] = "lz4"):
+        self.output_path = output_path
+        self.held_path = output_path.with_name(output_path.name + ".held")
+        self.names = [name for name, target in types.items() if pa.types.is_dictionary(target)]
+        self.dictionaries = dictionaries
+        self.compression = compression
+        self.schema = None
+        self.writer = None
+        self.held = None
+
+    def _ready(self) -> bool:
+        return all(len(self.dictionaries.get(name, ())) > 0
+                   for name in self.names if name in self.schema.names)
+
+    def write(self, table: pa.Table) -> None:
+        if self.schema is None:
+            self.schema = _fix_schema(table.schema)
+        table = table.cast(self.schema)
+        if self.writer is None and not self._ready():
+            if self.held is None:
+                self.held = pa.ipc.new_stream(str(self.held_path), self.schema)
+            self.held.write_table(table)
+            return
+        self._open()
+        self.writer.write_table(_with_dictionaries(table, self.dictionaries, self.names))
+
+    def _open(self) -> None:
+        if self.writer is not None:
+            return
+        self.writer = _open_writer(self.output_path, self.schema, self.compression)
+        if self.held is None:
+            return
+        held, self.held = self.held, None
+        held.close()
+        try:
+            with pa.memory_map(str(self.held_path)) as source:
+                for batch in pa.ipc.open_stream(source):
+                    self.writer.write_table(_with_dictionaries(pa.Table.from_batches([batch]),
+                                                               self.dictionaries, self.names))
+        finally:
+            self.held_path.unlink()
+
+    def close(self) -> None:
+        """
+        Write the chunks still held back and close the file.
+        """
+        if self.schema is None:
+            return
+        try:
+            self._open()
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+            if self.held is not None:
+                self.held.close()
+                self.held_path.unlink()
+
+
+def write_chunks(chunks: Iterable[pd.DataFrame], output_path: Path,
+                 types: Optional[Dict[str, pa.DataType]] = None,
+                 compression: Optional[str] = "lz4") -> Tuple[int, pd.Series]:
+    """
+    Append DataFrame chunks to a Feather or Parquet file without holding more
+    than one chunk in memory. The file is written under a temporary name and
+    only moved into place once complete.
+
+    Args:
+        chunks (iterable of pd.DataFrame): Chunks sharing the same columns.
+        output_path (Path): Target '.feather' or '.parquet' file.
+        types (dict, optional): Arrow type per column, see tls_schema.arrow_types.
+        compression (str, optional): Codec of the output file.
+
+    Returns:
+        tuple: Number of rows written and null count per column.
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + ".part")
+    types = types or {}
+    dictionaries: Dict[str, pa.Array] = {}
+    writer = _ChunkWriter(tmp_path, types, dictionaries, compression)
+    n_rows = 0
+    null_counts = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            writer.write(_apply_types(table, types, dictionaries))
+            n_rows += table.num_rows
+            chunk_nulls = chunk.isna().sum()
+            null_counts = chunk_nulls if null_counts is None else null_counts + chunk_nulls
+    finally:
+        writer.close()
+    if writer.schema is None:
+        raise FileNotFoundError(f"No rows to write for {output_path.name}")
+    tmp_path.replace(output_path)
+    return n_rows, null_counts
+
+
+def iter_shard(file: Path,
+               chunksize: int = CHUNK_SIZE,
+               usecols: Optional[Sequence[str]] = None,
+               dtype: Optional[Dict[str, str]] = None,
+               transform: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+               registry: Optional[str] = None,
+               **clean_kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Stream the cleaned chunks of one CSV shard.
+
+    Columns listed in `strip` or `flags` are always parsed as strings, so
+    that a chunk where they happen to be empty keeps the same type as the
+    others.
+
+    Args:
+        file (Path): CSV shard.
+        chunksize (int): Number of CSV rows per chunk.
+        usecols (sequence of str, optional): Columns to read.
+        dtype (dict, optional): Column dtypes passed on to `pd.read_csv`.
+        transform (callable, optional): Table specific step applied to every
+            chunk after the standard cleaning. It must be defined at module
+            level to be usable by worker processes.
+        registry (str, optional): Table whose registry integer columns, read
+            as nullable integers, are narrowed back (see
+            `tls_schema.narrow_ints`).
+        **clean_kwargs: Cleaning rules, see `clean_chunk`.
+
+    Yields:
+        pd.DataFrame: Cleaned chunk.
+    """
+    dtype = dict(dtype or {})
+    for col in clean_kwargs.get("strip", ()):
+        dtype.setdefault(col, str)
+    for col in clean_kwargs.get("flags", ()):
+        dtype[col] = str
+    for chunk in read_chunks(file, chunksize, usecols=usecols, dtype=dtype or None):
+        if registry is not None:
+            chunk = tls_schema.narrow_ints(chunk, registry)
+        chunk = clean_chunk(chunk, **clean_kwargs)
+        if transform is not None:
+            chunk = transform(chunk)
+        yield chunk
+    print(f"Loaded: {file}")
+
+
+def iter_table(table_name: str, **kwargs) -> Iterator[pd.DataFrame]:
+    """
+    Stream the cleaned chunks of all shards of a PATSTAT table.
+
+    Args:
+        table_name (str): Table prefix, e.g. 'tls201'.
+        **kwargs: See `iter_shard`.
+
+    Yields:
+        pd.DataFrame: Cleaned chunk.
+    """
+    for file in list_shards(table_name):
+        yield from iter_shard(file, **kwargs)
+
+
+def _load_shard(file: Path, part_path: Path, kwargs: Dict,
+                types: Dict[str, pa.DataType]) -> Tuple[int, pd.Series]:
+    """
+    Worker: parse one shard into an uncompressed Arrow part file.
+    """
+    return write_chunks(iter_shard(file, **kwargs), part_path, types, compression=None)
+
+
+def _merge_parts(part_paths: Sequence[Path], output_path: Path,
+                 types: Dict[str, pa.DataType], compression: Optional[str] = "lz4") -> None:
+    """
+    Append the part files to the output one record batch at a time, in the
+    given order. Parts whose inferred types differ (e.g. int64 in one shard,
+    float64 in another) are cast to a common schema, and the per-part
+    dictionaries of code columns are re-encoded against one dictionary.
+    """
+    schemas = []
+    for part_path in part_paths:
+        with pa.memory_map(str(part_path)) as source:
+            schemas.append(pa.ipc.open_file(source).schema)
+    arrow_schema = _fix_schema(pa.unify_schemas(schemas, promote_options="permissive"))
+
+    dictionaries: Dict[str, pa.Array] = {}
+    tmp_path = output_path.with_name(output_path.name + ".part")
+    writer = _ChunkWriter(tmp_path, types, dictionaries, compression)
+    try:
+        for part_path in part_paths:
+            with pa.memory_map(str(part_path)) as source:
+                reader = pa.ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    batch = pa.Table.from_batches([reader.get_batch(i)])
+                    writer.write(_apply_types(batch, types, dictionaries).cast(arrow_schema))
+    finally:
+        writer.close()
+    tmp_path.replace(output_path)
+
+
+def _load_parallel(table_name: str, output_path: Path, workers: int,
+                   kwargs: Dict, types: Dict[str, pa.DataType],
+                   compression: Optional[str] = "lz4") -> Tuple[int, pd.Series]:
+    """
+    Parse the shards of a table in a process pool and merge them in shard order.
+    """
+    files = list_shards(table_name)
+    if not files:
+        raise FileNotFoundError(f"No {table_name}*.csv shards under {RAW_FOLDER}")
+    parts_dir = output_path.with_name(output_path.name + ".parts")
+    parts_dir.mkdir(exist_ok=True)
+    part_paths = [parts_dir / f"{i:05d}.arrow" for i in range(len(files))]
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            results = list(pool.map(_load_shard, files, part_paths,
+                                    repeat(kwargs), repeat(types)))
+        _merge_parts(part_paths, output_path, types, compression)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+    n_rows = sum(n for n, _ in results)
+    null_counts = pd.concat([nulls for _, nulls in results], axis=1).sum(axis=1)
+    return n_rows, null_counts
+
+
+def load_table(table_name: str, output_path: Path, workers: int = 1,
+               lake: bool = False, compression: Optional[str] = "lz4", **kwargs) -> Tuple[int, pd.Series]:
+    """
+    Stream a PATSTAT table from its CSV shards into a Feather or Parquet file,
+    with the column types of the tls_schema registry.
+
+    Args:
+        table_name (str): Table prefix, e.g. 'tls201'.
+        output_path (Path): Target '.feather' or '.parquet' file.
+        workers (int): Number of shards parsed in parallel. With 1, the
+            shards are streamed one after the other in this process.
+        lake (bool): Also write the table as a partitioned Parquet dataset,
+            see lake.py.
+        compression (str, optional): Codec of the output file; None writes
+            it uncompressed, so that it can be memory-mapped without copies.
+        **kwargs: See `iter_shard`. A `dtype` given here overrides the
+            registry for the columns it names.
+
+    Returns:
+        tuple: Number of rows written and null count per column.
+    """
+    output_path = Path(output_path)
+    kwargs['dtype'] = {**tls_schema.csv_dtypes(table_name), **(kwargs.get('dtype') or {})}
+    kwargs['registry'] = table_name
+    types = tls_schema.arrow_types(table_name)
+    if workers > 1:
+        n_rows, null_counts = _load_parallel(table_name, output_path, workers, kwargs, types,
+                                             compression)
+    else:
+        n_rows, null_counts = write_chunks(iter_table(table_name, **kwargs), output_path, types,
+                                           compression)
+    print(f"shape of {table_name}=({n_rows}, {len(null_counts)})")
+    if table_name in tls_schema.TABLES:
+        report_memory(table_name, n_rows, kwargs.get('usecols'))
+    if lake:
+        write_dataset(output_path, output_path.stem)
+    return n_rows, null_counts
+
+
+def report_memory(table_name: str, n_rows: int,
+                  usecols: Optional[Sequence[str]] = None) -> None:
+    """
+    Print the in-memory size of a table as a DataFrame, with pandas' inferred
+    dtypes and with the registry dtypes, extrapolated from a sample of its
+    first shard.
+
+    Args:
+        table_name (str): Table prefix, e.g. 'tls201'.
+        n_rows (int): Number of rows of the table.
+        usecols (sequence of str, optional): Columns that were loaded.
+    """
+    sample = pd.read_csv(list_shards(table_name)[0], nrows=MEMORY_SAMPLE_ROWS,
+                         usecols=usecols, low_memory=False)
+    per_row = tls_schema.memory_usage(sample, table_name)
+    inferred = per_row['inferred'] * n_rows / 2**20
+    compact = per_row['compact'] * n_rows / 2**20
+    print(f"memory of {table_name}: {inferred:,.1f} MB inferred, {compact:,.1f} MB "
+          f"with registry dtypes ({inferred - compact:,.1f} MB saved)")
+
+
+def read_table(table_name: str, **kwargs) -> pd.DataFrame:
+    """
+    Read a small PATSTAT table (e.g. TLS801) into memory through the same
+    cleaning path as `load_table`.
+
+    Args:
+        table_name (str): Table prefix, e.g. 'tls801'.
+        **kwargs: See `iter_shard`.
+
+    Returns:
+        pd.DataFrame: The whole table.
+    """
+    df = pd.concat(iter_table(table_name, **kwargs), ignore_index=True)
+    print(f"shape of {table_name}={df.shape}")
+    return df
+
+
+def parse_args(description: Optional[str] = None, lake: bool = False,
+               argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """
+    Command line options shared by the load_TLS_*.py scripts.
+
+    Args:
+        description (str, optional): Help text of the loader.
+        lake (bool): The loader can also write a lake dataset; without it,
+            `--lake` is rejected.
+        argv (sequence of str, optional): Arguments; sys.argv by default.
+
+    Returns:
+        argparse.Namespace: `workers`, `chunksize`, `compression` and, with
+        `lake`, `lake`.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of CSV shards parsed in parallel processes")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE,
+                        help="number of CSV rows parsed per chunk")
+    if lake:
+        parser.add_argument("--lake", action="store_true",
+                            help="also write a partitioned Parquet dataset under LAKE_FOLDER")
+    parser.add_argument("--compression", default="lz4", type=lambda codec: None if codec == "none" else codec,
+                        help="codec of the output file, 'none' to write it uncompressed")
+    return parser.parse_args(argv)
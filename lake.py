@@ -0,0 +1,118 @@
+"""
+Partitioned Parquet output
+
+The large tables are also written as hive-partitioned Parquet datasets under
+LAKE_FOLDER, e.g. lake/TLS201/appln_auth=EP/appln_filing_year=2015/part-0.parquet,
+with min/max statistics on every row group. A consumer that only needs one
+authority or a range of filing years reads them with `read_dataset` (or
+`pd.read_parquet(path, filters=...)`), and only the matching partitions,
+row groups and columns are read from disk.
+"""
+import shutil
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from config import LAKE_FOLDER
+import tls_schema
+
+
+# partition columns of the datasets, by dataset name
+PARTITIONS = {
+    "TLS201": ['appln_auth', 'appln_filing_year'],
+    "TLS211": ['publn_auth'],
+    "TLS212": ['citn_origin'],
+    "pl_citations": ['citn_origin'],
+    "applns_quasi_priorities": ['prior_appln_auth', 'prior_appln_filing_year'],
+    "orbis_parties": ['RoleNbr'],
+}
+ROWS_PER_GROUP = 500_000
+MIN_ROWS_PER_GROUP = 50_000
+MAX_PARTITIONS = 100_000
+
+
+def dataset_path(name: str) -> Path:
+    """
+    Directory of a dataset in the lake.
+
+    Args:
+        name (str): Dataset name, e.g. 'TLS201'.
+
+    Returns:
+        Path: Dataset directory.
+    """
+    return LAKE_FOLDER / name
+
+
+def write_dataset(data: Union[pd.DataFrame, pa.Table, pa.RecordBatchReader, Path], name: str,
+                  partition_cols: Optional[Sequence[str]] = None,
+                  compression: str = "zstd") -> Path:
+    """
+    Write a table as a partitioned Parquet dataset, replacing any previous
+    version once the new one is complete. A Feather file or a record batch
+    reader is streamed batch by batch rather than read into memory.
+
+    Args:
+        data (pd.DataFrame, pa.Table, pa.RecordBatchReader or Path): Table,
+            batches or Feather file to write.
+        name (str): Dataset name, see `PARTITIONS`.
+        partition_cols (sequence of str, optional): Partition columns;
+            defaults to `PARTITIONS[name]`, no partitioning if not listed.
+        compression (str): Codec of the Parquet files.
+
+    Returns:
+        Path: Dataset directory.
+    """
+    if isinstance(data, pd.DataFrame):
+        data = pa.Table.from_pandas(data, preserve_index=False)
+        # pandas dates are datetime64; store them as dates again
+        data = data.cast(pa.schema([pa.field(field.name, pa.date32()) if pa.types.is_timestamp(field.type)
+                                    else field for field in data.schema], metadata=data.schema.metadata))
+    elif isinstance(data, (str, Path)):
+        data = ds.dataset(data, format="feather")
+    if partition_cols is None:
+        partition_cols = PARTITIONS.get(name, [])
+    partitioning = None
+    if partition_cols:
+        partitioning = ds.partitioning(pa.schema([data.schema.field(col) for col in partition_cols]),
+                                       flavor="hive")
+
+    output_path = dataset_path(name)
+    tmp_path = output_path.with_name(output_path.name + ".part")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    file_options = ds.ParquetFileFormat().make_write_options(compression=compression,
+                                                             write_statistics=True)
+    ds.write_dataset(data, tmp_path, format="parquet",
+                     partitioning=partitioning,
+                     file_options=file_options,
+                     basename_template="part-{i}.parquet",
+                     max_partitions=MAX_PARTITIONS,
+                     max_rows_per_group=ROWS_PER_GROUP,
+                     min_rows_per_group=MIN_ROWS_PER_GROUP)
+    shutil.rmtree(output_path, ignore_errors=True)
+    tmp_path.replace(output_path)
+    print(f"Written dataset: {output_path}")
+    return output_path
+
+
+def read_dataset(name: str, columns: Optional[List[str]] = None,
+                 filters: Optional[List[Tuple]] = None) -> pd.DataFrame:
+    """
+    Read a lake dataset, with the filters pushed down to the partitions and
+    row group statistics. Partition columns come back as plain strings and
+    numbers; dates as datetime64, as with `tls_schema.read_feather`.
+
+    Args:
+        name (str): Dataset name, e.g. 'TLS201'.
+        columns (list of str, optional): Columns to read.
+        filters (list of tuple, optional): Conditions such as
+            [('appln_auth', '==', 'EP'), ('appln_filing_year', '>=', 2010)].
+
+    Returns:
+        pd.DataFrame: The matching rows.
+    """
+    dataset = ds.dataset(dataset_path(name), format="parquet", partitioning="hive")
+    expression = pq.filters_to_expression(filters) if filters else None
+    return tls_schema.to_pandas(dataset.to_table(columns=columns, filter=expression))
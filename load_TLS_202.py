@@ -1,18 +1,22 @@
-import pandas as pd
-from config import RAW_FOLDER, DATA_FOLDER
+from config import DATA_FOLDER
+from ingest import load_table, parse_args
 
 
 TABLE_NAME = "tls202"
-files_list = []
-for file in RAW_FOLDER.glob(f"{TABLE_NAME}*.csv"):
-    _df = pd.read_csv(file, low_memory=False, usecols=['appln_id', 'appln_title_lg'])
-    print(f"Loaded: {file}")
-    files_list.append(_df)
-df = pd.concat(files_list, ignore_index=True)
-print(df.isna().sum())
-df['appln_title_lg'] = df['appln_title_lg'].str.strip().str.lower()
-assert sum(df['appln_title_lg'] == '') == 0
-del files_list
-print(f"shape of {TABLE_NAME}={df.shape}")
-#df.to_feather(DATA_FOLDER / f"{TABLE_NAME.upper()}.feather")
-df.to_feather(DATA_FOLDER / "appln_title_lg.feather")
+
+
+def clean_title_lg(df):
+    df['appln_title_lg'] = df['appln_title_lg'].str.strip().str.lower()
+    assert sum(df['appln_title_lg'] == '') == 0
+    return df
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    _, null_counts = load_table(TABLE_NAME, DATA_FOLDER / "appln_title_lg.feather",
+                                usecols=['appln_id', 'appln_title_lg'],
+                                dtype={'appln_title_lg': str},
+                                transform=clean_title_lg,
+                                workers=args.workers, chunksize=args.chunksize,
+                                compression=args.compression)
+    print(null_counts)
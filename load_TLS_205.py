@@ -13,17 +13,15 @@
 
 ######################################################################
 
-import pandas as pd
-from config import RAW_FOLDER, DATA_FOLDER
+from config import DATA_FOLDER
+from ingest import load_table, parse_args
 
 
 TABLE_NAME = "tls205"
-files_list = []
-for file in RAW_FOLDER.glob(f"{TABLE_NAME}*.csv"):
-    _df = pd.read_csv(file, low_memory=False)
-    print(f"Loaded: {file}")
-    files_list.append(_df)
-df = pd.concat(files_list, ignore_index=True)
-del files_list
-print(f"shape of {TABLE_NAME}={df.shape}")
-df.to_feather(DATA_FOLDER / f"{TABLE_NAME.upper()}.feather")
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    load_table(TABLE_NAME, DATA_FOLDER / f"{TABLE_NAME.upper()}.feather",
+               workers=args.workers, chunksize=args.chunksize,
+               compression=args.compression)
@@ -0,0 +1,145 @@
+"""
+Local SQL over the processed PATSTAT files
+
+The local counterpart of dbutil.py: instead of querying the MySQL server,
+queries run in an embedded DuckDB database over the files under DATA_FOLDER.
+Every Feather file is a view named after the file (TLS201, TLS212,
+patent_equivalents, ...), every .dta file too (pl_citations, earliest_priority,
+...), and every lake dataset a view prefixed with lake_ (lake_TLS201, ...).
+
+Feather files and lake datasets are registered as Arrow datasets, so DuckDB
+only reads the columns a query uses and pushes its filters down to the
+record batches, Parquet row groups and hive partitions. Stata files cannot be
+scanned in place: they are mirrored once into Feather files under
+DATA_FOLDER/sql, refreshed when the .dta file changes. Queries run on all
+cores.
+
+    from localdb import query
+    query('''SELECT c.citn_origin, count(*) AS n
+             FROM pl_citations c JOIN US_provisional_to_appln_link u
+             ON c.cited_appln_id = u.provisional_appln_id
+             GROUP BY 1''')
+"""
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+from config import DATA_FOLDER, LAKE_FOLDER
+
+
+SQL_FOLDER = DATA_FOLDER / "sql"
+
+_CONNECTION: Optional[duckdb.DuckDBPyConnection] = None
+
+
+def stata_mirror(path: Path, folder: Path) -> Path:
+    """
+    Feather copy of a Stata file, written again when the Stata file is newer.
+    Value-labelled columns keep their labels as strings.
+    """
+    mirror = folder / (path.stem + ".feather")
+    if not mirror.exists() or mirror.stat().st_mtime < path.stat().st_mtime:
+        folder.mkdir(parents=True, exist_ok=True)
+        tmp_path = mirror.with_name(mirror.name + ".part")
+        feather.write_feather(pd.read_stata(path), tmp_path)
+        tmp_path.replace(mirror)
+    return mirror
+
+
+def sources(folder: Path = DATA_FOLDER) -> Dict[str, ds.Dataset]:
+    """
+    Arrow dataset of every file a view is made of, by view name.
+
+    Args:
+        folder (Path): Data folder.
+
+    Returns:
+        dict: View name to dataset.
+    """
+    datasets = {}
+    for path in sorted(folder.glob("*.dta")):
+        datasets[path.stem] = ds.dataset(stata_mirror(path, folder / SQL_FOLDER.name),
+                                         format="feather")
+    for path in sorted(folder.glob("*.feather")):
+        datasets[path.stem] = ds.dataset(path, format="feather")
+    lake_folder = folder / LAKE_FOLDER.name
+    if lake_folder.exists():
+        for path in sorted(p for p in lake_folder.iterdir() if p.is_dir()):
+            datasets[f"lake_{path.name}"] = ds.dataset(path, format="parquet", partitioning="hive")
+    return datasets
+
+
+def connect(folder: Path = DATA_FOLDER, threads: Optional[int] = None) -> duckdb.DuckDBPyConnection:
+    """
+    In-memory DuckDB database with a view on every file of the data folder.
+
+    Args:
+        folder (Path): Data folder.
+        threads (int, optional): Query threads; all cores by default.
+
+    Returns:
+        duckdb.DuckDBPyConnection: The database.
+    """
+    conn = duckdb.connect(config={'threads': threads} if threads else {})
+    for name, dataset in sources(folder).items():
+        conn.register(name, dataset)
+    return conn
+
+
+def get_connection() -> duckdb.DuckDBPyConnection:
+    """
+    Shared connection over DATA_FOLDER, opened on first use.
+
+    Returns:
+        duckdb.DuckDBPyConnection: The database.
+    """
+    global _CONNECTION
+    if _CONNECTION is None:
+        _CONNECTION = connect()
+    return _CONNECTION
+
+
+def close_connection() -> None:
+    """
+    Close the shared connection; the next query registers the files again.
+    """
+    global _CONNECTION
+    if _CONNECTION is not None:
+        _CONNECTION.close()
+        _CONNECTION = None
+
+
+def query_arrow(sql: str, query_param: Optional[Sequence] = None,
+                conn: Optional[duckdb.DuckDBPyConnection] = None) -> pa.Table:
+    """
+    Run a query and return the result as an Arrow table.
+
+    Args:
+        sql (str): SQL, with ? or $1 placeholders for the parameters.
+        query_param (sequence, optional): Parameter values.
+        conn (duckdb.DuckDBPyConnection, optional): Database; the shared one by default.
+
+    Returns:
+        pa.Table: The result.
+    """
+    conn = conn or get_connection()
+    return conn.execute(sql, query_param or []).to_arrow_table()
+
+
+def query(sql: str, query_param: Optional[Sequence] = None,
+          conn: Optional[duckdb.DuckDBPyConnection] = None) -> pd.DataFrame:
+    """
+    Run a query and return the result as a DataFrame.
+
+    Args:
+        sql (str): SQL, with ? or $1 placeholders for the parameters.
+        query_param (sequence, optional): Parameter values.
+        conn (duckdb.DuckDBPyConnection, optional): Database; the shared one by default.
+
+    Returns:
+        pd.DataFrame: The result.
+    """
+    return query_arrow(sql, query_param, conn).to_pandas()
@@ -2,15 +2,22 @@
 Generate PCT filings
 """
 import pandas as pd
-from config import DATA_FOLDER
+import pyarrow.feather as feather
+from config import DATA_FOLDER, SPILL_FOLDER
+from spill import join_to_file
+from stata import write_dta
+from tls201 import TLS201_FILE, read_tls201
+from tls_schema import to_stata
 
 
-TLS201_FILE = DATA_FOLDER / "TLS201.feather"
 PRIOTITY_FILE = DATA_FOLDER / "earliest_priority.dta"
 APPLN_PCT_LINK_FILE = DATA_FOLDER / "appln_PCT_link.dta"
 
 
-tls201_df = pd.read_feather(TLS201_FILE)
+tls201_df = read_tls201(['appln_id', 'appln_auth', 'appln_nr', 'appln_kind',
+                         'appln_filing_date', 'appln_nr_epodoc', 'appln_nr_original', 'ipr_type',
+                         'receiving_office', 'earliest_publn_date', 'earliest_pat_publn_id',
+                         'docdb_family_id'])
 priority_data = pd.read_stata(PRIOTITY_FILE)
 PCT_filings = tls201_df.query("appln_auth=='WO'").copy()
 obscheck = PCT_filings.shape[0]
@@ -43,7 +50,7 @@ varibale_label ={
     'earliest_pat_publn_id': 'Earliest PAT PUBLN ID (TLS211)',
     'docdb_family_id': 'DOCDB Family ID'
 }
-PCT_filings.to_stata(DATA_FOLDER / "PCT_filings.dta",
+to_stata(PCT_filings, DATA_FOLDER / "PCT_filings.dta",
                      write_index=False,
                      variable_labels=varibale_label)
 
@@ -56,11 +63,14 @@ PCT_filings = PCT_filings.rename(columns={
     'appln_nr_original': 'WO_appln_nr_original',
     'appln_filing_date': 'WO_filing_date'
 })
-PCT_2_NAT_filings = pd.merge(PCT_filings,
-                             tls201_df[['appln_id', 'appln_auth', 'appln_kind', 'appln_nr', 'appln_nr_epodoc', 'appln_nr_original', 'appln_filing_date', 'docdb_family_id']],
-                             on='docdb_family_id')
-assert PCT_2_NAT_filings.WO_appln_id.unique().shape[0] == PCT_filings.WO_appln_id.unique().shape[0]
-PCT_2_NAT_filings = PCT_2_NAT_filings.query("WO_appln_id!=appln_id").copy()
+# the family join can exceed memory: DuckDB runs it over TLS201.feather into a
+# spill file, which is exported memory-mapped (see spill.py)
+assert PCT_filings.docdb_family_id.isin(tls201_df.docdb_family_id).all()
+PCT_2_NAT_FILE = SPILL_FOLDER / "PCT_national_filings.feather"
+join_to_file(PCT_filings, TLS201_FILE, PCT_2_NAT_FILE, on='docdb_family_id',
+             columns=list(PCT_filings.columns) + ['appln_id', 'appln_auth', 'appln_kind', 'appln_nr',
+                                                  'appln_nr_epodoc', 'appln_nr_original', 'appln_filing_date'],
+             where="WO_appln_id <> appln_id")
 
 varibale_label_2 = {
     'WO_appln_id': 'PCT Appln ID',
@@ -77,9 +87,9 @@ varibale_label_2 = {
     'appln_nr_original': 'Orig. Appln Nr. (Family)',
     'appln_filing_date': 'Filing Date (Family Member)'
 }
-PCT_2_NAT_filings.to_stata(DATA_FOLDER / "PCT_national_filings.dta",
-                           write_index=False,
-                           variable_labels=varibale_label_2)
+write_dta(feather.read_table(PCT_2_NAT_FILE, memory_map=True), DATA_FOLDER / "PCT_national_filings.dta",
+          variable_labels=varibale_label_2)
+PCT_2_NAT_FILE.unlink()
 
 ############### PCT families ################################################
 appln_PCT_link = pd.read_stata(APPLN_PCT_LINK_FILE)
@@ -93,5 +103,5 @@ df_2_add_appln = pd.DataFrame(list_2_add_wo_appln, columns=appln_PCT_link.column
 appln_PCT_link = pd.concat([appln_PCT_link, df_2_add_appln], ignore_index=True)
 appln_PCT_link.sort_values('WO_appln_id', inplace=True)
 appln_PCT_link.reset_index(drop=True, inplace=True)
-appln_PCT_link.to_stata(DATA_FOLDER / "PCT_families.dta",
-                        write_index=False)
+to_stata(appln_PCT_link, DATA_FOLDER / "PCT_families.dta",
+         write_index=False)
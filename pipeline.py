@@ -0,0 +1,369 @@
+"""
+Run the PATSTAT pipeline
+
+Every script is declared as a step with the files it reads and writes. The
+steps form a DAG through these files: a step runs once the steps producing
+its inputs are done, independent steps run concurrently in a process pool,
+and a step whose outputs are newer than its inputs (and its script and the
+local modules it imports) is skipped. With --cache, derived steps are served from a content-hash build
+cache when their inputs and code have been seen before. At the end, the
+critical path of the run is printed with the time of each step on it.
+
+    python pipeline.py --jobs 4                  # the whole pipeline
+    python pipeline.py address.py                # one step and what it needs
+    python pipeline.py --dry-run                 # show what would run
+"""
+import argparse
+import runpy
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import build_cache
+from config import DATA_FOLDER
+from ingest import list_shards
+
+
+SCRIPT_FOLDER = Path(__file__).resolve().parent
+EPWO_LINK_PATH = Path(r"E:\PERSONS\Mainak Ghosh\epwo_linkage\data\EP_WO_link_till_2023.dta")
+ORBIS_IP_PATSTAT_MATCH = Path(r"E:\PERSONS\Mainak Ghosh\Orbis_PATSTAT_match\Data")
+
+
+class Step(NamedTuple):
+    """
+    A script with the raw TLS tables and the files it reads, and the files it writes.
+    """
+    script: str
+    outputs: Tuple[str, ...]
+    inputs: Tuple[str, ...] = ()
+    tables: Tuple[str, ...] = ()
+    external: Tuple[Path, ...] = ()
+
+
+def _loader(table_name: str, *outputs: str) -> Step:
+    """
+    Step of a load_TLS_*.py script.
+    """
+    outputs = outputs or (f"{table_name.upper()}.feather",)
+    return Step(f"load_TLS_{table_name[3:]}.py", outputs, tables=(table_name,))
+
+
+STEPS: List[Step] = [
+    _loader("tls201"),
+    _loader("tls202", "appln_title_lg.feather"),
+    _loader("tls203", "appln_abstract_lg.feather"),
+    _loader("tls204"),
+    _loader("tls205"),
+    _loader("tls206", "TLS206.feather", "person_names.feather", "person_ctry_code.dta",
+            "person_sector.dta", "person_address.feather"),
+    _loader("tls207", "TLS207.feather", "applicants_TLS207.dta", "inventors_TLS207.dta"),
+    _loader("tls211"),
+    _loader("tls212"),
+    _loader("tls214"),
+    _loader("tls216"),
+    _loader("tls224"),
+    _loader("tls225"),
+    _loader("tls231"),
+    _loader("tls801", "TLS801.dta"),
+    _loader("tls803"),
+    Step("publn_index.py", ("publn_index",), ("TLS211.feather",)),
+    Step("appln_pct_link.py", ("appln_PCT_link.dta",), ("TLS201.feather",),
+         external=(EPWO_LINK_PATH,)),
+    Step("applns_priorities.py", ("first_filings.dta", "earliest_priority.dta"),
+         ("TLS201.feather", "TLS204.feather")),
+    Step("appln_docdb_id.py", ("appln_docdb_number.dta",), ("TLS201.feather",)),
+    Step("appln_short_metadata.py", ("appln_docdb_number.dta", "appln_meta_info_short.dta"),
+         ("TLS201.feather",)),
+    Step("first_publication.py", ("first_publn_per_appln.dta",),
+         ("TLS201.feather", "TLS211.feather", "publn_index")),
+    Step("pct_filings.py", ("PCT_filings.dta", "PCT_national_filings.dta", "PCT_families.dta"),
+         ("TLS201.feather", "earliest_priority.dta", "appln_PCT_link.dta")),
+    Step("equivalents.py", ("patent_equivalents.feather",), ("TLS204.feather",)),
+    Step("applns_quasi_priorities.py", ("applns_quasi_priorities.dta", "lake/applns_quasi_priorities"),
+         ("TLS201.feather", "TLS204.feather", "TLS205.feather", "TLS216.feather",
+          "appln_PCT_link.dta")),
+    Step("quasi_priority_chains.py", ("applns_quasi_priority_roots.dta",),
+         ("TLS201.feather", "applns_quasi_priorities.dta")),
+    Step("us_provisional_appln_linking.py", ("US_provisional_to_appln_link.dta",),
+         ("TLS201.feather", "TLS204.feather", "appln_PCT_link.dta")),
+    Step("patent_citations.py", ("pl_citations.dta", "npl_citations.dta", "lake/pl_citations"),
+         ("TLS212.feather", "appln_PCT_link.dta", "publn_index")),
+    Step("applicant_names.py", ("applicantnames.feather", "1stapplicantnames.feather"),
+         ("TLS201.feather", "applicants_TLS207.dta", "person_names.feather")),
+    Step("address.py", ("applicants_addresses.feather",
+                        "priority_applicants_addresses.feather",
+                        "DOCDB_earliest_file_applicants_addresses.feather",
+                        "inventors_addresses.feather",
+                        "priority_inventors_addresses.feather", "lake/orbis_parties"),
+         ("TLS201.feather", "applicants_TLS207.dta", "inventors_TLS207.dta",
+          "person_address.feather", "person_ctry_code.dta", "PCT_families.dta",
+          "patent_equivalents.feather", "earliest_priority.dta", "appln_docdb_number.dta"),
+         external=(ORBIS_IP_PATSTAT_MATCH / "OrbisIP_Patent_Paties.feather",
+                   ORBIS_IP_PATSTAT_MATCH / "OrbisIP_patstat_matched_0.feather")),
+]
+
+
+def build_dag(steps: Sequence[Step]) -> Dict[str, List[str]]:
+    """
+    Upstream steps of every step. A step depends on the steps writing its
+    inputs; steps writing the same file run one after the other, in the
+    order they are declared, and readers wait for the last of them.
+
+    Args:
+        steps (sequence of Step): Declared steps.
+
+    Returns:
+        dict: Script name to the script names it depends on.
+    """
+    producer: Dict[str, str] = {}
+    upstream: Dict[str, List[str]] = {step.script: [] for step in steps}
+    for step in steps:
+        for output in step.outputs:
+            if output in producer:
+                upstream[step.script].append(producer[output])
+            producer[output] = step.script
+    for step in steps:
+        for file in step.inputs:
+            if file not in producer:
+                raise ValueError(f"{step.script}: no step writes {file}")
+            if producer[file] not in upstream[step.script]:
+                upstream[step.script].append(producer[file])
+    return upstream
+
+
+def select_steps(steps: Sequence[Step], upstream: Dict[str, List[str]],
+                 targets: Sequence[str]) -> List[Step]:
+    """
+    The target steps and everything upstream of them, in declaration order.
+
+    Args:
+        steps (sequence of Step): Declared steps.
+        upstream (dict): See `build_dag`.
+        targets (sequence of str): Script names; all steps if empty.
+
+    Returns:
+        list of Step: Steps to consider.
+    """
+    if not targets:
+        return list(steps)
+    unknown = set(targets) - set(upstream)
+    if unknown:
+        raise ValueError(f"Unknown steps: {', '.join(sorted(unknown))}")
+    needed = set()
+    stack = list(targets)
+    while stack:
+        script = stack.pop()
+        if script not in needed:
+            needed.add(script)
+            stack.extend(upstream[script])
+    return [step for step in steps if step.script in needed]
+
+
+def _input_paths(step: Step) -> List[Path]:
+    """
+    Files whose changes make the outputs of a step stale: its script and the
+    local modules it imports, directly or not, included.
+    """
+    paths = build_cache.local_modules(SCRIPT_FOLDER / step.script)
+    paths += [DATA_FOLDER / file for file in step.inputs]
+    paths += list(step.external)
+    for table_name in step.tables:
+        paths += list_shards(table_name)
+    return paths
+
+
+def is_up_to_date(step: Step) -> bool:
+    """
+    Whether every output of a step exists and is newer than all its inputs.
+
+    Args:
+        step (Step): Step to check.
+
+    Returns:
+        bool: True if the step can be skipped.
+    """
+    outputs = [DATA_FOLDER / file for file in step.outputs]
+    if not all(path.exists() for path in outputs):
+        return False
+    inputs = [path for path in _input_paths(step) if path.exists()]
+    if not inputs:
+        return True
+    return min(path.stat().st_mtime for path in outputs) >= max(path.stat().st_mtime for path in inputs)
+
+
+def _outputs(step: Step) -> Dict[str, Path]:
+    """
+    Outputs of a step by name, as stored in the build cache.
+    """
+    return {file: DATA_FOLDER / file for file in step.outputs}
+
+
+def _run_step(script: str) -> float:
+    """
+    Worker: run a script as __main__ and return its run time in seconds.
+    """
+    start = time.perf_counter()
+    sys.argv = [script]
+    runpy.run_path(str(SCRIPT_FOLDER / script), run_name="__main__")
+    return time.perf_counter() - start
+
+
+def run(steps: Sequence[Step], upstream: Dict[str, List[str]], jobs: int = 1,
+        force: bool = False, dry_run: bool = False,
+        cache_size: Optional[int] = None) -> Dict[str, Optional[float]]:
+    """
+    Run the steps in dependency order, up to `jobs` at a time.
+
+    Args:
+        steps (sequence of Step): Steps to run, see `select_steps`.
+        upstream (dict): See `build_dag`.
+        jobs (int): Number of steps run concurrently.
+        force (bool): Run steps even if they are up to date.
+        dry_run (bool): Only print the steps that would run.
+        cache_size (int, optional): Size limit in bytes of the build cache
+            (see build_cache.py) for the steps that do not read raw TLS
+            shards; no cache if None.
+
+    Returns:
+        dict: Run time of every step in seconds, None for skipped steps.
+    """
+    by_script = {step.script: step for step in steps}
+    pending = [step.script for step in steps]
+    done: Dict[str, Optional[float]] = {}
+    running = {}
+    failed = []
+    keys: Dict[str, str] = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            progressed = False
+            for script in list(pending):
+                if len(running) >= jobs:
+                    break
+                deps = [dep for dep in upstream[script] if dep in by_script]
+                if any(dep in failed for dep in deps):
+                    pending.remove(script)
+                    failed.append(script)
+                    progressed = True
+                    print(f"Cancelled: {script} (upstream step failed)")
+                    continue
+                if not all(dep in done for dep in deps):
+                    continue
+                pending.remove(script)
+                progressed = True
+                step = by_script[script]
+                # in a dry run, upstream steps that would run do not touch their outputs
+                stale_upstream = dry_run and any(done[dep] is not None for dep in deps)
+                missing = [str(path) for path in step.external if not path.exists()]
+                if not force and not stale_upstream and is_up_to_date(step):
+                    done[script] = None
+                    print(f"Up to date: {script}")
+                elif dry_run:
+                    done[script] = 0.0
+                    print(f"Would run: {script}")
+                elif missing:
+                    failed.append(script)
+                    print(f"Failed: {script}: missing {', '.join(missing)}")
+                else:
+                    if cache_size is not None and not step.tables:
+                        keys[script] = build_cache.step_key(
+                            SCRIPT_FOLDER / script,
+                            [DATA_FOLDER / file for file in step.inputs] + list(step.external))
+                        if build_cache.restore(keys[script], _outputs(step)):
+                            done[script] = 0.0
+                            print(f"Restored from cache: {script}")
+                            continue
+                    print(f"Running: {script}")
+                    running[pool.submit(_run_step, script)] = script
+            if not running:
+                if pending and not progressed:
+                    raise RuntimeError(f"Circular dependencies between {', '.join(pending)}")
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                script = running.pop(future)
+                try:
+                    done[script] = future.result()
+                    print(f"Finished: {script} ({done[script]:,.1f} s)")
+                    if script in keys:
+                        build_cache.store(keys[script], _outputs(by_script[script]), cache_size)
+                except BaseException as err:
+                    failed.append(script)
+                    print(f"Failed: {script}: {err!r}")
+    if failed:
+        raise RuntimeError(f"Steps failed or cancelled: {', '.join(failed)}")
+    return done
+
+
+def critical_path(steps: Sequence[Step], upstream: Dict[str, List[str]],
+                  timings: Dict[str, Optional[float]]) -> Tuple[float, List[str]]:
+    """
+    Longest chain of dependent steps, weighted by their run time.
+
+    Args:
+        steps (sequence of Step): Steps in declaration order (upstream first).
+        upstream (dict): See `build_dag`.
+        timings (dict): See `run`.
+
+    Returns:
+        tuple: Length of the critical path in seconds and its steps in order.
+    """
+    finish: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    for step in steps:
+        deps = [dep for dep in upstream[step.script] if dep in finish]
+        last = max(deps, key=finish.get, default=None)
+        finish[step.script] = (timings.get(step.script) or 0.0) + (finish[last] if last else 0.0)
+        previous[step.script] = last
+    script = max(finish, key=finish.get, default=None)
+    path = []
+    while script is not None:
+        path.append(script)
+        script = previous[script]
+    return (finish[path[0]] if path else 0.0), path[::-1]
+
+
+def report(steps: Sequence[Step], upstream: Dict[str, List[str]],
+           timings: Dict[str, Optional[float]], wall_time: float) -> None:
+    """
+    Print the critical path of a run with the time of each step on it.
+    """
+    length, path = critical_path(steps, upstream, timings)
+    total = sum(t for t in timings.values() if t)
+    print(f"\nWall time {wall_time:,.1f} s, sum of step times {total:,.1f} s")
+    print(f"Critical path ({length:,.1f} s):")
+    for script in path:
+        timing = timings.get(script)
+        print(f"  {script:<36} {'skipped' if timing is None else f'{timing:,.1f} s':>12}")
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Command line options.
+
+    Returns:
+        argparse.Namespace: `targets`, `jobs`, `force`, `dry_run`, `cache` and `cache_size`.
+    """
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="*",
+                        help="scripts to bring up to date, with the steps they depend on (default: all)")
+    parser.add_argument("--jobs", type=int, default=1, help="number of steps run concurrently")
+    parser.add_argument("--force", action="store_true", help="run steps even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only print the steps that would run")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse outputs of derived steps from the content-hash build cache")
+    parser.add_argument("--cache-size", type=float, default=build_cache.CACHE_SIZE / 2**30,
+                        help="size limit of the build cache in GB (default: %(default)s)")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    upstream = build_dag(STEPS)
+    steps = select_steps(STEPS, upstream, args.targets)
+    start = time.perf_counter()
+    timings = run(steps, upstream, jobs=args.jobs, force=args.force, dry_run=args.dry_run,
+                  cache_size=int(args.cache_size * 2**30) if args.cache else None)
+    if not args.dry_run:
+        report(steps, upstream, timings, time.perf_counter() - start)
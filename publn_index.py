@@ -0,0 +1,186 @@
+"""
+Dense lookup index of TLS211 publications
+
+pat_publn_id is a dense-ish integer, so the appln_id, the publn_auth code and
+the TLS211 row of every publication are stored in arrays indexed by
+pat_publn_id itself. The arrays are built once from TLS211.feather into .npy
+files and memory-mapped, so resolving an array of IDs is a NumPy fancy index
+instead of a hash merge against the 100M+ rows of TLS211.
+"""
+import shutil
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+from config import DATA_FOLDER
+import tls_schema
+
+
+TLS211_FILE = DATA_FOLDER / "TLS211.feather"
+INDEX_FOLDER = DATA_FOLDER / "publn_index"
+MISSING = -1
+
+
+class PublnIndex(NamedTuple):
+    """
+    Memory-mapped arrays indexed by pat_publn_id; MISSING for unknown IDs.
+    """
+    appln_id: np.ndarray
+    publn_auth: np.ndarray
+    row: np.ndarray
+    auths: np.ndarray
+
+
+def build_index(tls211_path: Path = TLS211_FILE, folder: Path = INDEX_FOLDER) -> None:
+    """
+    Build the index files from TLS211.feather, one record batch at a time.
+
+    Args:
+        tls211_path (Path): TLS211 Feather file.
+        folder (Path): Directory of the index files.
+    """
+    tmp_folder = folder.with_name(folder.name + ".part")
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    tmp_folder.mkdir(parents=True)
+    columns = ['pat_publn_id', 'appln_id', 'publn_auth']
+    with pa.memory_map(str(tls211_path)) as source:
+        reader = pa.ipc.open_file(source)
+        size = 1
+        for i in range(reader.num_record_batches):
+            size = max(size, pc.max(reader.get_batch(i).column('pat_publn_id')).as_py() + 1)
+        appln_id = np.lib.format.open_memmap(tmp_folder / "appln_id.npy", mode="w+",
+                                             dtype=np.int32, shape=(size,))
+        publn_auth = np.lib.format.open_memmap(tmp_folder / "publn_auth.npy", mode="w+",
+                                               dtype=np.int16, shape=(size,))
+        row = np.lib.format.open_memmap(tmp_folder / "row.npy", mode="w+",
+                                        dtype=np.int64, shape=(size,))
+        appln_id[:] = MISSING
+        publn_auth[:] = MISSING
+        row[:] = MISSING
+
+        auths = pd.Index([], dtype=object)
+        offset = 0
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i).select(columns)
+            pat_publn_id = batch.column('pat_publn_id').to_numpy()
+            # a null appln_id would turn into NaN, and then garbage in the int32 array
+            appln_id[pat_publn_id] = pc.fill_null(batch.column('appln_id'), MISSING).to_numpy()
+            codes = pd.Categorical(batch.column('publn_auth').to_pandas())
+            auths = auths.append(codes.categories.difference(auths))
+            publn_auth[pat_publn_id] = np.where(codes.codes >= 0,
+                                                auths.get_indexer(codes.categories)[codes.codes],
+                                                MISSING)
+            row[pat_publn_id] = np.arange(offset, offset + len(pat_publn_id))
+            offset += len(pat_publn_id)
+    appln_id.flush()
+    publn_auth.flush()
+    row.flush()
+    del appln_id, publn_auth, row
+    np.save(tmp_folder / "auths.npy", np.array(auths, dtype=str))
+    shutil.rmtree(folder, ignore_errors=True)
+    tmp_folder.replace(folder)
+    print(f"Built publication index: {folder}")
+
+
+def open_index(tls211_path: Path = TLS211_FILE, folder: Path = INDEX_FOLDER) -> PublnIndex:
+    """
+    Memory-map the index, building it first if it is missing or older than
+    TLS211.feather.
+
+    Args:
+        tls211_path (Path): TLS211 Feather file.
+        folder (Path): Directory of the index files.
+
+    Returns:
+        PublnIndex: The index arrays.
+    """
+    auths_path = folder / "auths.npy"
+    if not auths_path.exists() or auths_path.stat().st_mtime < Path(tls211_path).stat().st_mtime:
+        build_index(tls211_path, folder)
+    return PublnIndex(appln_id=np.load(folder / "appln_id.npy", mmap_mode="r"),
+                      publn_auth=np.load(folder / "publn_auth.npy", mmap_mode="r"),
+                      row=np.load(folder / "row.npy", mmap_mode="r"),
+                      auths=np.load(auths_path))
+
+
+def _lookup(array: np.ndarray, pat_publn_id) -> np.ndarray:
+    """
+    Fancy-index an index array, with MISSING for IDs beyond its end.
+    """
+    pat_publn_id = np.asarray(pat_publn_id, dtype=np.int64)
+    inside = (pat_publn_id >= 0) & (pat_publn_id < len(array))
+    if inside.all():
+        return np.asarray(array[pat_publn_id])
+    values = np.full(len(pat_publn_id), MISSING, dtype=array.dtype)
+    values[inside] = array[pat_publn_id[inside]]
+    return values
+
+
+def resolve_appln_id(index: PublnIndex, pat_publn_id) -> np.ndarray:
+    """
+    appln_id of every publication.
+
+    Args:
+        index (PublnIndex): See `open_index`.
+        pat_publn_id (array-like): Publication IDs.
+
+    Returns:
+        np.ndarray: int32 appln_id, MISSING for unknown publications and
+            publications without an application.
+    """
+    return _lookup(index.appln_id, pat_publn_id)
+
+
+def resolve_publn_auth(index: PublnIndex, pat_publn_id) -> pd.Categorical:
+    """
+    publn_auth of every publication.
+
+    Args:
+        index (PublnIndex): See `open_index`.
+        pat_publn_id (array-like): Publication IDs.
+
+    Returns:
+        pd.Categorical: Publication authority, NaN for unknown publications.
+    """
+    return pd.Categorical.from_codes(_lookup(index.publn_auth, pat_publn_id),
+                                     categories=index.auths)
+
+
+def resolve_row(index: PublnIndex, pat_publn_id) -> np.ndarray:
+    """
+    Row of every publication in TLS211.feather.
+
+    Args:
+        index (PublnIndex): See `open_index`.
+        pat_publn_id (array-like): Publication IDs.
+
+    Returns:
+        np.ndarray: int64 row number, MISSING for unknown publications.
+    """
+    return _lookup(index.row, pat_publn_id)
+
+
+def take_publications(rows: np.ndarray, columns, tls211_path: Path = TLS211_FILE) -> pd.DataFrame:
+    """
+    Fetch TLS211 columns for the given rows, without materialising the
+    other rows in pandas.
+
+    Args:
+        rows (np.ndarray): Rows, see `resolve_row`.
+        columns (list of str): TLS211 columns to fetch.
+        tls211_path (Path): TLS211 Feather file.
+
+    Returns:
+        pd.DataFrame: One row per requested row, in the same order; all
+            missing where the row is MISSING.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    table = feather.read_table(tls211_path, columns=columns, memory_map=True)
+    return tls_schema.to_pandas(table.take(pa.array(rows, mask=rows == MISSING)))
+
+
+if __name__ == '__main__':
+    build_index()
@@ -0,0 +1,70 @@
+"""
+Resolve chains of quasi-priorities to their root filings
+
+applns_quasi_priorities.dta only holds direct links, e.g. a continuation of
+a PCT appln is linked to the PCT appln but not to the priority filing of the
+PCT appln. Here all quasi priorities of every appln are followed up the
+chains, until applns without quasi priority: the root filings. An appln with
+several quasi priorities (e.g. a priority and a continuation link) can reach
+several roots. For every appln with a quasi priority and every root it
+reaches, we keep the number of links of the shortest chain to the root and
+which link sources occur on the chains to it.
+"""
+import numpy as np
+import pandas as pd
+from config import DATA_FOLDER
+from graph import reach_roots
+from tls201 import read_tls201
+from tls_schema import to_stata
+
+
+QUASI_PRIORITIES_PATH = DATA_FOLDER / "applns_quasi_priorities.dta"
+# source code of applns_quasi_priorities.dta -> chain flag
+SOURCE_FLAGS = {
+    1: 'chain_priority',
+    2: 'chain_PCT',
+    3: 'chain_tech_rel',
+    4: 'chain_continuation'
+}
+
+
+quasi_priorities = pd.read_stata(QUASI_PRIORITIES_PATH,
+                                 columns=['appln_id', 'prior_appln_id', 'source'],
+                                 convert_categoricals=False)
+bits = np.left_shift(1, quasi_priorities.source.to_numpy() - 1).astype(np.int8)
+# applns linked to themselves, or on a cycle of links that ends nowhere, are
+# their own root (the smallest appln of the cycle) with chain length 0
+appln_id, root_appln_id, length, path_bits = reach_roots(quasi_priorities.appln_id.to_numpy(),
+                                                         quasi_priorities.prior_appln_id.to_numpy(),
+                                                         bits)
+del quasi_priorities
+
+chains = pd.DataFrame({'appln_id': appln_id, 'root_appln_id': root_appln_id, 'chain_length': length})
+for source, flag in SOURCE_FLAGS.items():
+    chains[flag] = ((path_bits >> (source - 1)) & 1).astype(np.int8)
+
+TLS201 = read_tls201(['appln_id', 'appln_auth', 'appln_filing_date'])
+obscheck = chains.shape[0]
+chains = pd.merge(chains,
+                  TLS201.rename(columns={'appln_id': 'root_appln_id',
+                                         'appln_auth': 'root_appln_auth',
+                                         'appln_filing_date': 'root_appln_filing_date'}),
+                  on='root_appln_id',
+                  how='left')
+assert obscheck == chains.shape[0]
+chains = chains[['appln_id', 'root_appln_id', 'root_appln_auth', 'root_appln_filing_date',
+                 'chain_length', *SOURCE_FLAGS.values()]]
+
+to_stata(chains, DATA_FOLDER / "applns_quasi_priority_roots.dta",
+         write_index=False,
+         variable_labels={
+             'appln_id': 'Appln ID (PATSTAT)',
+             'root_appln_id': 'Root Quasi Priority Appln ID (PATSTAT)',
+             'root_appln_auth': 'Root Appln Auth',
+             'root_appln_filing_date': 'Root Filing Date',
+             'chain_length': 'Quasi Priority Links to Root (Shortest Chain)',
+             'chain_priority': 'Priority Link on a Chain to Root',
+             'chain_PCT': 'Prior-PCT Link on a Chain to Root',
+             'chain_tech_rel': 'Tech-rel Link on a Chain to Root',
+             'chain_continuation': 'Continuation Link on a Chain to Root'
+         })
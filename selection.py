@@ -0,0 +1,94 @@
+"""
+Pick the best row per group by ordered rules
+
+Many steps keep, per group, the row that wins a cascade of tie-breaks, e.g.
+the earliest filing date and then the smallest appln_id. Instead of one
+groupby rank and filter per rule, every rule column is turned into an integer
+sort code and all rules are applied by a single np.lexsort.
+
+A cascade of `groupby(...).rank('dense') == 1` filters drops rows with a
+missing value at every step, so a group whose best row has a missing value in
+a rule column is dropped altogether. `best_per_group` does the same: missing
+values sort last and never win. In the `keep_missing` columns they still sort
+last but can win, like a value larger than all others, e.g. a missing filing
+date in a group of applications without any filing date.
+"""
+from typing import List, Sequence, Union
+import numpy as np
+import pandas as pd
+
+
+def _sort_codes(values: pd.Series, ascending: bool = True) -> np.ndarray:
+    """
+    Integer codes that sort like `values`; missing values get the largest code.
+    """
+    codes, uniques = pd.factorize(values, sort=True)
+    codes = codes.astype(np.int64)
+    if not ascending:
+        codes = np.where(codes >= 0, len(uniques) - 1 - codes, codes)
+    codes[codes < 0] = len(uniques)
+    return codes
+
+
+def best_per_group(frame: pd.DataFrame, by: Union[str, List[str]], order: Sequence[str],
+                   ascending: Union[bool, Sequence[bool]] = True,
+                   keep_ties: bool = False, keep_missing: Sequence[str] = ()) -> pd.DataFrame:
+    """
+    Rows of `frame` that come first in their group when sorted by the `order`
+    columns.
+
+    Args:
+        frame (pd.DataFrame): Rows to select from.
+        by (str or list of str): Group columns. Rows with a missing group key are dropped.
+        order (sequence of str): Tie-break columns, most important first.
+        ascending (bool or sequence of bool): Direction of every `order` column.
+        keep_ties (bool): Keep every row equal to the best one on all `order`
+            columns, e.g. all applicants of the best application, instead of
+            only the first.
+        keep_missing (sequence of str): `order` columns whose missing values
+            sort last but do not drop the group when they win.
+
+    Returns:
+        pd.DataFrame: The selected rows, in their original order.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    order = list(order)
+    if isinstance(ascending, bool):
+        ascending = [ascending] * len(order)
+    group_codes = [pd.factorize(frame[col])[0] for col in by]
+    order_codes = [_sort_codes(frame[col], asc) for col, asc in zip(order, ascending)]
+    missing = np.zeros(len(frame), dtype=bool)
+    for codes in group_codes:
+        missing |= codes < 0
+    # np.lexsort sorts by its last key first
+    sorter = np.lexsort(order_codes[::-1] + group_codes[::-1])
+    sorter = sorter[~missing[sorter]]
+
+    new_group = np.ones(len(sorter), dtype=bool)
+    if len(sorter):
+        new_group[1:] = False
+        for codes in group_codes:
+            sorted_codes = codes[sorter]
+            new_group[1:] |= sorted_codes[1:] != sorted_codes[:-1]
+    group = np.cumsum(new_group) - 1
+    if keep_ties:
+        new_run = new_group.copy()
+        for codes in order_codes:
+            sorted_codes = codes[sorter]
+            new_run[1:] |= sorted_codes[1:] != sorted_codes[:-1]
+        run = np.cumsum(new_run)
+        selected = run == run[new_group][group]
+    else:
+        selected = new_group
+    # drop the groups whose best row has a missing rule value, as the rank
+    # cascade does
+    best = sorter[new_group]
+    complete = np.ones(len(best), dtype=bool)
+    for col in order:
+        if col not in keep_missing:
+            complete &= frame[col].notna().to_numpy()[best]
+    selected &= complete[group]
+
+    mask = np.zeros(len(frame), dtype=bool)
+    mask[sorter[selected]] = True
+    return frame[mask]
@@ -0,0 +1,200 @@
+"""
+Out-of-core joins
+
+`join_to_file` runs a join in an embedded DuckDB database and writes the
+result to a Feather file one record batch at a time, so neither the join nor
+its result has to fit in memory. The sides are read as record batches:
+
+- files: Feather files and Parquet datasets are scanned as Arrow datasets,
+  of which only the columns the join uses are read; Stata files through
+  their Feather mirror under data/sql (see localdb.py);
+- streams of record batches (pa.RecordBatchReader), e.g. a file cleaned one
+  batch at a time;
+- in-memory frames or Arrow tables, for sides that are small anyway.
+
+DuckDB keeps at most JOIN_MEMORY_LIMIT (config.py) of hash tables and sorts in
+memory and spills the rest to data/spill. Without `order_by`, the result rows
+come in no particular order.
+
+    rows = join_to_file(DATA_FOLDER / "applicants_TLS207.dta", person_data_file,
+                        output, on='person_id', how='left')
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from config import JOIN_MEMORY_LIMIT, SPILL_FOLDER
+from localdb import SQL_FOLDER, stata_mirror
+
+
+BATCH_ROWS = 1_000_000
+
+JOIN_TYPES = {'inner': 'INNER', 'left': 'LEFT', 'right': 'RIGHT', 'outer': 'FULL OUTER'}
+
+Source = Union[Path, pd.DataFrame, pa.Table, pa.RecordBatchReader]
+
+
+def connect(memory_limit: str = JOIN_MEMORY_LIMIT) -> duckdb.DuckDBPyConnection:
+    """
+    In-memory DuckDB database that spills to SPILL_FOLDER beyond `memory_limit`.
+
+    Args:
+        memory_limit (str): Memory DuckDB may use, e.g. "4GB".
+
+    Returns:
+        duckdb.DuckDBPyConnection: The database.
+    """
+    SPILL_FOLDER.mkdir(parents=True, exist_ok=True)
+    return duckdb.connect(config={'memory_limit': memory_limit,
+                                  'temp_directory': str(SPILL_FOLDER),
+                                  'preserve_insertion_order': False})
+
+
+def as_arrow(source: Source) -> Union[ds.Dataset, pa.Table, pa.RecordBatchReader]:
+    """
+    Arrow object DuckDB can scan for a side of a join: a dataset for a file,
+    a table for a frame, tables and batch readers as they are.
+
+    Args:
+        source (Path, pd.DataFrame, pa.Table or pa.RecordBatchReader): Rows.
+
+    Returns:
+        pa.dataset.Dataset, pa.Table or pa.RecordBatchReader: The rows.
+    """
+    if isinstance(source, (str, Path)):
+        path = Path(source)
+        if path.suffix == ".dta":
+            return ds.dataset(stata_mirror(path, path.parent / SQL_FOLDER.name), format="feather")
+        if path.suffix == ".feather":
+            return ds.dataset(path, format="feather")
+        return ds.dataset(path, format="parquet", partitioning="hive")
+    if isinstance(source, pd.DataFrame):
+        return pa.Table.from_pandas(source, preserve_index=False)
+    return source
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _as_list(key) -> List[str]:
+    return [key] if isinstance(key, str) else list(key)
+
+
+def join_sql(left_columns: Sequence[str], right_columns: Sequence[str], on=None,
+             left_on=None, right_on=None, how: str = 'inner',
+             columns: Optional[Sequence[str]] = None, where: Optional[str] = None,
+             order_by: Optional[Sequence[str]] = None) -> str:
+    """
+    SQL of a join of the views `l` and `r` with the columns of `pd.merge`: a
+    key given by `on` once, coalesced over both sides for an outer join, and
+    with `left_on`/`right_on` the keys of both sides.
+
+    Args:
+        left_columns (sequence of str): Columns of `l`.
+        right_columns (sequence of str): Columns of `r`.
+        on, left_on, right_on: Join keys, as in `pd.merge`.
+        how (str): 'inner', 'left', 'right' or 'outer'.
+        columns (sequence of str, optional): Result columns; all by default.
+        where (str, optional): SQL condition on the result columns.
+        order_by (sequence of str, optional): Sort columns of the result.
+
+    Returns:
+        str: The query.
+
+    Raises:
+        ValueError: Unknown join type, or both sides have a non-key column of
+            the same name.
+    """
+    if how not in JOIN_TYPES:
+        raise ValueError(f"Unknown join type {how!r}, expected one of {list(JOIN_TYPES)}")
+    left_keys = _as_list(left_on if on is None else on)
+    right_keys = _as_list(right_on if on is None else on)
+    if on is None:
+        selected = [f"l.{_quote(col)}" for col in left_columns]
+        selected += [f"r.{_quote(col)}" for col in right_columns]
+        left_only, right_only = list(left_columns), list(right_columns)
+    else:
+        key_source = {'outer': "COALESCE(l.{0}, r.{0}) AS {0}", 'right': "r.{0}"}.get(how, "l.{0}")
+        left_only = [col for col in left_columns if col not in left_keys]
+        right_only = [col for col in right_columns if col not in right_keys]
+        selected = [key_source.format(_quote(col)) if col in left_keys else f"l.{_quote(col)}"
+                    for col in left_columns]
+        selected += [f"r.{_quote(col)}" for col in right_only]
+    overlap = set(left_only) & set(right_only)
+    if overlap:
+        raise ValueError(f"Both sides have columns {sorted(overlap)}; rename them before the join")
+    condition = " AND ".join(f"l.{_quote(left_key)} = r.{_quote(right_key)}"
+                             for left_key, right_key in zip(left_keys, right_keys))
+    sql = f"SELECT {', '.join(selected)} FROM l {JOIN_TYPES[how]} JOIN r ON {condition}"
+    result = ", ".join(_quote(col) for col in columns) if columns else "*"
+    sql = f"SELECT {result} FROM ({sql})"
+    if where:
+        sql += f" WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {', '.join(_quote(col) for col in order_by)}"
+    return sql
+
+
+def query_to_file(sql: str, sources: Dict[str, Source], output: Path,
+                  memory_limit: str = JOIN_MEMORY_LIMIT) -> int:
+    """
+    Run a query over the sources and write its result to a Feather file, one
+    record batch at a time. The file is uncompressed, so that it can be read
+    back memory-mapped.
+
+    Args:
+        sql (str): Query over the sources.
+        sources (dict): View name to rows (see `as_arrow`).
+        output (Path): Feather file of the result.
+        memory_limit (str): Memory DuckDB may use before it spills.
+
+    Returns:
+        int: Number of rows written.
+    """
+    conn = connect(memory_limit)
+    try:
+        for name, source in sources.items():
+            conn.register(name, as_arrow(source))
+        reader = conn.execute(sql).to_arrow_reader(BATCH_ROWS)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output.with_name(output.name + ".part")
+        n_rows = 0
+        with pa.ipc.new_file(str(tmp_path), reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                n_rows += batch.num_rows
+        tmp_path.replace(output)
+    finally:
+        conn.close()
+    return n_rows
+
+
+def join_to_file(left: Source, right: Source, output: Path, on=None, left_on=None,
+                 right_on=None, how: str = 'inner', columns: Optional[Sequence[str]] = None,
+                 where: Optional[str] = None, order_by: Optional[Sequence[str]] = None,
+                 memory_limit: str = JOIN_MEMORY_LIMIT) -> int:
+    """
+    Join two sides out of core and write the result to a Feather file, with
+    the columns of `pd.merge`. Unlike `pd.merge`, missing keys do not match.
+
+    Args:
+        left (Path, pd.DataFrame, pa.Table or pa.RecordBatchReader): Left rows.
+        right (Path, pd.DataFrame, pa.Table or pa.RecordBatchReader): Right rows.
+        output (Path): Feather file of the result.
+        on, left_on, right_on: Join keys, as in `pd.merge`.
+        how (str): 'inner', 'left', 'right' or 'outer'.
+        columns (sequence of str, optional): Result columns; all by default.
+        where (str, optional): SQL condition on the result columns.
+        order_by (sequence of str, optional): Sort columns of the result.
+        memory_limit (str): Memory DuckDB may use before it spills.
+
+    Returns:
+        int: Number of rows written.
+    """
+    left, right = as_arrow(left), as_arrow(right)
+    sql = join_sql(left.schema.names, right.schema.names, on=on, left_on=left_on,
+                   right_on=right_on, how=how, columns=columns, where=where, order_by=order_by)
+    return query_to_file(sql, {'l': left, 'r': right}, output, memory_limit)
@@ -0,0 +1,451 @@
+"""
+Stata export
+
+Writer of Stata 118 (.dta) files straight from Arrow memory, for the large
+derived outputs. `DataFrame.to_stata` converts every object column value by
+value and builds the whole file in memory; here the storage type of each
+variable is fixed up front from whole-column Arrow aggregates (string widths
+from the UTF-8 byte lengths, integer types from the value range), then the
+rows are packed batch by batch into fixed-width records with numpy and
+appended to the file. Dictionary-encoded (categorical) columns are written
+as their plain values, date and datetime columns as %td dates, nulls as
+Stata missing values; strings longer than str2045 become strL.
+
+    write_dta(table, DATA_FOLDER / "pl_citations.dta",
+              variable_labels={'pat_publn_id': 'Publication ID'})
+
+An Arrow table read with memory mapping is written without loading it.
+
+    python stata.py --rows 2000000   # benchmark against DataFrame.to_stata
+"""
+import argparse
+import datetime
+import re
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+BATCH_ROWS = 262_144
+STR_MAX = 2045
+STRL = 32768
+STATA_EPOCH = 3653  # days from 1960-01-01 to 1970-01-01
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+NAME_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,31}")
+
+
+class StataType(NamedTuple):
+    code: int
+    dtype: str
+    fmt: str
+    low: float
+    high: float
+    missing: float
+
+
+NUMERIC_TYPES = {
+    'byte': StataType(65530, '<i1', '%8.0g', -127, 100, 101),
+    'int': StataType(65529, '<i2', '%8.0g', -32767, 32740, 32741),
+    'long': StataType(65528, '<i4', '%12.0g', -2147483647, 2147483620, 2147483621),
+    'float': StataType(65527, '<f4', '%9.0g', -1.7014117e38, 1.7014117e38, 2.0 ** 127),
+    'double': StataType(65526, '<f8', '%10.0g', -8.988465674311579e307, 8.988465674311579e307,
+                        2.0 ** 1023),
+}
+INTEGER_TYPES = ['byte', 'int', 'long']
+
+
+class Variable(NamedTuple):
+    name: str
+    kind: str           # 'str', 'strL', 'date' or a key of NUMERIC_TYPES
+    width: int = 0      # bytes of a str# variable
+
+
+def _is_text(data_type: pa.DataType) -> bool:
+    if pa.types.is_dictionary(data_type):
+        data_type = data_type.value_type
+    return pa.types.is_string(data_type) or pa.types.is_large_string(data_type) or pa.types.is_null(data_type)
+
+
+def _max_bytes(column: pa.ChunkedArray) -> int:
+    """
+    Longest value of a text column in UTF-8 bytes; a dictionary chunk is
+    measured on its dictionary, at the entries it uses.
+    """
+    longest = 0
+    for chunk in column.chunks:
+        if pa.types.is_null(chunk.type):
+            continue
+        if pa.types.is_dictionary(chunk.type):
+            chunk = pc.binary_length(chunk.dictionary).take(chunk.indices)
+        else:
+            chunk = pc.binary_length(chunk)
+        longest = max(longest, pc.max(chunk).as_py() or 0)
+    return longest
+
+
+def _numeric_kind(name: str, column: pa.ChunkedArray) -> str:
+    """
+    Smallest Stata type at least as wide as the column's that holds its
+    values, as `DataFrame.to_stata` upcasts: integers beyond long go to double.
+    """
+    data_type = column.type
+    if pa.types.is_boolean(data_type):
+        return 'byte'
+    bounds = pc.min_max(column)
+    low, high = bounds['min'].as_py(), bounds['max'].as_py()
+    if pa.types.is_floating(data_type):
+        if pc.any(pc.is_inf(column)).as_py():
+            raise ValueError(f"Column {name} contains infinity, which Stata cannot store")
+        kind = 'float' if data_type.bit_width <= 32 else 'double'
+        if low is not None and max(abs(low), abs(high)) > NUMERIC_TYPES[kind].high:
+            if kind == 'double':
+                raise ValueError(f"Column {name} has values outside the range of a Stata double")
+            kind = 'double'
+        return kind
+    start = {8: 0, 16: 1}.get(data_type.bit_width, 2)
+    for kind in INTEGER_TYPES[start:]:
+        stata_type = NUMERIC_TYPES[kind]
+        if low is None or (low >= stata_type.low and high <= stata_type.high):
+            return kind
+    return 'double'
+
+
+def plan_variables(table: pa.Table) -> List[Variable]:
+    """
+    Stata storage type of every column of a table.
+
+    Args:
+        table (pa.Table): Table to export.
+
+    Returns:
+        list of Variable: One per column, in order.
+
+    Raises:
+        ValueError: A column name is not a Stata name, or values are out of range.
+        TypeError: A column has no Stata counterpart.
+    """
+    variables = []
+    for name, column in zip(table.column_names, table.columns):
+        if not NAME_PATTERN.fullmatch(name):
+            raise ValueError(f"{name!r} is not a valid Stata variable name")
+        data_type = column.type
+        if _is_text(data_type):
+            width = _max_bytes(column)
+            if width > STR_MAX:
+                variables.append(Variable(name, 'strL'))
+            else:
+                variables.append(Variable(name, 'str', max(width, 1)))
+        elif pa.types.is_date(data_type) or pa.types.is_timestamp(data_type):
+            variables.append(Variable(name, 'date'))
+        elif pa.types.is_integer(data_type) or pa.types.is_floating(data_type) \
+                or pa.types.is_boolean(data_type):
+            variables.append(Variable(name, _numeric_kind(name, column)))
+        else:
+            raise TypeError(f"Column {name} of type {data_type} cannot be written to Stata")
+    return variables
+
+
+def _record_dtype(variables: List[Variable]) -> np.dtype:
+    """
+    Layout of one observation in the data section.
+    """
+    fields = []
+    for var in variables:
+        if var.kind == 'str':
+            fields.append((var.name, 'u1', (var.width,)))
+        elif var.kind == 'strL':
+            fields.append((var.name, '<u8'))
+        elif var.kind == 'date':
+            fields.append((var.name, NUMERIC_TYPES['long'].dtype))
+        else:
+            fields.append((var.name, NUMERIC_TYPES[var.kind].dtype))
+    return np.dtype(fields)
+
+
+def _text(column: pa.Array) -> pa.Array:
+    """
+    Plain strings of a text column, nulls as empty strings.
+    """
+    if pa.types.is_null(column.type):
+        return pa.array([''] * len(column), pa.string())
+    if pa.types.is_dictionary(column.type):
+        column = column.dictionary_decode()
+    return pc.fill_null(column, '')
+
+
+def _offsets(column: pa.Array):
+    """
+    Value offsets and data bytes of a string array.
+    """
+    offset_type = np.int64 if pa.types.is_large_string(column.type) else np.int32
+    buffers = column.buffers()
+    offsets = np.frombuffer(buffers[1], offset_type)[column.offset:column.offset + len(column) + 1]
+    data = np.frombuffer(buffers[2], np.uint8) if buffers[2] is not None else np.empty(0, np.uint8)
+    return offsets.astype(np.int64), data
+
+
+def _pack_strings(column: pa.Array, width: int) -> np.ndarray:
+    """
+    Strings as null-padded fixed-width byte rows, scattered in one vectorized
+    step from the Arrow data buffer.
+    """
+    offsets, data = _offsets(_text(column))
+    packed = np.zeros((len(offsets) - 1, width), np.uint8)
+    lengths = np.diff(offsets)
+    if lengths.sum():
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        starts = np.repeat(offsets[:-1] - offsets[0], lengths)
+        positions = np.arange(offsets[-1] - offsets[0]) - starts
+        packed[rows, positions] = data[offsets[0]:offsets[-1]]
+    return packed
+
+
+def _write_strls(column: pa.Array, var_number: int, first_obs: int, spool) -> np.ndarray:
+    """
+    Spool a GSO block for every non-empty strL value and return the (v, o)
+    references of the data section, 0 for empty strings.
+    """
+    offsets, data = _offsets(_text(column))
+    lengths = np.diff(offsets)
+    refs = np.zeros(len(lengths), np.uint64)
+    for i in np.flatnonzero(lengths):
+        obs = first_obs + int(i)
+        value = data[offsets[i]:offsets[i + 1]].tobytes() + b'\0'
+        spool.write(b'GSO' + struct.pack('<IQBI', var_number, obs, 130, len(value)) + value)
+        refs[i] = var_number + (obs << 16)
+    return refs
+
+
+def _numeric_values(column: pa.Array, kind: str) -> np.ndarray:
+    """
+    Values of a numeric or date column in their Stata storage type, nulls as
+    the type's missing value.
+    """
+    if kind == 'date':
+        column = pc.cast(column, pa.date32(), safe=False)
+        stata_type = NUMERIC_TYPES['long']
+        values = pc.fill_null(column.cast(pa.int32()), 0).to_numpy() + STATA_EPOCH
+    else:
+        stata_type = NUMERIC_TYPES[kind]
+        if pa.types.is_boolean(column.type):
+            column = column.cast(pa.int8())
+        values = pc.fill_null(column, 0).to_numpy(zero_copy_only=False)
+    values = values.astype(stata_type.dtype)
+    if values.dtype.kind == 'f':
+        values[np.isnan(values)] = stata_type.missing
+    if column.null_count:
+        values[column.is_null().to_numpy(zero_copy_only=False)] = stata_type.missing
+    return values
+
+
+def _value_label_table(name: str, labels: Dict[float, str]) -> bytes:
+    """
+    <lbl> entry of a value label.
+    """
+    values, texts = [], []
+    for value, text in sorted(labels.items()):
+        if value != int(value):
+            raise ValueError(f"Value label {name} labels {value}; Stata only labels integers")
+        values.append(int(value))
+        texts.append(str(text).encode('utf-8') + b'\0')
+    offsets = np.cumsum([0] + [len(text) for text in texts[:-1]]).astype('<i4')
+    text = b''.join(texts)
+    table = (struct.pack('<ii', len(values), len(text)) + offsets.tobytes()
+             + np.array(values, '<i4').tobytes() + text)
+    return (b'<lbl>' + struct.pack('<i', len(table)) + _fixed(name, 129) + b'\0' * 3
+            + table + b'</lbl>')
+
+
+def _fixed(text: str, size: int) -> bytes:
+    """
+    UTF-8 text in a null-padded field of `size` bytes.
+    """
+    encoded = text.encode('utf-8')
+    if len(encoded) >= size:
+        raise ValueError(f"{text!r} does not fit in {size - 1} bytes")
+    return encoded.ljust(size, b'\0')
+
+
+def _tag(name: str, content: bytes = b'') -> bytes:
+    return f"<{name}>".encode() + content + f"</{name}>".encode()
+
+
+def write_dta(data: Union[pd.DataFrame, pa.Table], path: Path,
+              variable_labels: Optional[Dict[str, str]] = None,
+              value_labels: Optional[Dict[str, Dict[float, str]]] = None,
+              data_label: Optional[str] = None,
+              batch_rows: int = BATCH_ROWS) -> None:
+    """
+    Write a table to a Stata 118 file.
+
+    Args:
+        data (pd.DataFrame or pa.Table): Table to export; the index of a frame
+            is not written.
+        path (Path): Target .dta file, written through a .part file.
+        variable_labels (dict, optional): Label by column.
+        value_labels (dict, optional): Value-to-text labels by numeric column,
+            as for `DataFrame.to_stata`.
+        data_label (str, optional): Dataset label.
+        batch_rows (int): Rows packed per write.
+
+    Raises:
+        ValueError: Invalid names, labels or values (see `plan_variables`).
+    """
+    table = pa.Table.from_pandas(data, preserve_index=False) if isinstance(data, pd.DataFrame) else data
+    variables = plan_variables(table)
+    variable_labels = variable_labels or {}
+    value_labels = value_labels or {}
+    for name in value_labels:
+        var = next((var for var in variables if var.name == name), None)
+        if var is None or var.kind not in NUMERIC_TYPES:
+            raise ValueError(f"Value labels need a numeric column, {name} is not one")
+    for name, label in variable_labels.items():
+        if len(label) > 80:
+            raise ValueError(f"Variable label of {name} is longer than 80 characters")
+    record_dtype = _record_dtype(variables)
+
+    now = datetime.datetime.now()
+    timestamp = f"{now.day:02d} {MONTHS[now.month - 1]} {now.year} {now.hour:02d}:{now.minute:02d}"
+    label = (data_label or '').encode('utf-8')
+    header = _tag('header', _tag('release', b'118') + _tag('byteorder', b'LSF')
+                  + _tag('K', struct.pack('<H', len(variables)))
+                  + _tag('N', struct.pack('<Q', table.num_rows))
+                  + _tag('label', struct.pack('<H', len(label)) + label)
+                  + _tag('timestamp', struct.pack('<B', len(timestamp)) + timestamp.encode()))
+    types = [STRL if var.kind == 'strL' else var.width if var.kind == 'str'
+             else NUMERIC_TYPES['long' if var.kind == 'date' else var.kind].code for var in variables]
+    formats = [f"%{var.width}s" if var.kind == 'str' else '%9s' if var.kind == 'strL'
+               else '%td' if var.kind == 'date' else NUMERIC_TYPES[var.kind].fmt for var in variables]
+    sections = [
+        ('variable_types', struct.pack(f'<{len(types)}H', *types)),
+        ('varnames', b''.join(_fixed(var.name, 129) for var in variables)),
+        ('sortlist', b'\0\0' * (len(variables) + 1)),
+        ('formats', b''.join(_fixed(fmt, 57) for fmt in formats)),
+        ('value_label_names', b''.join(_fixed(var.name if var.name in value_labels else '', 129)
+                                       for var in variables)),
+        ('variable_labels', b''.join(_fixed(variable_labels.get(var.name, ''), 321)
+                                     for var in variables)),
+        ('characteristics', b''),
+    ]
+
+    tmp_path = path.with_name(path.name + ".part")
+    with open(tmp_path, 'wb') as fh, tempfile.TemporaryFile(dir=path.parent) as spool:
+        offsets = [0]
+        fh.write(b'<stata_dta>' + header)
+        offsets.append(fh.tell())
+        fh.write(_tag('map', b'\0' * 8 * 14))
+        for name, content in sections:
+            offsets.append(fh.tell())
+            fh.write(_tag(name, content))
+
+        offsets.append(fh.tell())
+        fh.write(b'<data>')
+        first_obs = 1
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            records = np.empty(batch.num_rows, record_dtype)
+            for number, (var, column) in enumerate(zip(variables, batch.columns), start=1):
+                if var.kind == 'str':
+                    records[var.name] = _pack_strings(column, var.width)
+                elif var.kind == 'strL':
+                    records[var.name] = _write_strls(column, number, first_obs, spool)
+                else:
+                    records[var.name] = _numeric_values(column, var.kind)
+            fh.write(records.data)
+            first_obs += batch.num_rows
+        fh.write(b'</data>')
+
+        offsets.append(fh.tell())
+        fh.write(b'<strls>')
+        spool.seek(0)
+        while chunk := spool.read(1 << 24):
+            fh.write(chunk)
+        fh.write(b'</strls>')
+
+        offsets.append(fh.tell())
+        fh.write(b'<value_labels>')
+        for name, labels in value_labels.items():
+            fh.write(_value_label_table(name, labels))
+        fh.write(b'</value_labels>')
+        offsets.append(fh.tell())
+        fh.write(b'</stata_dta>')
+        offsets.append(fh.tell())
+
+        fh.seek(offsets[1] + len(b'<map>'))
+        fh.write(struct.pack('<14Q', *offsets))
+    tmp_path.replace(path)
+
+
+def _sample(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    pl_citations-like frame: IDs, categorical codes, dates with missing ones,
+    small counters, free text and a value-labelled code.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.to_datetime(rng.integers(0, 15000, n_rows), unit='D')
+    dates = dates.where(rng.random(n_rows) > 0.1)
+    names = np.array(['ACME CORP', 'Université de Genève', '', None, 'X' * 60], dtype=object)
+    return pd.DataFrame({
+        'pat_publn_id': rng.integers(1, 10**9, n_rows).astype('int32'),
+        'cited_appln_id': rng.integers(1, 10**9, n_rows),
+        'citn_origin': pd.Categorical(rng.choice(['APP', 'ISR', 'SEA', 'EXA'], n_rows)),
+        'publn_auth': pd.Categorical(rng.choice(['EP', 'US', 'WO', 'DE', 'JP'], n_rows)),
+        'publn_date': dates,
+        'citn_id': rng.integers(1, 200, n_rows).astype('int16'),
+        'person_name': names[rng.integers(0, len(names), n_rows)],
+        'source': rng.integers(1, 4, n_rows).astype('int8'),
+    })
+
+
+def benchmark(n_rows: int, repeat: int = 3, folder: Path = Path(tempfile.gettempdir())) -> None:
+    """
+    Time `DataFrame.to_stata` against `write_dta` on a generated frame, and
+    check that both files read back the same.
+
+    Args:
+        n_rows (int): Rows of the frame.
+        repeat (int): Timed runs of each; the best is reported.
+        folder (Path): Folder of the two files.
+    """
+    data = _sample(n_rows)
+    value_labels = {'source': {1: 'priority', 2: 'continuation', 3: 'PCT'}}
+    variable_labels = {'pat_publn_id': 'Publication ID', 'publn_date': 'Publication date'}
+    pandas_path, arrow_path = folder / "bench_pandas.dta", folder / "bench_arrow.dta"
+
+    def pandas_export():
+        frame = data.copy()
+        for col in frame.columns[frame.dtypes == "category"]:
+            frame[col] = frame[col].astype(object)
+        frame.to_stata(pandas_path, write_index=False, convert_dates={'publn_date': 'td'},
+                       variable_labels=variable_labels, value_labels=value_labels, version=118)
+
+    def best_of(run):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    pandas_time = best_of(pandas_export)
+    arrow_time = best_of(lambda: write_dta(data, arrow_path, variable_labels=variable_labels,
+                                           value_labels=value_labels))
+    pd.testing.assert_frame_equal(pd.read_stata(pandas_path), pd.read_stata(arrow_path),
+                                  check_dtype=False)
+    print(f"{n_rows:,} rows: DataFrame.to_stata {pandas_time:.2f}s, write_dta {arrow_time:.2f}s "
+          f"({pandas_time / arrow_time:.1f}x)")
+    pandas_path.unlink()
+    arrow_path.unlink()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the Stata writer")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows of the generated frame")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs of each method")
+    args = parser.parse_args()
+    benchmark(args.rows, args.repeat)
@@ -0,0 +1,26 @@
+"""
+The scripts are top-level modules of the repository root.
+"""
+import runpy
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def run_script(tmp_path, monkeypatch):
+    """
+    Run a script of the repository root with `tmp_path` as working directory,
+    so that DATA_FOLDER is `tmp_path / "data"`, and return its globals.
+    """
+    import tls201
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir(exist_ok=True)
+
+    def run(name):
+        tls201.clear_cache()
+        return runpy.run_path(str(ROOT / name), run_name='__main__')
+    return run
@@ -0,0 +1,87 @@
+"""
+Address replenishment of priority filings.
+"""
+import pandas as pd
+import address
+from address import Inputs, replenish_addresses
+
+
+def make_inputs(filing_dates):
+    tls201 = pd.DataFrame({'appln_id': list(filing_dates),
+                           'appln_filing_date': pd.to_datetime(list(filing_dates.values()))})
+    return Inputs(person_data=None, tls201=tls201, appln_index=pd.Index(tls201['appln_id']),
+                  earliest_priority=None, pct_families=None, equivalents=None, appln_docdb=None,
+                  orbis_parties={})
+
+
+def priority(*appln_ids):
+    return pd.DataFrame({'earliest_prior_appln_id': list(appln_ids),
+                         'earliest_priority_date': pd.to_datetime('1999-01-01'),
+                         'earliest_prior_appln_auth': 'DE'})
+
+
+def addresses(rows):
+    return pd.DataFrame(rows, columns=['appln_id', 'person_id', 'person_address', 'person_ctry_code'])
+
+
+def test_priority_in_several_groups_keeps_every_group():
+    # appln 10 is in the PCT families of WO 100 and WO 200
+    links = pd.DataFrame({'WO_appln_id': [100, 100, 200, 200], 'appln_id': [10, 11, 10, 12]})
+    party_addresses = addresses([(10, 1, None, None), (11, 2, 'Street 1', 'FR'), (12, 3, 'Street 2', 'US')])
+    inputs = make_inputs({10: '1999-01-01', 11: '2001-01-01', 12: '2000-01-01'})
+
+    result = replenish_addresses(priority(10), links, 'WO_appln_id', party_addresses, inputs)
+
+    result = result.sort_values('replenished_by_appln_id', ignore_index=True)
+    assert result['earliest_prior_appln_id'].tolist() == [10, 10]
+    assert result['replenished_by_appln_id'].tolist() == [11, 12]
+    assert result['person_address'].tolist() == ['Street 1', 'Street 2']
+
+
+def test_earliest_member_with_address_wins():
+    # 11 has no address; 12 and 13 tie on the date; 14 has no filing date
+    links = pd.DataFrame({'WO_appln_id': 100, 'appln_id': [10, 11, 12, 13, 14]})
+    party_addresses = addresses([(11, 1, None, None), (12, 2, 'Street 2', 'US'), (12, 3, 'Street 3', 'US'),
+                                 (13, 4, 'Street 4', 'FR'), (14, 5, 'Street 5', 'DE')])
+    inputs = make_inputs({10: '1999-01-01', 11: '1999-06-01', 12: '2000-01-01', 13: '2000-01-01', 14: None})
+
+    result = replenish_addresses(priority(10, 20), links, 'WO_appln_id', party_addresses, inputs)
+
+    # every party of the winner, for the priority filing in the group only
+    assert result['earliest_prior_appln_id'].tolist() == [10, 10]
+    assert result['replenished_by_appln_id'].tolist() == [12, 12]
+    assert result['person_id'].tolist() == [2, 3]
+
+
+def test_undated_member_replenishes_last():
+    links = pd.DataFrame({'WO_appln_id': 100, 'appln_id': [10, 14]})
+    party_addresses = addresses([(14, 5, 'Street 5', 'DE')])
+    inputs = make_inputs({10: '1999-01-01', 14: None})
+    result = replenish_addresses(priority(10), links, 'WO_appln_id', party_addresses, inputs)
+    assert result['replenished_by_appln_id'].tolist() == [14]
+
+
+def test_replenished_from_pct_families_then_equivalents(tmp_path, monkeypatch):
+    # 10 is replenished from its PCT family, 20 from its equivalents, 30 has an address
+    party_addresses = addresses([(10, 1, None, None), (20, 2, None, None), (30, 3, 'Street 3', 'JP'),
+                                 (11, 4, 'Street 4', 'US'), (12, 5, 'Street 5', 'FR'),
+                                 (21, 6, 'Street 6', 'CN')])
+    inputs = make_inputs({10: '1999-01-01', 11: '2000-01-01', 12: '1999-06-01', 20: '1999-01-01',
+                          21: '2000-01-01', 30: '1999-01-01'})
+    inputs = inputs._replace(
+        earliest_priority=pd.DataFrame({'appln_id': [10, 11, 20, 30], 'earliest_prior_appln_id': [10, 10, 20, 30],
+                                        'earliest_priority_date': pd.to_datetime('1999-01-01'),
+                                        'earliest_prior_appln_auth': 'DE'}),
+        pct_families=pd.DataFrame({'WO_appln_id': [100, 100], 'appln_id': [10, 11]}),
+        equivalents=pd.DataFrame({'eqv_grp_num': [1, 1, 2, 2], 'appln_id': [10, 12, 20, 21]}))
+    monkeypatch.setattr(address, 'DATA_FOLDER', tmp_path)
+    monkeypatch.setattr(address, 'get_party_addresses', lambda role, inputs: party_addresses)
+
+    role = address.Role("persons.dta", 'applt_seq_nr', '0', "addresses.feather", "priority.feather")
+    address.resolve_addresses(role, inputs)
+
+    result = pd.read_feather(tmp_path / "priority.feather").set_index('earliest_prior_appln_id')
+    assert result.loc[10, 'replenished_by_appln_id'] == 11
+    assert result.loc[20, 'replenished_by_appln_id'] == 21
+    assert result.loc[30, 'person_address'] == 'Street 3'
+    assert pd.isna(result.loc[30, 'replenished_by_appln_id'])
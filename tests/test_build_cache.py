@@ -0,0 +1,84 @@
+"""
+Content-addressed cache of derived files.
+"""
+import os
+import pytest
+import build_cache
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    cache_folder = tmp_path / "cache"
+    module_folder = tmp_path / "scripts"
+    module_folder.mkdir()
+    monkeypatch.setattr(build_cache, 'CACHE_FOLDER', cache_folder)
+    monkeypatch.setattr(build_cache, 'MODULE_FOLDER', module_folder)
+    monkeypatch.setattr(build_cache, '_DIGESTS', {})
+    (module_folder / "step.py").write_text("import helper\nimport pandas\n")
+    (module_folder / "helper.py").write_text("X = 1\n")
+    (tmp_path / "input.txt").write_text("a")
+    return tmp_path
+
+
+def shift_mtime(path, seconds=10):
+    mtime = path.stat().st_mtime + seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_local_modules(folders):
+    assert build_cache.local_modules(folders / "scripts" / "step.py") == \
+        [folders / "scripts" / "helper.py", folders / "scripts" / "step.py"]
+
+
+def test_key_changes_with_inputs_code_and_params(folders):
+    script, input_path = folders / "scripts" / "step.py", folders / "input.txt"
+    key = build_cache.step_key(script, [input_path], ["--x"])
+    assert build_cache.step_key(script, [input_path], ["--x"]) == key
+
+    # a new modification time with the same content is still a hit
+    shift_mtime(input_path)
+    assert build_cache.step_key(script, [input_path], ["--x"]) == key
+
+    assert build_cache.step_key(script, [input_path], ["--y"]) != key
+    input_path.write_text("b")
+    shift_mtime(input_path, 20)
+    changed_input = build_cache.step_key(script, [input_path], ["--x"])
+    assert changed_input != key
+    # so does a change to a module the script imports
+    (folders / "scripts" / "helper.py").write_text("X = 2\n")
+    shift_mtime(folders / "scripts" / "helper.py")
+    assert build_cache.step_key(script, [input_path], ["--x"]) != changed_input
+
+
+def test_store_and_restore(folders):
+    output_file = folders / "out.dta"
+    output_folder = folders / "index"
+    output_file.write_text("result")
+    output_folder.mkdir()
+    (output_folder / "part.npy").write_text("array")
+    outputs = {"out.dta": output_file, "index": output_folder}
+
+    assert not build_cache.restore("key", outputs)
+    build_cache.store("key", outputs)
+    output_file.unlink()
+    (output_folder / "part.npy").write_text("stale")
+
+    assert build_cache.restore("key", outputs)
+    assert output_file.read_text() == "result"
+    assert (output_folder / "part.npy").read_text() == "array"
+    assert not build_cache.restore("key", {"out.dta": output_file})
+    assert not build_cache.restore("other", outputs)
+
+
+def test_least_recently_used_entries_evicted(folders):
+    output = folders / "out.dta"
+    output.write_bytes(b"x" * 100)
+    for key in ["a", "b", "c"]:
+        build_cache.store(key, {"out.dta": output})
+        shift_mtime(build_cache.CACHE_FOLDER / key / "manifest.json", {"a": -30, "b": -20, "c": -10}[key])
+    # a hit makes an entry the most recently used
+    assert build_cache.restore("a", {"out.dta": output})
+
+    build_cache.evict(max_size=250)
+    assert sorted(entry.name for entry in build_cache.CACHE_FOLDER.iterdir()
+                  if (entry / "manifest.json").exists()) == ["a", "c"]
@@ -0,0 +1,63 @@
+"""
+Arrow cleaning kernels.
+"""
+import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+import cleaning
+from cleaning import clean_batches, clean_frame, clean_table
+
+
+@pytest.mark.parametrize('values', [[np.nan, np.nan], [None, None]])
+@pytest.mark.parametrize('rules', [{'strip': ['a']}, {'empty_to_null': ['a']},
+                                   {'strip': ['a'], 'empty_to_null': ['a']}])
+def test_text_column_empty_in_chunk(values, rules):
+    rules = {**rules, 'strip': rules.get('strip', []) + ['b']}
+    df = clean_frame(pd.DataFrame({'a': values, 'b': [' x ', 'y']}), **rules)
+    assert df['a'].tolist() == [None, None]
+    assert df['b'].tolist() == ['x', 'y']
+
+
+def test_null_text_column_in_table():
+    table = clean_table(pa.table({'a': pa.nulls(3)}), strip=['a'], empty_to_null=['a'])
+    assert table.schema.field('a').type == pa.string()
+    assert table.column('a').null_count == 3
+
+
+STRIP_COLS = ['appln_auth', 'appln_nr', 'person_address']
+RULES = dict(strip=STRIP_COLS, empty_to_null=STRIP_COLS, null_dates=True, null_years=True)
+
+
+def as_objects(series):
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_kernels_match_pandas_rules(seed):
+    data = cleaning._sample(500, seed)
+    # missing values in the text columns too
+    data.loc[::7, STRIP_COLS] = None
+    expected = cleaning._pandas_rules(data.copy(), STRIP_COLS)
+    cleaned = clean_frame(data.copy(), **RULES)
+    for col in data.columns:
+        assert as_objects(cleaned[col]) == as_objects(expected[col]), col
+    assert str(cleaned['appln_filing_year'].dtype) == 'Int64'
+
+
+def test_dictionary_and_date_columns():
+    table = pa.table({'appln_auth': pa.array([' EP', 'US ', '', None]).dictionary_encode(),
+                      'appln_filing_date': pa.array([datetime.date(2000, 1, 1), datetime.date(9999, 12, 31),
+                                                     None, datetime.date(2001, 1, 1)])})
+    cleaned = clean_table(table, strip=['appln_auth'], empty_to_null=['appln_auth'], null_dates=True)
+    assert cleaned.column('appln_auth').to_pylist() == ['EP', 'US', None, None]
+    assert cleaned.column('appln_filing_date').to_pylist() == \
+        [datetime.date(2000, 1, 1), None, None, datetime.date(2001, 1, 1)]
+
+
+def test_batches_match_table():
+    table = pa.Table.from_pandas(cleaning._sample(300), preserve_index=False)
+    reader = pa.RecordBatchReader.from_batches(table.schema, table.to_batches(max_chunksize=70))
+    cleaned = clean_batches(reader, **RULES).read_all()
+    assert cleaned.equals(clean_table(table, **RULES).cast(cleaned.schema))
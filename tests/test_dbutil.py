@@ -0,0 +1,108 @@
+"""
+Round trip through dbutil against a SQLite database.
+"""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import text
+import dbutil
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setenv(dbutil.DB_URL_VARIABLE, f"sqlite:///{tmp_path / 'patstat.db'}")
+    engine = dbutil.get_engine('user', 'secret')
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE tls201 (appln_id INTEGER PRIMARY KEY, "
+                          "appln_auth TEXT, appln_filing_year INTEGER, granted INTEGER)"))
+        conn.execute(text("CREATE INDEX ix_auth ON tls201 (appln_auth)"))
+        conn.execute(text("CREATE INDEX ix_year ON tls201 (appln_filing_year, appln_auth)"))
+    yield engine
+    dbutil.dispose_engines()
+
+
+def source_table(n_rows=1000):
+    return pa.table({
+        'appln_id': pa.array(range(1, n_rows + 1), pa.int32()),
+        'appln_auth': pa.array([['EP', 'US', 'WO', None][i % 4] for i in range(n_rows)]).dictionary_encode(),
+        'appln_filing_year': pa.array([1990 + i % 30 if i % 7 else None for i in range(n_rows)], pa.int16()),
+        'granted': pa.array([i % 3 == 0 for i in range(n_rows)]),
+    })
+
+
+def loaded(engine):
+    with engine.connect() as conn:
+        return pd.read_sql(text("SELECT * FROM tls201 ORDER BY appln_id"), conn)
+
+
+def indexes(engine):
+    with engine.connect() as conn:
+        return sorted(name for name, _ in dbutil._secondary_indexes(conn, 'tls201'))
+
+
+@pytest.mark.parametrize('suffix', ['.feather', '.parquet'])
+def test_bulk_load_inserts_and_rebuilds_indexes(database, tmp_path, suffix):
+    table = source_table()
+    path = tmp_path / f"tls201{suffix}"
+    if suffix == '.parquet':
+        pq.write_table(table, path, row_group_size=300)
+    else:
+        feather.write_feather(table, path, chunksize=300)
+
+    n_rows = dbutil.bulk_load('user', 'secret', path, 'tls201', batch_rows=128, workers=1)
+
+    assert n_rows == table.num_rows
+    result = loaded(database)
+    expected = table.to_pandas()
+    assert result['appln_id'].tolist() == expected['appln_id'].tolist()
+    assert result['appln_auth'].tolist() == [None if pd.isna(v) else v for v in expected['appln_auth']]
+    assert result['appln_filing_year'].fillna(0).tolist() == expected['appln_filing_year'].fillna(0).tolist()
+    assert result['granted'].tolist() == expected['granted'].astype(int).tolist()
+    assert indexes(database) == ['ix_auth', 'ix_year']
+
+
+def test_bulk_load_infile_needs_mysql(database, tmp_path):
+    path = tmp_path / "tls201.feather"
+    feather.write_feather(source_table(10), path)
+    with pytest.raises(ValueError, match="MySQL"):
+        dbutil.bulk_load('user', 'secret', path, 'tls201', method='infile')
+    assert indexes(database) == ['ix_auth', 'ix_year']
+
+
+def test_stream_query_and_query_to_file(database, tmp_path):
+    with database.begin() as conn:
+        source_table().to_pandas().astype({'appln_auth': object}).to_sql('tls201', conn, if_exists='append',
+                                                                         index=False)
+    query = "SELECT appln_id, appln_auth FROM tls201 WHERE appln_id > :low ORDER BY appln_id"
+
+    chunks = list(dbutil.stream_query('user', 'secret', query, {'low': 100}, chunksize=250))
+    assert [len(chunk) for chunk in chunks] == [250, 250, 250, 150]
+    assert pd.concat(chunks)['appln_id'].tolist() == list(range(101, 1001))
+    batches = list(dbutil.stream_query('user', 'secret', query, {'low': 900}, chunksize=60, arrow=True))
+    assert all(isinstance(batch, pa.RecordBatch) for batch in batches)
+    assert sum(batch.num_rows for batch in batches) == 100
+
+    for suffix in ['.feather', '.parquet']:
+        output = tmp_path / f"result{suffix}"
+        assert dbutil.query_to_file('user', 'secret', query, {'low': 100}, output, chunksize=300) == 900
+        result = (pq.read_table(output) if suffix == '.parquet' else feather.read_table(output)).to_pandas()
+        assert result['appln_id'].tolist() == list(range(101, 1001))
+        assert result['appln_auth'].tolist() == loaded(database)['appln_auth'].tolist()[100:]
+
+    empty = tmp_path / "empty.feather"
+    assert dbutil.query_to_file('user', 'secret', query, {'low': 5000}, empty) == 0
+    assert not empty.exists()
+
+
+def test_url_argument_and_engine_reuse(tmp_path):
+    url = f"sqlite:///{tmp_path / 'other.db'}"
+    try:
+        engine = dbutil.get_engine('user', 'secret', url=url)
+        assert engine is dbutil.get_engine('user', 'secret', url=url)
+        assert engine.dialect.name == 'sqlite'
+        with dbutil.get_connection('user', 'secret', url=url) as conn:
+            assert conn.execute(text("SELECT 1")).scalar() == 1
+    finally:
+        dbutil.dispose_engines()
@@ -0,0 +1,106 @@
+"""
+Incremental update of the equivalent groups against a full rebuild.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from equivalents import combine_priorities, create_equivalents, update_equivalents
+
+
+COLUMNS = ['appln_id', 'prior_appln_id']
+
+
+def tls204(rows):
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def diff(previous, current):
+    both = pd.merge(previous, current, how='outer', indicator=True)
+    added = both.loc[both['_merge'] == 'right_only', COLUMNS].reset_index(drop=True)
+    removed = both.loc[both['_merge'] == 'left_only', COLUMNS].reset_index(drop=True)
+    return added, removed
+
+
+def partition(equivalents):
+    """
+    The groups as a set of sets of application IDs, whatever their numbers.
+    """
+    return {frozenset(group) for group in equivalents.groupby('eqv_grp_num')['appln_id']
+            .apply(lambda ids: tuple(ids.tolist()))}
+
+
+def update(previous_rows, current_rows):
+    """
+    Full build of the previous release, then both the incremental update and
+    a full rebuild of the current one.
+    """
+    previous_tls204, current_tls204 = tls204(previous_rows), tls204(current_rows)
+    previous = create_equivalents(combine_priorities(previous_tls204))
+    current = combine_priorities(current_tls204)
+    added, removed = diff(previous_tls204, current_tls204)
+    updated, changelog = update_equivalents(previous, current, added, removed)
+    assert updated['appln_id'].is_unique
+    assert partition(updated) == partition(create_equivalents(current))
+    return previous, updated, changelog
+
+
+def number_of(equivalents, appln_id):
+    return int(equivalents.loc[equivalents['appln_id'] == appln_id, 'eqv_grp_num'].iloc[0])
+
+
+# 1 and 2 claim 10; 3, 4 and 5 claim 20; 6 and 7 claim 30
+BASE = [(1, 10), (2, 10), (3, 20), (4, 20), (5, 20), (6, 30), (7, 30)]
+
+
+def test_merge_keeps_numbers():
+    # 20 now claims 10 alone: the {10} combination links it, and so {20}, to X
+    previous, updated, changelog = update(BASE, BASE + [(20, 10)])
+    x, y, z = number_of(previous, 1), number_of(previous, 3), number_of(previous, 6)
+    assert number_of(updated, 1) == number_of(updated, 3) == min(x, y)
+    assert number_of(updated, 6) == z
+    assert set(changelog.loc[changelog['change'] == 'merged', 'old_eqv_grp_num']) == {x, y}
+
+
+def test_split_keeps_number_with_largest_part():
+    previous, updated, changelog = update(BASE + [(20, 10)], BASE)
+    merged, z = number_of(previous, 1), number_of(previous, 6)
+    assert number_of(previous, 3) == merged
+    # {3, 4, 5, 20} is larger than {1, 2, 10} and keeps the number
+    assert number_of(updated, 3) == merged
+    assert number_of(updated, 1) == previous['eqv_grp_num'].max() + 1
+    assert number_of(updated, 6) == z
+    assert (changelog['change'] == 'split').any()
+
+
+def test_new_and_removed_applications():
+    previous, updated, _ = update(BASE, [row for row in BASE if row[0] != 7] + [(8, 40), (9, 40)])
+    assert 7 not in set(updated['appln_id'])
+    assert number_of(updated, 8) == number_of(updated, 9) > previous['eqv_grp_num'].max()
+    assert number_of(updated, 1) == number_of(previous, 1)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_diff_matches_full_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    n = 400
+    appln_id = rng.integers(1, n, 2 * n)
+    prior_appln_id = rng.integers(1, n, 2 * n)
+    rows = sorted(set(zip(appln_id.tolist(), prior_appln_id.tolist())))
+    keep = rng.random(len(rows)) > 0.05
+    current = [row for row, kept in zip(rows, keep) if kept]
+    current += list(zip(rng.integers(1, n + 50, 20).tolist(), rng.integers(1, n, 20).tolist()))
+    current = sorted(set(current))
+    previous, updated, _ = update(rows, current)
+    # a group the diff does not reach and that comes out with the same
+    # members keeps its number
+    added, removed = diff(tls204(rows), tls204(current))
+    touched = set(pd.concat([added, removed]).to_numpy().ravel().tolist())
+    new_groups = {frozenset(ids): num for num, ids in updated.groupby('eqv_grp_num')['appln_id']
+                  .apply(lambda ids: tuple(ids.tolist())).items()}
+    stable = 0
+    for num, ids in previous.groupby('eqv_grp_num')['appln_id']:
+        members = frozenset(ids.tolist())
+        if members.isdisjoint(touched) and members in new_groups:
+            assert new_groups[members] == num
+            stable += 1
+    assert stable > 0
@@ -0,0 +1,101 @@
+"""
+Graph traversals against plain Python searches.
+"""
+from collections import deque
+import numpy as np
+import pytest
+from graph import connected_components, reach_roots
+
+
+def brute_reach_roots(child, parent, bits):
+    """
+    Walk every (node, bits) state reachable from each linked node; roots as
+    documented in `reach_roots`.
+    """
+    parents = {}
+    nodes = set(child) | set(parent)
+    for c, p, b in zip(child, parent, bits):
+        if c != p:
+            parents.setdefault(c, []).append((p, b))
+
+    def reachable(start):
+        seen, queue = {start}, deque([start])
+        while queue:
+            node = queue.popleft()
+            for p, _ in parents.get(node, []):
+                if p not in seen:
+                    seen.add(p)
+                    queue.append(p)
+        return seen
+
+    closure = {node: reachable(node) for node in nodes}
+    roots = set()
+    for node in nodes:
+        if node not in parents:
+            roots.add(node)
+        else:
+            # a cycle no link leaves: everything it reaches reaches it back
+            cycle = closure[node]
+            if all(node in closure[other] for other in cycle) and node == min(cycle):
+                roots.add(node)
+
+    expected = {}
+    for origin in set(child):
+        shortest = {origin: 0}
+        queue = deque([origin])
+        while queue:
+            node = queue.popleft()
+            for p, _ in parents.get(node, []):
+                if p not in shortest:
+                    shortest[p] = shortest[node] + 1
+                    queue.append(p)
+        state_bits = {}
+        seen, queue = {(origin, 0)}, deque([(origin, 0)])
+        while queue:
+            node, path_bits = queue.popleft()
+            state_bits[node] = state_bits.get(node, 0) | path_bits
+            for p, b in parents.get(node, []):
+                state = (p, path_bits | b)
+                if state not in seen:
+                    seen.add(state)
+                    queue.append(state)
+        for node in shortest:
+            if node in roots:
+                expected[(origin, node)] = (shortest[node], state_bits[node])
+    return expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_reach_roots_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n_nodes, n_links = 40, 60
+    child = rng.integers(0, n_nodes, n_links) * 10
+    parent = rng.integers(0, n_nodes, n_links) * 10
+    bits = np.left_shift(1, rng.integers(0, 4, n_links)).astype(np.int8)
+    appln_id, root_appln_id, length, path_bits = reach_roots(child, parent, bits)
+    result = {(a, r): (l, b) for a, r, l, b in zip(appln_id.tolist(), root_appln_id.tolist(),
+                                                   length.tolist(), path_bits.tolist())}
+    assert result == brute_reach_roots(child.tolist(), parent.tolist(), bits.tolist())
+
+
+def test_reach_roots_follows_every_link():
+    # 1 is a continuation (8) of 2 and claims priority (1) of 3; 2 is a PCT
+    # (2) filing claiming 4; 5 is linked to itself only
+    appln_id, root_appln_id, length, path_bits = reach_roots(
+        np.array([1, 1, 2, 5]), np.array([2, 3, 4, 5]), np.array([8, 1, 2, 4], dtype=np.int8))
+    rows = set(zip(appln_id.tolist(), root_appln_id.tolist(), length.tolist(), path_bits.tolist()))
+    assert rows == {(1, 3, 1, 1), (1, 4, 2, 10), (2, 4, 1, 2), (5, 5, 0, 0)}
+
+
+def test_reach_roots_cycle():
+    # 1 -> 2 -> 3 -> 1, and 4 -> 2: the cycle is rooted at 1
+    appln_id, root_appln_id, length, _ = reach_roots(
+        np.array([1, 2, 3, 4]), np.array([2, 3, 1, 2]), np.ones(4, dtype=np.int8))
+    rows = set(zip(appln_id.tolist(), root_appln_id.tolist(), length.tolist()))
+    assert rows == {(1, 1, 0), (2, 1, 2), (3, 1, 1), (4, 1, 3)}
+
+
+def test_connected_components():
+    nodes, labels = connected_components(np.array([1, 3, 7]), np.array([2, 2, 8]))
+    assert nodes.tolist() == [1, 2, 3, 7, 8]
+    assert labels.tolist() == [0, 0, 0, 1, 1]
@@ -0,0 +1,117 @@
+"""
+Streaming ingestion of CSV shards into Feather files.
+"""
+import pandas as pd
+import pyarrow.feather as feather
+import pytest
+import ingest
+import tls_schema
+
+
+TLS201_COLUMNS = ['appln_id', 'appln_auth', 'receiving_office', 'appln_filing_date', 'granted']
+
+
+@pytest.fixture
+def raw_folder(tmp_path, monkeypatch):
+    folder = tmp_path / "raw"
+    folder.mkdir()
+    monkeypatch.setattr(ingest, 'RAW_FOLDER', folder)
+    return folder
+
+
+def write_shards(folder, shards):
+    for i, rows in enumerate(shards):
+        pd.DataFrame(rows, columns=TLS201_COLUMNS).to_csv(folder / f"tls201_part{i:02d}.csv", index=False)
+
+
+def values(column):
+    return [None if pd.isna(value) else value for value in column]
+
+
+def load_tls201(output, workers=1, chunksize=2):
+    ingest.load_table('tls201', output, workers=workers, chunksize=chunksize, usecols=TLS201_COLUMNS,
+                      strip=['appln_auth'], flags=['granted'], nonzero='appln_id', null_dates=True)
+    return feather.read_table(output).to_pandas()
+
+
+def test_code_column_null_in_first_chunk(tmp_path):
+    output = tmp_path / "TLS211.feather"
+    chunks = [pd.DataFrame({'publn_auth': [None, None]}),
+              pd.DataFrame({'publn_auth': ['EP', None]}),
+              pd.DataFrame({'publn_auth': ['US', 'EP']})]
+    n_rows, null_counts = ingest.write_chunks(chunks, output, tls_schema.arrow_types('tls211'))
+    assert n_rows == 6
+    assert null_counts['publn_auth'] == 3
+    assert values(feather.read_table(output).to_pandas()['publn_auth']) == \
+        [None, None, 'EP', None, 'US', 'EP']
+    assert [path.name for path in tmp_path.iterdir()] == ["TLS211.feather"]
+
+
+def test_code_column_null_throughout(tmp_path):
+    output = tmp_path / "TLS211.feather"
+    chunks = [pd.DataFrame({'publn_auth': [None, None], 'publn_nr': ['1', '2']}),
+              pd.DataFrame({'publn_auth': [None], 'publn_nr': ['3']})]
+    ingest.write_chunks(chunks, output, tls_schema.arrow_types('tls211'))
+    result = feather.read_table(output).to_pandas()
+    assert result['publn_auth'].isna().all()
+    assert result['publn_nr'].tolist() == ['1', '2', '3']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_receiving_office_empty_in_first_shard(raw_folder, tmp_path, workers):
+    write_shards(raw_folder, [
+        [(1, 'EP ', None, '2001-02-03', 'Y'), (2, 'US', None, '9999-12-31', 'N'), (3, 'WO', None, '2002-01-01', 'N')],
+        [(4, 'WO', 'EP', '2003-01-01', 'N'), (0, 'XX', 'XX', '9999-12-31', 'N'), (5, 'WO', 'IB', '2004-05-06', 'Y')],
+    ])
+    result = load_tls201(tmp_path / "TLS201.feather", workers)
+    assert result['appln_id'].tolist() == [1, 2, 3, 4, 5]
+    assert result['appln_auth'].tolist() == ['EP', 'US', 'WO', 'WO', 'WO']
+    assert values(result['receiving_office']) == [None, None, None, 'EP', 'IB']
+    assert result['granted'].tolist() == [1, 0, 0, 0, 1]
+    assert result['appln_filing_date'].isna().tolist() == [False, True, False, False, False]
+
+
+def test_parse_args_lake_only_where_supported(capsys):
+    args = ingest.parse_args(lake=True, argv=['--lake', '--compression', 'none'])
+    assert args.lake and args.compression is None
+    assert ingest.parse_args(argv=[]).compression == 'lz4'
+    with pytest.raises(SystemExit):
+        ingest.parse_args(argv=['--lake'])
+    assert "unrecognized arguments: --lake" in capsys.readouterr().err
+
+
+def test_streamed_load_matches_whole_shard_read(raw_folder, tmp_path):
+    shards = [[(1, ' EP', 'EP', '2001-02-03', 'Y'), (0, 'XX', 'XX', '9999-12-31', 'N'),
+               (2, 'US ', None, '9999-12-31', 'N')],
+              [(3, 'WO', 'IB', '2002-01-01', 'Y')],
+              [(4, 'DE', 'DE', '2003-03-03', 'N'), (5, 'JP', 'JP', '2004-04-04', 'Y'),
+               (6, 'EP', 'EP', '2005-05-05', 'N')]]
+    write_shards(raw_folder, shards)
+    # the loaders' former rules, on the whole table at once
+    expected = pd.concat([pd.read_csv(file) for file in ingest.list_shards('tls201')], ignore_index=True)
+    expected = expected[expected.appln_id != 0]
+    expected['appln_auth'] = expected.appln_auth.str.strip()
+    expected = expected.replace("9999-12-31", None)
+    expected['granted'] = (expected.granted == 'Y').astype(int)
+
+    result = load_tls201(tmp_path / "TLS201.feather", chunksize=2)
+    assert len(result) == len(expected) == 6
+    for col in ['appln_id', 'appln_auth', 'granted']:
+        assert result[col].tolist() == expected[col].tolist(), col
+    assert values(result['receiving_office']) == values(expected['receiving_office'])
+    assert pd.to_datetime(result['appln_filing_date']).tolist() == \
+        pd.to_datetime(expected['appln_filing_date']).tolist()
+
+
+def test_parallel_load_matches_serial(raw_folder, tmp_path):
+    write_shards(raw_folder, [
+        [(i, 'EP ' if i % 2 else 'US', None if i < 4 else 'EP', f'200{i % 10}-01-01', 'YN'[i % 2])
+         for i in range(start, start + 5)]
+        for start in (1, 6, 11, 16)
+    ])
+    serial = load_tls201(tmp_path / "serial.feather", workers=1)
+    parallel = load_tls201(tmp_path / "parallel.feather", workers=3)
+    pd.testing.assert_frame_equal(parallel, serial)
+    assert serial['appln_id'].tolist() == list(range(1, 21))
+    # the part files of the workers are cleaned up
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["parallel.feather", "raw", "serial.feather"]
@@ -0,0 +1,50 @@
+"""
+Local SQL views over the processed files.
+"""
+import os
+import pandas as pd
+import pytest
+import lake
+import localdb
+
+
+@pytest.fixture
+def data_folder(tmp_path, monkeypatch):
+    folder = tmp_path / "data"
+    folder.mkdir()
+    monkeypatch.setattr(lake, 'LAKE_FOLDER', folder / "lake")
+    pd.DataFrame({'appln_id': [1, 2, 3], 'appln_auth': ['EP', 'US', 'EP'],
+                  'appln_filing_year': [2000, 2001, 2001]}).to_feather(folder / "TLS201.feather")
+    pd.DataFrame({'citng_appln_id': [1, 1, 3], 'cited_appln_id': [2, 3, 2],
+                  'source': [1, 2, 1]}).to_stata(folder / "pl_citations.dta", write_index=False,
+                                                 value_labels={'source': {1: 'priority', 2: 'prior-PCT'}})
+    lake.write_dataset(pd.read_feather(folder / "TLS201.feather"), "TLS201")
+    return folder
+
+
+def test_views_over_feather_stata_and_lake(data_folder):
+    conn = localdb.connect(data_folder, threads=2)
+    assert localdb.query("SELECT count(*) AS n FROM TLS201", conn=conn)['n'].tolist() == [3]
+    df = localdb.query("""SELECT c.citng_appln_id, c.source, t.appln_auth
+                          FROM pl_citations c JOIN TLS201 t ON c.cited_appln_id = t.appln_id
+                          WHERE t.appln_auth = ? ORDER BY 1""", ['US'], conn=conn)
+    assert df.values.tolist() == [[1, 'priority', 'US'], [3, 'priority', 'US']]
+    # the partition columns of a lake dataset are columns of its view
+    df = localdb.query("""SELECT appln_id FROM lake_TLS201
+                          WHERE appln_auth = 'EP' AND appln_filing_year = 2001""", conn=conn)
+    assert df['appln_id'].tolist() == [3]
+    assert sorted(localdb.sources(data_folder)) == ['TLS201', 'lake_TLS201', 'pl_citations']
+
+
+def test_stata_mirror_refreshed(data_folder):
+    dta_path = data_folder / "pl_citations.dta"
+    mirror = localdb.stata_mirror(dta_path, data_folder / "sql")
+    assert pd.read_feather(mirror)['cited_appln_id'].tolist() == [2, 3, 2]
+
+    pd.DataFrame({'citng_appln_id': [2], 'cited_appln_id': [1], 'source': [2]}).to_stata(dta_path,
+                                                                                        write_index=False)
+    mtime = mirror.stat().st_mtime + 10
+    os.utime(dta_path, (mtime, mtime))
+    conn = localdb.connect(data_folder)
+    assert localdb.query("SELECT * FROM pl_citations", conn=conn).values.tolist() == [[2, 1, 2]]
+    assert localdb.query_arrow("SELECT * FROM pl_citations", conn=conn).num_rows == 1
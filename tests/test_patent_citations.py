@@ -0,0 +1,96 @@
+"""
+Citation classification of patent_citations.py against the query masks and
+merges it replaces.
+"""
+import pandas as pd
+import pyarrow.feather as feather
+import pytest
+
+
+TLS211 = pd.DataFrame({'pat_publn_id': [1, 2, 3, 4, 5],
+                       'appln_id': [10, 20, 30, 40, 50],
+                       'publn_auth': ['EP', 'WO', 'US', 'DE', 'EP']})
+TLS212_COLUMNS = ['pat_publn_id', 'citn_replenished', 'citn_id', 'citn_origin', 'cited_pat_publn_id',
+                  'cited_appln_id', 'pat_citn_seq_nr', 'cited_npl_publn_id', 'npl_citn_seq_nr',
+                  'citn_gener_auth']
+TLS212 = pd.DataFrame([
+    (1, 0, 1, 'SEA', 3, 0, 1, None, 0, 'EP'),      # publication
+    (1, 0, 1, 'SEA', 3, 0, 1, None, 0, 'EP'),      # duplicate row
+    (1, 0, 2, 'EXA', 0, 40, 2, None, 0, 'EP'),     # application
+    (1, 0, 3, 'SEA', 0, 0, 0, ' 77 ', 1, 'EP'),    # NPL
+    (1, 0, 4, 'APP', 4, 0, 3, '78', 2, 'EP'),      # NPL that is a patent publication
+    (5, 0, 1, 'SEA', 3, 0, 1, None, 0, 'EP'),      # same cited application as 1
+    (5, 0, 2, 'SEA', 4, 0, 2, None, 0, 'EP'),
+    (2, 0, 1, 'ISR', 3, 0, 1, None, 0, 'XN'),      # international phase
+    (2, 0, 2, 'ISR', 0, 0, 0, '79', 1, 'XN'),
+    (2, 0, 3, 'ISR', 0, 30, 2, None, 0, 'XN'),
+], columns=TLS212_COLUMNS)
+APPLN_PCT_LINK = pd.DataFrame({'appln_id': [10, 50, 60], 'WO_appln_id': [20.0, 20.0, 20.0],
+                               'PCT_appln': [1, 1, 0]})
+PL_KEY = ['citng_appln_id', 'citn_origin', 'cited_appln_id']
+NPL_KEY = ['citng_appln_id', 'citn_origin', 'cited_npl_publn_id']
+
+
+def baseline_citations(tls211, tls212, appln_pct_link):
+    """
+    The former query masks and TLS211 merges of patent_citations.py.
+    """
+    citations = tls212.drop_duplicates().copy()
+    citations['cited_npl_publn_id'] = citations.cited_npl_publn_id.str.strip().fillna('0')
+    citations['is_publn_cited'] = citations.cited_pat_publn_id > 0
+    citations['is_npl_cited'] = (citations.cited_npl_publn_id != '0') & (citations.is_publn_cited == 0)
+    citations['is_appln_cited'] = (citations.is_publn_cited == 0) & (citations.is_npl_cited == 0) \
+        & (citations.cited_appln_id > 0)
+    citations = pd.merge(citations, tls211, on='pat_publn_id').rename(columns={
+        'pat_publn_id': 'citng_pat_publn_id', 'publn_auth': 'citng_publn_auth',
+        'appln_id': 'citng_appln_id'})
+    pp = pd.merge(citations.query("is_publn_cited==True"), tls211[['pat_publn_id', 'appln_id']],
+                  left_on='cited_pat_publn_id', right_on='pat_publn_id')
+    pp['cited_appln_id'] = pp.appln_id
+    citations = pd.concat([pp.drop(['pat_publn_id', 'appln_id'], axis=1),
+                           citations.query("is_appln_cited==True"),
+                           citations.query("is_npl_cited==True")], ignore_index=True)
+    link = appln_pct_link.query("PCT_appln==1")
+    pct = pd.merge(link[['appln_id', 'WO_appln_id']], citations.query("citng_publn_auth=='WO'"),
+                   left_on='WO_appln_id', right_on='citng_appln_id')
+    pct = pct.drop(['citng_appln_id', 'WO_appln_id'], axis=1).rename(columns={'appln_id': 'citng_appln_id'})
+    citations = pd.concat([citations, pct], ignore_index=True)
+    pl = citations.query("is_publn_cited == 1 or is_appln_cited == 1").drop_duplicates(subset=PL_KEY)
+    npl = citations.query("is_npl_cited == 1").drop_duplicates(subset=NPL_KEY)
+    pl = pl[PL_KEY + ['citn_gener_auth', 'is_publn_cited', 'is_appln_cited']]
+    npl = npl[NPL_KEY + ['citn_gener_auth', 'is_npl_cited']]
+    return pl.astype({'is_publn_cited': int, 'is_appln_cited': int}), npl.astype({'is_npl_cited': int})
+
+
+def normalize(df, key):
+    df = df.astype({col: str for col in df.columns if col.startswith('cit') and 'appln_id' not in col})
+    df = df.astype({col: 'int64' for col in df.columns if col not in df.select_dtypes(object)})
+    return df.sort_values(key, ignore_index=True)
+
+
+@pytest.fixture
+def citations(run_script, tmp_path):
+    feather.write_feather(TLS211, tmp_path / "data" / "TLS211.feather")
+    feather.write_feather(TLS212, tmp_path / "data" / "TLS212.feather")
+    APPLN_PCT_LINK.to_stata(tmp_path / "data" / "appln_PCT_link.dta", write_index=False)
+    run_script("patent_citations.py")
+    return (pd.read_stata(tmp_path / "data" / "pl_citations.dta"),
+            pd.read_stata(tmp_path / "data" / "npl_citations.dta"))
+
+
+def test_citations_match_baseline(citations):
+    pl, npl = citations
+    expected_pl, expected_npl = baseline_citations(TLS211, TLS212, APPLN_PCT_LINK)
+    pd.testing.assert_frame_equal(normalize(pl, PL_KEY), normalize(expected_pl, PL_KEY))
+    pd.testing.assert_frame_equal(normalize(npl, NPL_KEY), normalize(expected_npl, NPL_KEY))
+
+
+def test_citation_kinds(citations):
+    pl, npl = citations
+    pl = pl.set_index(PL_KEY)
+    # a cited NPL document that is also a patent publication counts as a publication
+    assert pl.loc[(10, 'APP', 40), 'is_publn_cited'] == 1
+    assert pl.loc[(10, 'EXA', 40), 'is_appln_cited'] == 1
+    # the international phase citations are copied to the PCT applications
+    assert sorted(pl.loc[50].index.tolist()) == [('ISR', 30), ('SEA', 30), ('SEA', 40)]
+    assert sorted(npl.citng_appln_id.tolist()) == [10, 10, 20, 50]
@@ -0,0 +1,66 @@
+"""
+Dense lookup index of TLS211 publications.
+"""
+import os
+import pandas as pd
+import pyarrow as pa
+import pytest
+import publn_index
+from publn_index import MISSING
+
+
+@pytest.fixture
+def index_files(tmp_path):
+    tls211_path = tmp_path / "TLS211.feather"
+    schema = pa.schema([('pat_publn_id', pa.int32()), ('appln_id', pa.int32()),
+                        ('publn_auth', pa.string()), ('publn_nr', pa.string())])
+    batches = [pa.record_batch([pa.array([5, 2], pa.int32()), pa.array([50, None], pa.int32()),
+                                pa.array(['EP', 'US']), pa.array(['5', '2'])], schema=schema),
+               pa.record_batch([pa.array([9, 3], pa.int32()), pa.array([90, 30], pa.int32()),
+                                pa.array(['WO', None]), pa.array(['9', '3'])], schema=schema)]
+    with pa.ipc.new_file(str(tls211_path), schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    folder = tmp_path / "publn_index"
+    publn_index.build_index(tls211_path, folder)
+    return tls211_path, folder
+
+
+def test_null_appln_id_is_missing(index_files):
+    index = publn_index.open_index(*index_files)
+    assert publn_index.resolve_appln_id(index, [5, 2]).tolist() == [50, MISSING]
+
+
+def test_take_publications_of_missing_rows(index_files):
+    tls211_path, folder = index_files
+    index = publn_index.open_index(tls211_path, folder)
+    rows = publn_index.resolve_row(index, [3, 4, 5])
+    assert rows.tolist() == [3, MISSING, 0]
+    df = publn_index.take_publications(rows, ['pat_publn_id', 'publn_nr'], tls211_path)
+    assert df['publn_nr'].tolist()[::2] == ['3', '5']
+    assert pd.isna(df['publn_nr'][1]) and pd.isna(df['pat_publn_id'][1])
+
+
+def test_lookups_match_a_merge(index_files):
+    tls211_path, folder = index_files
+    index = publn_index.open_index(tls211_path, folder)
+    ids = [9, 3, 5, 7, 100, -1, 0, 3]
+    tls211 = pd.read_feather(tls211_path)
+    expected = pd.merge(pd.DataFrame({'pat_publn_id': ids}), tls211, how='left', on='pat_publn_id')
+    assert publn_index.resolve_appln_id(index, ids).tolist() == \
+        expected['appln_id'].fillna(MISSING).astype(int).tolist()
+    auths = publn_index.resolve_publn_auth(index, ids)
+    assert [None if pd.isna(auth) else auth for auth in auths] == \
+        [None if pd.isna(auth) else auth for auth in expected['publn_auth']]
+    assert publn_index.resolve_row(index, ids).tolist() == [2, 3, 0, MISSING, MISSING, MISSING, MISSING, 3]
+
+
+def test_index_rebuilt_when_tls211_is_newer(index_files):
+    tls211_path, folder = index_files
+    pd.DataFrame({'pat_publn_id': [1], 'appln_id': [11], 'publn_auth': ['EP'],
+                  'publn_nr': ['1']}).to_feather(tls211_path)
+    built = (folder / "auths.npy").stat().st_mtime
+    os.utime(tls211_path, (built + 10, built + 10))
+    index = publn_index.open_index(tls211_path, folder)
+    assert publn_index.resolve_appln_id(index, [1, 5]).tolist() == [11, MISSING]
+    assert not folder.with_name(folder.name + ".part").exists()
@@ -0,0 +1,89 @@
+"""
+Quasi priorities of applns_quasi_priorities.py against the chained outer
+merges they replace.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+
+KEY = ['appln_id', 'prior_appln_id', 'prior_appln_auth', 'prior_appln_filing_date']
+
+
+def random_inputs(rng, n_applns=80, n_links=120):
+    appln_ids = np.arange(1, n_applns + 1)
+    dates = pd.to_datetime('2000-01-01') + pd.to_timedelta(rng.integers(0, 30, n_applns), unit='D')
+    tls201 = pd.DataFrame({'appln_id': appln_ids,
+                           'appln_auth': rng.choice(['EP', 'US', 'WO', 'JP'], n_applns),
+                           'appln_filing_date': dates.where(rng.random(n_applns) > 0.05)})
+
+    def links(n):
+        # few distinct applications, so that the sources overlap
+        return rng.choice(appln_ids[:30], n), rng.choice(appln_ids[:30], n)
+    appln_id, prior_appln_id = links(n_links)
+    tls204 = pd.DataFrame({'appln_id': appln_id, 'prior_appln_id': prior_appln_id, 'prior_appln_seq_nr': 1})
+    appln_id, wo_appln_id = links(n_links)
+    appln_pct = pd.DataFrame({'appln_id': appln_id, 'WO_appln_id': wo_appln_id.astype(float),
+                              'PCT_appln': rng.integers(0, 2, n_links).astype(np.int8)})
+    appln_id, tech_rel_appln_id = links(n_links)
+    tls205 = pd.DataFrame({'appln_id': appln_id, 'tech_rel_appln_id': tech_rel_appln_id})
+    appln_id, parent_appln_id = links(n_links)
+    tls216 = pd.DataFrame({'appln_id': appln_id, 'parent_appln_id': parent_appln_id,
+                           'contn_type': rng.choice(['CON', 'DIV'], n_links)})
+    return tls201, tls204, appln_pct, tls205, tls216
+
+
+def outer_merges(tls201, tls204, appln_pct, tls205, tls216):
+    """
+    The former builder: one frame per source, chained outer merges and the
+    source order rebuilt from the source flags.
+    """
+    prior = tls201.rename(columns={'appln_id': 'prior_appln_id', 'appln_auth': 'prior_appln_auth',
+                                   'appln_filing_date': 'prior_appln_filing_date'})
+    priority = pd.merge(tls204[['appln_id', 'prior_appln_id']], prior, on='prior_appln_id')
+    priority['source_priority'] = 1
+    pct = appln_pct.query("PCT_appln==1").rename(columns={'WO_appln_id': 'prior_appln_id'})
+    pct = pd.merge(pct[['appln_id', 'prior_appln_id']], prior, on='prior_appln_id')
+    pct['source_PCT'] = 1
+    tech_rel = pd.merge(tls205, tls201[['appln_id', 'appln_filing_date']], on='appln_id')
+    tech_rel = pd.merge(tech_rel.rename(columns={'tech_rel_appln_id': 'prior_appln_id'}), prior,
+                        on='prior_appln_id')
+    tech_rel = tech_rel[tech_rel.appln_filing_date >= tech_rel.prior_appln_filing_date]
+    tech_rel = tech_rel.drop('appln_filing_date', axis=1)
+    tech_rel['source_tech_rel'] = 1
+    continuation = pd.merge(tls216[['appln_id', 'parent_appln_id']].rename(
+        columns={'parent_appln_id': 'prior_appln_id'}), prior, on='prior_appln_id')
+    continuation['source_continuation'] = 1
+
+    quasi_priorities = priority
+    for source in [pct, tech_rel, continuation]:
+        quasi_priorities = pd.merge(quasi_priorities, source, how='outer', on=KEY).drop_duplicates()
+    flags = quasi_priorities[['source_priority', 'source_PCT', 'source_tech_rel',
+                              'source_continuation']].fillna(0).to_numpy()
+    quasi_priorities['source'] = flags.argmax(axis=1) + 1
+    return quasi_priorities[KEY + ['source']].sort_values(
+        ['appln_id', 'source', 'prior_appln_filing_date', 'prior_appln_id']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_quasi_priorities_match_outer_merges(run_script, tmp_path, seed):
+    tls201, tls204, appln_pct, tls205, tls216 = random_inputs(np.random.default_rng(seed))
+    data = tmp_path / "data"
+    tls201.to_feather(data / "TLS201.feather")
+    tls204.to_feather(data / "TLS204.feather")
+    appln_pct.to_stata(data / "appln_PCT_link.dta", write_index=False)
+    tls205.to_feather(data / "TLS205.feather")
+    tls216.to_feather(data / "TLS216.feather")
+
+    run_script("applns_quasi_priorities.py")
+
+    result = pd.read_stata(data / "applns_quasi_priorities.dta", convert_categoricals=False)
+    expected = outer_merges(tls201, tls204, appln_pct, tls205, tls216)
+    assert expected['source'].nunique() == 4
+    assert result[['appln_id', 'prior_appln_id', 'source']].astype('int64').values.tolist() == \
+        expected[['appln_id', 'prior_appln_id', 'source']].astype('int64').values.tolist()
+    assert result['prior_appln_auth'].tolist() == expected['prior_appln_auth'].tolist()
+    pd.testing.assert_series_equal(result['prior_appln_filing_date'], expected['prior_appln_filing_date'],
+                                   check_dtype=False, check_names=False)
+    labels = pd.read_stata(data / "applns_quasi_priorities.dta")['source']
+    assert labels[result['source'] == 2].eq('prior-PCT').all()
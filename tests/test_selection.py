@@ -0,0 +1,106 @@
+"""
+best_per_group against the groupby-rank cascades it replaces.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from selection import best_per_group
+
+
+def rank_cascade(frame, by, order, ascending, keep_ties=False, keep_missing=()):
+    """
+    One `groupby(by)[col].rank('dense') == 1` filter per order column; a
+    missing value never ranks first, except in the `keep_missing` columns
+    where it ranks last. Rows with a missing group key are dropped first.
+    """
+    frame = frame.dropna(subset=by)
+    for col, asc in zip(order, ascending):
+        na_option = 'bottom' if col in keep_missing else 'keep'
+        rank = frame.groupby(by)[col].rank('dense', ascending=asc, na_option=na_option)
+        frame = frame[rank == 1]
+    if not keep_ties:
+        frame = frame[~frame.duplicated(by)]
+    return frame
+
+
+def random_frame(rng, n_rows=500):
+    frame = pd.DataFrame({
+        'appln_id': rng.integers(0, 60, n_rows),
+        'role': rng.integers(0, 3, n_rows),
+        'date': pd.to_datetime('2000-01-01') + pd.to_timedelta(rng.integers(0, 20, n_rows), unit='D'),
+        'seq': rng.integers(0, 5, n_rows).astype(float),
+        'rank_id': rng.integers(0, 1000, n_rows),
+    })
+    frame.loc[rng.random(n_rows) < 0.15, 'date'] = pd.NaT
+    frame.loc[rng.random(n_rows) < 0.15, 'seq'] = np.nan
+    frame['role'] = frame['role'].where(rng.random(n_rows) > 0.05)
+    return frame
+
+
+CASES = [
+    (['appln_id'], ['date', 'rank_id'], [True, True]),
+    (['appln_id'], ['seq', 'date'], [False, True]),
+    (['appln_id', 'role'], ['date', 'seq', 'rank_id'], [True, False, True]),
+    (['role', 'appln_id'], ['seq'], [False]),
+]
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("by, order, ascending", CASES)
+@pytest.mark.parametrize("keep_ties", [False, True])
+def test_matches_rank_cascade(seed, by, order, ascending, keep_ties):
+    frame = random_frame(np.random.default_rng(seed))
+    expected = rank_cascade(frame, by, order, ascending, keep_ties)
+    result = best_per_group(frame, by, order, ascending, keep_ties=keep_ties)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("by, order, ascending", CASES)
+@pytest.mark.parametrize("keep_ties", [False, True])
+def test_keep_missing_matches_rank_cascade(seed, by, order, ascending, keep_ties):
+    frame = random_frame(np.random.default_rng(seed))
+    keep_missing = order[:1]
+    expected = rank_cascade(frame, by, order, ascending, keep_ties, keep_missing)
+    result = best_per_group(frame, by, order, ascending, keep_ties=keep_ties,
+                            keep_missing=keep_missing)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_missing_values():
+    frame = pd.DataFrame({'appln_id': [1, 1, 2, 2, 3, None],
+                          'date': pd.to_datetime(['2001-01-01', None, None, None, '2003-01-01',
+                                                  '2000-01-01'])})
+    # a missing date loses; a group without any date is dropped, and so is a
+    # row without a group key
+    assert best_per_group(frame, 'appln_id', ['date']).index.tolist() == [0, 4]
+    # unless missing dates may win
+    assert best_per_group(frame, 'appln_id', ['date'], keep_missing=['date']).index.tolist() == [0, 2, 4]
+
+
+def test_keep_missing_only_applies_to_its_columns():
+    frame = pd.DataFrame({'appln_id': [1, 1, 2],
+                          'date': pd.to_datetime([None, None, None]),
+                          'pct': [np.nan, 5.0, np.nan]})
+    result = best_per_group(frame, 'appln_id', ['date', 'pct'], keep_missing=['date'])
+    assert result.index.tolist() == [1]
+
+
+def test_keep_ties():
+    frame = pd.DataFrame({'appln_id': [7, 7, 7, 8],
+                          'publn_date': pd.to_datetime(['2001-01-01', '2001-01-01', '2002-01-01',
+                                                        '2001-01-01']),
+                          'person_id': [3, 1, 2, 4]})
+    assert best_per_group(frame, 'appln_id', ['publn_date']).index.tolist() == [0, 3]
+    assert best_per_group(frame, 'appln_id', ['publn_date'], keep_ties=True).index.tolist() == [0, 1, 3]
+
+
+def test_mixed_directions():
+    frame = pd.DataFrame({'g': [1, 1, 1, 1], 'a': [2, 2, 1, 2], 'b': [5, 9, 9, 7]})
+    assert best_per_group(frame, 'g', ['a', 'b'], [False, True]).index.tolist() == [0]
+    assert best_per_group(frame, 'g', ['a', 'b'], [False, False]).index.tolist() == [1]
+
+
+def test_empty_frame():
+    frame = pd.DataFrame({'g': pd.Series([], dtype=int), 'a': pd.Series([], dtype=float)})
+    assert best_per_group(frame, 'g', ['a']).empty
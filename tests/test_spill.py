@@ -0,0 +1,90 @@
+"""
+Out-of-core joins against pd.merge.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pytest
+import spill
+from spill import join_to_file
+
+
+@pytest.fixture(autouse=True)
+def spill_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(spill, 'SPILL_FOLDER', tmp_path / "spill")
+
+
+def sides(seed):
+    rng = np.random.default_rng(seed)
+    left = pd.DataFrame({'key': rng.integers(0, 50, 300).astype(np.int32),
+                         'left_value': rng.normal(size=300)})
+    right = pd.DataFrame({'key': rng.integers(25, 75, 200).astype(np.int32),
+                          'code': rng.choice(['a', 'b', None], 200)})
+    return left, right
+
+
+def read(path, sort_by):
+    return normalized(feather.read_table(path).to_pandas(), sort_by)
+
+
+def normalized(df, sort_by):
+    # missing codes are None from Arrow and NaN from pd.merge
+    return df.fillna({'code': ''}).sort_values(sort_by, ignore_index=True)
+
+
+@pytest.mark.parametrize('how', ['inner', 'left', 'right', 'outer'])
+def test_matches_merge(tmp_path, how):
+    left, right = sides(0)
+    output = tmp_path / "joined.feather"
+    n_rows = join_to_file(left, right, output, on='key', how=how)
+    expected = normalized(pd.merge(left, right, on='key', how=how), ['key', 'left_value', 'code'])
+    result = read(output, ['key', 'left_value', 'code'])
+    assert n_rows == len(expected)
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_file_and_batch_sources(tmp_path):
+    left, right = sides(1)
+    right_file = tmp_path / "right.feather"
+    feather.write_feather(right.rename(columns={'key': 'key2'}), right_file)
+    table = pa.Table.from_pandas(left, preserve_index=False)
+    batches = pa.RecordBatchReader.from_batches(table.schema, table.to_batches(max_chunksize=7))
+    output = tmp_path / "joined.feather"
+    join_to_file(batches, right_file, output, left_on='key', right_on='key2',
+                 how='left', columns=['key', 'code'], where="code IS NOT NULL")
+    expected = pd.merge(left, right.rename(columns={'key': 'key2'}), left_on='key', right_on='key2', how='left')
+    expected = (expected.loc[expected['code'].notna(), ['key', 'code']]
+                .sort_values(['key', 'code'], ignore_index=True))
+    pd.testing.assert_frame_equal(read(output, ['key', 'code']), expected, check_dtype=False)
+
+
+def test_right_keys_named_apart(tmp_path):
+    left, right = sides(2)
+    output = tmp_path / "joined.feather"
+    join_to_file(left, right.rename(columns={'key': 'key2'}), output, left_on='key', right_on='key2')
+    assert feather.read_table(output).column_names == ['key', 'left_value', 'key2', 'code']
+
+
+def test_order_by(tmp_path):
+    left, right = sides(3)
+    output = tmp_path / "joined.feather"
+    join_to_file(left, right, output, on='key', order_by=['key', 'left_value'])
+    result = feather.read_table(output).to_pandas()
+    pd.testing.assert_frame_equal(result, result.sort_values(['key', 'left_value'], ignore_index=True))
+
+
+def test_missing_keys_do_not_match(tmp_path):
+    left = pd.DataFrame({'key': [1.0, np.nan], 'a': [1, 2]})
+    right = pd.DataFrame({'key': [1.0, np.nan], 'b': [3, 4]})
+    output = tmp_path / "joined.feather"
+    assert join_to_file(left, right, output, on='key') == 1
+
+
+def test_shared_columns_rejected(tmp_path):
+    left, right = sides(4)
+    with pytest.raises(ValueError, match="left_value"):
+        join_to_file(left, right.assign(left_value=1), tmp_path / "joined.feather", on='key')
+    with pytest.raises(ValueError, match="Unknown join type"):
+        join_to_file(left, right, tmp_path / "joined.feather", on='key', how='cross')
@@ -0,0 +1,73 @@
+"""
+Stata files of the Arrow writer, read back with pandas.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+import stata
+from stata import write_dta
+
+
+def test_round_trip_matches_to_stata(tmp_path):
+    data = stata._sample(1000)
+    value_labels = {'source': {1: 'priority', 2: 'continuation', 3: 'PCT'}}
+    write_dta(data, tmp_path / "arrow.dta", value_labels=value_labels, batch_rows=300)
+    frame = data.copy()
+    for col in frame.columns[frame.dtypes == "category"]:
+        frame[col] = frame[col].astype(object)
+    frame.to_stata(tmp_path / "pandas.dta", write_index=False, convert_dates={'publn_date': 'td'},
+                   value_labels=value_labels, version=118)
+    pd.testing.assert_frame_equal(pd.read_stata(tmp_path / "arrow.dta"), pd.read_stata(tmp_path / "pandas.dta"),
+                                  check_dtype=False)
+
+
+def test_values_and_missing_values(tmp_path):
+    table = pa.table({
+        'appln_id': pa.array([1, None, 2**31 - 100], pa.int64()),
+        'big_id': pa.array([1, 2, 2**40], pa.int64()),
+        'flag': pa.array([True, False, None]),
+        'share': pa.array([0.5, None, 1.25]),
+        'filing_date': pa.array([pd.Timestamp('1960-01-01').date(), None, pd.Timestamp('2024-02-29').date()]),
+        'name': pa.array(['Université', None, '']),
+        'abstract': pa.array(['é' * 1500, 'x', None]),
+        'auth': pa.array(['EP', 'US', None]).dictionary_encode(),
+    })
+    write_dta(table, tmp_path / "out.dta", batch_rows=2)
+
+    df = pd.read_stata(tmp_path / "out.dta")
+    assert df['appln_id'].isna().tolist() == [False, True, False]
+    assert df['appln_id'][2] == 2**31 - 100
+    # beyond a long, as to_stata does
+    assert df['big_id'].tolist() == [1, 2, 2**40] and df['big_id'].dtype == np.float64
+    assert df['flag'].tolist()[:2] == [1, 0] and np.isnan(df['flag'][2])
+    assert df['share'].isna().tolist() == [False, True, False]
+    assert df['filing_date'].tolist()[::2] == [pd.Timestamp('1960-01-01'), pd.Timestamp('2024-02-29')]
+    assert pd.isna(df['filing_date'][1])
+    # Stata has no missing string: null is written as ''
+    assert df['name'].tolist() == ['Université', '', '']
+    assert df['abstract'].tolist() == ['é' * 1500, 'x', '']
+    assert df['auth'].tolist() == ['EP', 'US', '']
+
+
+def test_labels(tmp_path):
+    df = pd.DataFrame({'source': np.array([1, 2, 1], dtype='int8'), 'appln_id': [1, 2, 3]})
+    write_dta(df, tmp_path / "out.dta", variable_labels={'appln_id': 'Appln ID (PATSTAT)'},
+              value_labels={'source': {1: 'priority', 2: 'prior-PCT'}}, data_label="quasi priorities")
+    with pd.io.stata.StataReader(tmp_path / "out.dta") as reader:
+        result = reader.read()
+        assert reader.variable_labels()['appln_id'] == 'Appln ID (PATSTAT)'
+        assert reader.data_label == "quasi priorities"
+    assert result['source'].tolist() == ['priority', 'prior-PCT', 'priority']
+
+
+@pytest.mark.parametrize('df, kwargs, match', [
+    (pd.DataFrame({'1st': [1]}), {}, "not a valid Stata variable name"),
+    (pd.DataFrame({'a': ['x']}), {'value_labels': {'a': {1: 'one'}}}, "need a numeric column"),
+    (pd.DataFrame({'a': [np.inf]}), {}, "infinity"),
+    (pd.DataFrame({'a': [1]}), {'variable_labels': {'a': 'x' * 81}}, "longer than 80"),
+])
+def test_invalid_exports(tmp_path, df, kwargs, match):
+    with pytest.raises(ValueError, match=match):
+        write_dta(df, tmp_path / "out.dta", **kwargs)
+    assert not (tmp_path / "out.dta").exists()
@@ -0,0 +1,51 @@
+"""
+Cached, column-projected access to TLS201.
+"""
+import os
+import pandas as pd
+import pyarrow.feather as feather
+import pytest
+import tls201
+import tls_schema
+
+
+@pytest.fixture
+def tls201_path(tmp_path):
+    path = tmp_path / "TLS201.feather"
+    pd.DataFrame({'appln_id': [1, 2, 3], 'appln_auth': ['EP', 'US', 'EP'],
+                  'appln_filing_year': [2000, 2001, 2002]}).to_feather(path)
+    tls201.clear_cache()
+    yield path
+    tls201.clear_cache()
+
+
+def test_projected_columns_match_read_feather(tls201_path):
+    columns = ['appln_auth', 'appln_id']
+    df = tls201.read_tls201(columns, tls201_path)
+    pd.testing.assert_frame_equal(df, tls_schema.read_feather(tls201_path, columns=columns)[columns])
+
+
+def test_columns_read_once(tls201_path, monkeypatch):
+    read = []
+    read_table = feather.read_table
+
+    def counting_read_table(path, columns=None, **kwargs):
+        read.append(columns)
+        return read_table(path, columns=columns, **kwargs)
+    monkeypatch.setattr(feather, 'read_table', counting_read_table)
+
+    tls201.read_tls201(['appln_id'], tls201_path)
+    df = tls201.read_tls201(['appln_id', 'appln_auth'], tls201_path)
+    assert read == [['appln_id'], ['appln_auth']]
+    # each call gets its own frame
+    df.loc[0, 'appln_id'] = 99
+    assert tls201.read_tls201(['appln_id'], tls201_path)['appln_id'].tolist() == [1, 2, 3]
+    assert len(read) == 2
+
+
+def test_cache_invalidated_when_file_changes(tls201_path):
+    assert tls201.read_tls201(['appln_id'], tls201_path)['appln_id'].tolist() == [1, 2, 3]
+    pd.DataFrame({'appln_id': [4], 'appln_auth': ['WO'], 'appln_filing_year': [2003]}).to_feather(tls201_path)
+    mtime = tls201_path.stat().st_mtime + 10
+    os.utime(tls201_path, (mtime, mtime))
+    assert tls201.read_tls201(['appln_id'], tls201_path)['appln_id'].tolist() == [4]
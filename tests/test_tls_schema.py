@@ -0,0 +1,33 @@
+"""
+Registry types of derived frames.
+"""
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from tls_schema import compact
+
+
+def test_compact_ids_with_missing_values_are_nullable():
+    df = compact(pd.DataFrame({'appln_id': [1.0, np.nan], 'person_id': [1.0, 2.0],
+                               'appln_filing_year': [2000.0, np.nan], 'appln_auth': ['EP', None]}))
+    assert str(df['appln_id'].dtype) == 'Int32'
+    assert df['appln_id'].isna().tolist() == [False, True]
+    assert str(df['person_id'].dtype) == 'int32'
+    assert str(df['appln_filing_year'].dtype) == 'Int16'
+    assert str(df['appln_auth'].dtype) == 'category'
+
+
+def test_compact_warns_on_values_out_of_range():
+    df = pd.DataFrame({'docdb_family_id': [1.0, np.nan, 3e10]})
+    with pytest.warns(UserWarning, match="docdb_family_id left as float64, not compacted to Int32"):
+        compact(df)
+    assert df['docdb_family_id'].dtype == np.float64
+
+
+def test_compact_leaves_unknown_columns():
+    df = pd.DataFrame({'n': [1.0, np.nan]})
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        compact(df)
+    assert df['n'].dtype == np.float64
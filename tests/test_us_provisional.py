@@ -0,0 +1,81 @@
+"""
+Provisional to application links of us_provisional_appln_linking.py against
+the rank-and-filter cascade they replace.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+
+DATE_NAN = pd.Timestamp('2262-01-01')
+
+
+def random_inputs(rng, n_provisionals=60):
+    provisionals = np.arange(1, n_provisionals + 1)
+    n_applns = 4 * n_provisionals
+    appln_ids = np.arange(1000, 1000 + n_applns)
+    dates = pd.to_datetime('2001-01-01') + pd.to_timedelta(rng.integers(0, 4, n_applns), unit='D')
+    tls201 = pd.DataFrame({
+        'appln_id': np.concatenate([provisionals, appln_ids]),
+        'appln_auth': ['US'] * n_provisionals + list(rng.choice(['US', 'WO', 'EP', 'JP', 'CN'], n_applns)),
+        'appln_kind': ['P'] * n_provisionals + list(rng.choice(['A', 'W'], n_applns)),
+        'appln_filing_date': [pd.Timestamp('2000-01-01')] * n_provisionals
+        + list(dates.where(rng.random(n_applns) > 0.1)),
+        'appln_nr': [str(i) for i in range(n_provisionals + n_applns)],
+        'appln_nr_original': [None] * n_provisionals + ['x'] * n_applns,
+        'appln_nr_epodoc': [None] * n_provisionals + ['y'] * n_applns,
+        'receiving_office': [None] * n_provisionals + list(rng.choice(['US', None], n_applns)),
+        'docdb_family_id': np.concatenate([np.full(n_provisionals, np.nan),
+                                           np.where(rng.random(n_applns) > 0.1,
+                                                    rng.integers(1, 40, n_applns), np.nan)]),
+    })
+    tls204 = pd.DataFrame({'appln_id': appln_ids,
+                           'prior_appln_id': rng.choice(provisionals, n_applns),
+                           'prior_appln_seq_nr': 1})
+    pct_appln = rng.integers(0, 2, n_applns)
+    appln_pct = pd.DataFrame({'appln_id': appln_ids, 'WO_appln_id': np.where(pct_appln, 1.0, np.nan),
+                              'PCT_appln': pct_appln.astype(np.int8)})
+    return tls201, tls204, appln_pct[rng.random(n_applns) > 0.05]
+
+
+def rank_cascade(tls201, tls204, appln_pct):
+    """
+    The former selection rules, one rank and filter pass at a time.
+    """
+    links = pd.merge(tls204, tls201[['appln_id', 'appln_auth', 'appln_kind']],
+                     left_on='prior_appln_id', right_on='appln_id', suffixes=('', '_y'))
+    links = links[(links.appln_auth == 'US') & (links.appln_kind == 'P')]
+    links = pd.merge(links[['appln_id', 'prior_appln_id']], tls201, on='appln_id', how='left')
+    links['US_non_prov_appln'] = (links.appln_auth == 'US') | (links.receiving_office == 'US')
+    links = pd.merge(links, appln_pct, on='appln_id', how='left')
+    links['appln_filing_date'] = links.appln_filing_date.fillna(DATE_NAN)
+    links['filing_country_order'] = links.appln_auth.map(
+        lambda x: 1 if x == 'US' else 2 if x == 'WO' else 3 if x == 'EP' else 4 if x == 'JP' else 9999)
+    links['direct_US_filing'] = links.appln_auth == 'US'
+    rules = [('prior_appln_id', 'appln_filing_date', True),
+             ('prior_appln_id', 'PCT_appln', True),
+             ('prior_appln_id', 'US_non_prov_appln', False),
+             (['prior_appln_id', 'docdb_family_id'], 'filing_country_order', True),
+             ('prior_appln_id', 'direct_US_filing', False),
+             (['prior_appln_id', 'docdb_family_id'], 'appln_id', True),
+             ('prior_appln_id', 'filing_country_order', True),
+             ('prior_appln_id', 'appln_id', True)]
+    for by, col, ascending in rules:
+        links = links[links.groupby(by)[col].rank('dense', ascending=ascending) == 1]
+    return links
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_selection_matches_rank_cascade(run_script, tmp_path, seed):
+    tls201, tls204, appln_pct = random_inputs(np.random.default_rng(seed))
+    tls201.to_feather(tmp_path / "data" / "TLS201.feather")
+    tls204.to_feather(tmp_path / "data" / "TLS204.feather")
+    appln_pct.to_stata(tmp_path / "data" / "appln_PCT_link.dta", write_index=False)
+
+    run_script("us_provisional_appln_linking.py")
+
+    result = pd.read_stata(tmp_path / "data" / "US_provisional_to_appln_link.dta")
+    expected = rank_cascade(tls201, tls204, appln_pct)
+    assert len(expected) > 20
+    assert sorted(zip(result.provisional_appln_id, result.appln_id)) == \
+        sorted(zip(expected.prior_appln_id, expected.appln_id))
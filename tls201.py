@@ -0,0 +1,55 @@
+"""
+Shared access to TLS201
+
+TLS201.feather is opened memory-mapped and only the columns a step asks for
+are read. The Arrow columns are kept for the lifetime of the process, so
+several steps run in the same process read every TLS201 column from disk at
+most once. Arrow columns are immutable, and each
+call hands out a fresh DataFrame, so a step cannot alter what the next one
+gets. When TLS201 is written uncompressed (`--compression none`), the
+columns are zero-copy views of the mapped file.
+"""
+from pathlib import Path
+from typing import Dict, List, Tuple
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from config import DATA_FOLDER
+import tls_schema
+
+
+TLS201_FILE = DATA_FOLDER / "TLS201.feather"
+
+# (path, mtime) -> column name -> Arrow column
+_CACHE: Dict[Tuple[str, float], Dict[str, pa.ChunkedArray]] = {}
+
+
+def read_tls201(columns: List[str], path: Path = TLS201_FILE) -> pd.DataFrame:
+    """
+    Projected columns of TLS201, with the types of `tls_schema.read_feather`.
+
+    Args:
+        columns (list of str): TLS201 columns to read.
+        path (Path): TLS201 Feather file.
+
+    Returns:
+        pd.DataFrame: The requested columns, in the requested order.
+    """
+    key = (str(path), Path(path).stat().st_mtime)
+    if key not in _CACHE:
+        clear_cache()
+        _CACHE[key] = {}
+    cached = _CACHE[key]
+    missing = [col for col in columns if col not in cached]
+    if missing:
+        table = feather.read_table(path, columns=missing, memory_map=True)
+        for col in missing:
+            cached[col] = table.column(col)
+    return tls_schema.to_pandas(pa.table({col: cached[col] for col in columns}))
+
+
+def clear_cache() -> None:
+    """
+    Release the cached TLS201 columns.
+    """
+    _CACHE.clear()
@@ -0,0 +1,360 @@
+"""
+Column types of the PATSTAT tables
+
+Central registry of how each TLS column is parsed from the CSV shards and
+stored in the Feather files: IDs as int32, counters and sequence numbers as
+small ints (parsed as nullable integers, so that a blank cell loads as a
+null), code columns (authorities, kinds, citation origin, sector, ...) as
+categoricals, dates as date32 and years as nullable int16. Columns that
+are not listed are left to pandas' type inference. In pandas, dates are
+datetime64 with NaT for missing dates; they only become Stata %td dates when
+written by `to_stata`.
+"""
+import warnings
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from stata import write_dta
+
+
+ID = "int32"
+CODE = "category"
+TEXT = "str"
+DATE = "date32"
+YEAR = "Int16"
+
+
+TABLES: Dict[str, Dict[str, str]] = {
+    "tls201": {
+        'appln_id': ID,
+        'appln_auth': CODE,
+        'appln_nr': TEXT,
+        'appln_kind': CODE,
+        'appln_filing_date': DATE,
+        'appln_filing_year': YEAR,
+        'appln_nr_epodoc': TEXT,
+        'appln_nr_original': TEXT,
+        'ipr_type': CODE,
+        'receiving_office': CODE,
+        'internat_appln_id': ID,
+        'int_phase': CODE,
+        'reg_phase': CODE,
+        'nat_phase': CODE,
+        'earliest_filing_date': DATE,
+        'earliest_filing_year': YEAR,
+        'earliest_filing_id': ID,
+        'earliest_publn_date': DATE,
+        'earliest_publn_year': YEAR,
+        'earliest_pat_publn_id': ID,
+        'granted': "int8",
+        'docdb_family_id': ID,
+        'inpadoc_family_id': ID,
+        'docdb_family_size': "int32",
+        'nb_citing_docdb_fam': "int32",
+        'nb_applicants': "int16",
+        'nb_inventors': "int16",
+    },
+    "tls202": {
+        'appln_id': ID,
+        'appln_title_lg': CODE,
+        'appln_title': TEXT,
+    },
+    "tls203": {
+        'appln_id': ID,
+        'appln_abstract_lg': CODE,
+        'appln_abstract': TEXT,
+    },
+    "tls204": {
+        'appln_id': ID,
+        'prior_appln_id': ID,
+        'prior_appln_seq_nr': "int16",
+    },
+    "tls205": {
+        'appln_id': ID,
+        'tech_rel_appln_id': ID,
+    },
+    "tls206": {
+        'person_id': ID,
+        'person_name': TEXT,
+        'person_name_orig_lg': TEXT,
+        'person_address': TEXT,
+        'person_ctry_code': CODE,
+        'nuts': CODE,
+        'nuts_level': "int8",
+        'doc_std_name_id': ID,
+        'doc_std_name': TEXT,
+        'psn_id': ID,
+        'psn_name': TEXT,
+        'psn_level': "int8",
+        'psn_sector': CODE,
+        'han_id': ID,
+        'han_name': TEXT,
+        'han_harmonized': ID,
+    },
+    "tls207": {
+        'person_id': ID,
+        'appln_id': ID,
+        'applt_seq_nr': "int16",
+        'invt_seq_nr': "int16",
+    },
+    "tls211": {
+        'pat_publn_id': ID,
+        'publn_auth': CODE,
+        'publn_nr': TEXT,
+        'publn_nr_original': TEXT,
+        'publn_kind': CODE,
+        'appln_id': ID,
+        'publn_date': DATE,
+        'publn_lg': CODE,
+        'publn_first_grant': "int8",
+        'publn_claims': "int16",
+    },
+    "tls212": {
+        'pat_publn_id': ID,
+        'citn_replenished': ID,
+        'citn_id': "int16",
+        'citn_origin': CODE,
+        'cited_pat_publn_id': ID,
+        'cited_appln_id': ID,
+        'pat_citn_seq_nr': "int16",
+        'cited_npl_publn_id': TEXT,
+        'npl_citn_seq_nr': "int16",
+        'citn_gener_auth': CODE,
+    },
+    "tls214": {
+        'npl_publn_id': TEXT,
+        'npl_type': CODE,
+    },
+    "tls216": {
+        'appln_id': ID,
+        'parent_appln_id': ID,
+        'contn_type': CODE,
+    },
+    "tls224": {
+        'appln_id': ID,
+        'cpc_class_symbol': CODE,
+    },
+    "tls225": {
+        'docdb_family_id': ID,
+        'cpc_class_symbol': CODE,
+        'cpc_gener_auth': CODE,
+        'cpc_version': CODE,
+        'cpc_position': CODE,
+        'cpc_value': CODE,
+        'cpc_action_date': CODE,
+        'cpc_status': CODE,
+        'cpc_data_source': CODE,
+    },
+    "tls231": {
+        'event_id': "int64",
+        'appln_id': ID,
+        'event_seq_nr': "int16",
+        'event_type': CODE,
+        'event_auth': CODE,
+        'event_code': CODE,
+        'event_filing_date': DATE,
+        'event_publn_date': DATE,
+        'event_effective_date': DATE,
+        'event_text': TEXT,
+    },
+    "tls803": {
+        'event_auth': CODE,
+        'event_code': CODE,
+        'event_impact': CODE,
+        'event_category_code': CODE,
+    },
+}
+
+# types of the same column name across tables, used for derived files
+COLUMNS: Dict[str, str] = {}
+for _table in TABLES.values():
+    COLUMNS.update(_table)
+
+_ARROW_TYPES = {
+    CODE: pa.dictionary(pa.int32(), pa.string()),
+    TEXT: pa.string(),
+    DATE: pa.date32(),
+    YEAR: pa.int16(),
+}
+
+
+def _is_numpy_int(dtype: str) -> bool:
+    return dtype.startswith("int")
+
+
+def csv_dtypes(table_name: str) -> Dict[str, str]:
+    """
+    dtypes to hand to `pd.read_csv` for a table. Codes and dates are parsed
+    as strings and only encoded when the chunk is converted to Arrow. IDs and
+    counters are parsed as nullable integers ('Int32', ...), so that a blank
+    cell does not abort the load; `narrow_ints` turns them back into their
+    registry type.
+
+    Args:
+        table_name (str): Table prefix, e.g. 'tls201'.
+
+    Returns:
+        dict: Column name to pandas dtype.
+    """
+    return {col: (str if dtype in (CODE, TEXT, DATE) else
+                  dtype.capitalize() if _is_numpy_int(dtype) else dtype)
+            for col, dtype in TABLES.get(table_name, {}).items()}
+
+
+def narrow_ints(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    """
+    Cast the nullable integer columns of a chunk read with `csv_dtypes` to
+    their numpy registry type. Columns with missing values stay nullable;
+    they are stored with the same Arrow type either way.
+
+    Args:
+        df (pd.DataFrame): Chunk, modified in place.
+        table_name (str): Table prefix, e.g. 'tls201'.
+
+    Returns:
+        pd.DataFrame: The same chunk.
+    """
+    for col, dtype in TABLES.get(table_name, {}).items():
+        if not _is_numpy_int(dtype) or col not in df.columns:
+            continue
+        nullable = pd.api.types.is_integer_dtype(df[col]) and pd.api.types.is_extension_array_dtype(df[col])
+        if nullable and not df[col].isna().any():
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def arrow_types(table_name: str) -> Dict[str, pa.DataType]:
+    """
+    Arrow types of the columns of a table as stored in its Feather file.
+
+    Args:
+        table_name (str): Table prefix, e.g. 'tls201'.
+
+    Returns:
+        dict: Column name to Arrow type.
+    """
+    return {col: _ARROW_TYPES.get(dtype) or pa.from_numpy_dtype(dtype)
+            for col, dtype in TABLES.get(table_name, {}).items()}
+
+
+def pandas_dtypes(table_name: str) -> Dict[str, str]:
+    """
+    In-memory pandas dtypes of a table (dates as datetime64).
+
+    Args:
+        table_name (str): Table prefix, e.g. 'tls201'.
+
+    Returns:
+        dict: Column name to pandas dtype.
+    """
+    return {col: ("datetime64[ns]" if dtype == DATE else dtype)
+            for col, dtype in TABLES.get(table_name, {}).items() if dtype != TEXT}
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast the columns of a frame read from a derived file (.dta, .feather) to
+    the registry type of the column with the same name. IDs that contain
+    missing values take the nullable integer type (e.g. Int32, as in
+    `csv_dtypes`); a column that does not fit its type is left as it is,
+    with a warning.
+
+    Args:
+        df (pd.DataFrame): Frame to compact, modified in place.
+
+    Returns:
+        pd.DataFrame: The same frame.
+    """
+    for col in df.columns:
+        dtype = COLUMNS.get(col)
+        if dtype is None or dtype in (TEXT, DATE):
+            continue
+        if _is_numpy_int(dtype) and df[col].isna().any():
+            dtype = dtype.capitalize()
+        try:
+            if _is_numpy_int(dtype.lower()) and len(df) and pd.api.types.is_numeric_dtype(df[col]):
+                info = np.iinfo(dtype.lower())
+                if df[col].min() < info.min or df[col].max() > info.max:
+                    raise OverflowError(f"values outside the {dtype} range")
+            df[col] = df[col].astype(dtype)
+        except (TypeError, ValueError, OverflowError) as error:
+            warnings.warn(f"{col} left as {df[col].dtype}, not compacted to {dtype}: {error}")
+    return df
+
+
+def read_feather(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read a TLS Feather file with its compact types. Code columns come back as
+    categoricals and dates as datetime64, with NaT for missing dates.
+
+    Args:
+        path (Path): Feather file.
+        columns (list of str, optional): Columns to read.
+
+    Returns:
+        pd.DataFrame: The requested columns.
+    """
+    return to_pandas(feather.read_table(path, columns=columns, memory_map=True))
+
+
+def to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert an Arrow table with registry types to pandas, with dates as
+    datetime64 (see `read_feather`).
+
+    Args:
+        table (pa.Table): Table read from a Feather file or Parquet dataset.
+
+    Returns:
+        pd.DataFrame: The converted table.
+    """
+    return table.to_pandas(date_as_object=False)
+
+
+def to_stata(df: pd.DataFrame, path: Path, write_index: bool = False, **kwargs) -> None:
+    """
+    Write a frame to a Stata file with the Arrow writer of stata.py:
+    categorical columns as their plain values, datetime columns as %td dates
+    and missing values as Stata missing values.
+
+    Args:
+        df (pd.DataFrame): Frame to export.
+        path (Path): Target .dta file.
+        write_index (bool): Write the index as a variable too.
+        **kwargs: Passed on to `stata.write_dta` (variable_labels,
+            value_labels, data_label).
+    """
+    if write_index:
+        df = df.reset_index()
+    write_dta(df, path, **kwargs)
+
+
+def memory_usage(df: pd.DataFrame, table_name: str) -> Dict[str, float]:
+    """
+    Memory of a frame with pandas' inferred types and with the registry types.
+
+    Args:
+        df (pd.DataFrame): Frame read with type inference.
+        table_name (str): Table prefix, e.g. 'tls201'.
+
+    Returns:
+        dict: Bytes per row, 'inferred' and 'compact'.
+    """
+    dtypes = pandas_dtypes(table_name)
+    inferred = df.memory_usage(deep=True, index=False)
+    compact_bytes = 0
+    for col in df.columns:
+        dtype = dtypes.get(col)
+        if dtype is None:
+            compact_bytes += inferred[col]
+        elif dtype == CODE:
+            compact_bytes += df[col].astype(CODE).memory_usage(deep=True, index=False)
+        else:
+            # nullable ints carry one mask byte per row
+            nullable = dtype[0].isupper()
+            compact_bytes += len(df) * (np.dtype(dtype.lower()).itemsize + nullable)
+    n_rows = max(len(df), 1)
+    return {'inferred': inferred.sum() / n_rows, 'compact': compact_bytes / n_rows}
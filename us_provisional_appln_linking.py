@@ -2,19 +2,22 @@
 find actual application derived from provisional filing
 US
 """
+import numpy as np
 import pandas as pd
 from config import DATA_FOLDER
+from selection import best_per_group
+from tls201 import read_tls201
+from tls_schema import read_feather, to_stata
 
 
-TLS201_FILE = DATA_FOLDER / "TLS201.feather"
 PRIORITY_FILE = DATA_FOLDER / "TLS204.feather"
 APPLN_PCT_LINK_FILE = DATA_FOLDER / "appln_PCT_link.dta"
-DATE_NAN = '9999-12-31'
 
 
 appln_pct = pd.read_stata(APPLN_PCT_LINK_FILE)
-tls201_df = pd.read_feather(TLS201_FILE)
-priority = pd.read_feather(PRIORITY_FILE)
+tls201_df = read_tls201(['appln_id', 'appln_auth', 'appln_kind', 'appln_filing_date', 'appln_nr',
+                         'appln_nr_original', 'appln_nr_epodoc', 'receiving_office', 'docdb_family_id'])
+priority = read_feather(PRIORITY_FILE)
 obschek = priority.shape[0]
 priority = pd.merge(priority,
                     tls201_df[['appln_id', 'appln_auth', 'appln_kind', 'appln_filing_date', 'appln_nr', 'appln_nr_original', 'appln_nr_epodoc']],
@@ -53,47 +56,33 @@ US_provisional_priority = pd.merge(US_provisional_priority,
                                    how='left')
 assert obschek == US_provisional_priority.shape[0]
 
-US_provisional_priority.prior_filing_date = US_provisional_priority.prior_filing_date.fillna(DATE_NAN)
-US_provisional_priority.appln_filing_date = US_provisional_priority.appln_filing_date.fillna(DATE_NAN)
-
-# RULE 1: for each provisional find appln with earliest filing date
-
-US_provisional_priority['rank1'] = US_provisional_priority.groupby('prior_appln_id').appln_filing_date.rank('dense')
-US_provisional_priority = US_provisional_priority.query("rank1==1").copy()
-
-# RULE 2: per provisional appln, we prioritize appln
-# without prior PCTs
-US_provisional_priority['rank2'] = US_provisional_priority.groupby('prior_appln_id').PCT_appln.rank('dense')
-US_provisional_priority = US_provisional_priority.query("rank2==1").copy()
-
-# RULE 3: if there is US applnor WO filed in US, take that as a potential one
-US_provisional_priority['rank3'] = US_provisional_priority.groupby('prior_appln_id').US_non_prov_appln.rank('dense', ascending=False)
-US_provisional_priority = US_provisional_priority.query("rank3==1").copy()
-
-# RULE 4: prioritize as follows, provided belong to same family:
-# 1. directly filed at US as in appln_auth == 'US' 
+# Selection rules, applied per provisional appln in this order:
+# RULE 1: earliest filing date, a missing one last
+# RULE 2: prioritize appln without prior PCTs
+# RULE 3: if there is US appln or WO filed in US, take that as a potential one
+# RULE 4: prioritize by filing country, as follows:
+# 1. directly filed at US as in appln_auth == 'US'
 # 2. WO appln
 # 3. EP appln
 # 4. JP appln
 # 5. rest (value 9999)
-US_provisional_priority['filing_country_order'] = US_provisional_priority.appln_auth.map(lambda x: 1 if x == 'US' else 2 if x == 'WO' else 3 if x == 'EP' else 4 if x == 'JP' else 9999)
-US_provisional_priority['rank4'] = US_provisional_priority.groupby(['prior_appln_id', 'docdb_family_id']).filing_country_order.rank('dense')
-US_provisional_priority = US_provisional_priority.query("rank4==1").copy()
-
-# RULE 5: if filed at US, take that
-US_provisional_priority['direct_US_filing'] = US_provisional_priority.appln_auth == 'US'
-US_provisional_priority['rank5'] = US_provisional_priority.groupby('prior_appln_id').direct_US_filing.rank('dense', ascending=False)
-US_provisional_priority = US_provisional_priority.query("rank5==1").copy()
-
-# especially for filing_country_order = 9999
-US_provisional_priority['rank6'] = US_provisional_priority.groupby(['prior_appln_id' ,'docdb_family_id']).appln_id.rank('dense')
-US_provisional_priority = US_provisional_priority.query("rank6==1").copy()
-
-US_provisional_priority['rank7'] = US_provisional_priority.groupby(['prior_appln_id']).filing_country_order.rank('dense')
-US_provisional_priority = US_provisional_priority.query("rank7==1").copy()
-
-US_provisional_priority['rank8'] = US_provisional_priority.groupby(['prior_appln_id']).appln_id.rank('dense')
-US_provisional_priority = US_provisional_priority.query("rank8==1").copy()
+# RULE 5: lowest appln_id, especially for filing_country_order = 9999
+# The country and appln_id rules were first applied within each family and
+# then across families; a family-wise minimum is never below the overall one,
+# so both passes reduce to one overall (filing_country_order, appln_id) order
+# and all rules are a single sort. Appln without family or PCT information
+# are never selected: they sort last and a provisional whose best appln lacks
+# them is dropped.
+US_provisional_priority['filing_country_order'] = np.select(
+    [US_provisional_priority.appln_auth == auth for auth in ['US', 'WO', 'EP', 'JP']],
+    [1, 2, 3, 4],
+    default=9999)
+US_provisional_priority['no_family'] = US_provisional_priority.docdb_family_id.isna()
+US_provisional_priority = best_per_group(
+    US_provisional_priority, 'prior_appln_id',
+    ['appln_filing_date', 'PCT_appln', 'US_non_prov_appln', 'no_family', 'filing_country_order', 'appln_id'],
+    ascending=[True, True, False, True, True, True], keep_missing=['appln_filing_date'])
+US_provisional_priority = US_provisional_priority[~US_provisional_priority.no_family]
 
 assert US_provisional_priority.prior_appln_id.duplicated().sum()==0
 
@@ -121,6 +110,6 @@ variable_list = {
     'appln_nr_epodoc': 'Appln Nr EPODOC'
 }
 
-US_provisional_priority.to_stata(DATA_FOLDER / "US_provisional_to_appln_link.dta",
+to_stata(US_provisional_priority, DATA_FOLDER / "US_provisional_to_appln_link.dta",
                                  write_index=False,
                                  variable_labels=variable_list)
\ No newline at end of file